@@ -0,0 +1,82 @@
+"""
+Compare chunking throughput of the character and token modes of Chunk.
+
+Builds a synthetic corpus of pages, chunks it with both modes and prints pages,
+chunks and megabytes per second. Run from the backend directory:
+
+    python -m benchmarks.chunking --pages 5000 --page-chars 3000
+"""
+
+import argparse
+import random
+import string
+import time
+
+from langchain.schema import Document
+from utils.docs.chunk import Chunk
+
+
+def make_corpus(pages: int, page_chars: int, seed: int = 0) -> list:
+    """Pages of random words and sentences with some repeated boilerplate."""
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        for _ in range(5000)
+    ]
+    footer = "Confidential - do not distribute. Page footer text.\n"
+    corpus = []
+    for page in range(pages):
+        words = []
+        size = 0
+        while size < page_chars:
+            word = rng.choice(vocabulary)
+            if rng.random() < 0.08:
+                word += ".\n" if rng.random() < 0.2 else "."
+            words.append(word)
+            size += len(word) + 1
+        corpus.append(
+            Document(
+                page_content=" ".join(words) + "\n" + footer,
+                metadata={"document_id": 1, "user_id": 1, "page": page},
+            )
+        )
+    return corpus
+
+
+def run(chunker: Chunk, corpus: list) -> dict:
+    # Fresh documents each run since the splitter may touch metadata
+    docs = [Document(page_content=d.page_content, metadata=d.metadata) for d in corpus]
+    started = time.perf_counter()
+    chunks = chunker.chunk_docs(docs)
+    elapsed = time.perf_counter() - started
+    size = sum(len(d.page_content) for d in corpus)
+    return {
+        "chunks": len(chunks),
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(len(corpus) / elapsed),
+        "mb_per_second": round(size / elapsed / 1e6, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--page-chars", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.pages, args.page_chars)
+    for mode in ("characters", "tokens"):
+        chunker = Chunk(mode=mode)
+        if mode == "tokens":
+            # Load the encoding outside the timed runs
+            chunker.encoding.encode("warm up")
+        best = min(
+            (run(chunker, corpus) for _ in range(args.repeat)),
+            key=lambda result: result["seconds"],
+        )
+        print(f"{mode:>10}: {best}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Recall and latency of quantized vector search versus the float32 index.
+
+Samples stored chunk vectors (slightly perturbed) as queries, computes the exact
+top k of each with a sequential scan, then runs every quantization mode of
+ChunkVectorStore and prints recall@k and latency percentiles. Run from the
+backend directory against a database with ingested documents:
+
+    python -m benchmarks.vector_search --queries 100 --k 10
+"""
+
+import argparse
+import time
+
+import load_env
+import numpy as np
+from models.document_chunk import DocumentChunk
+from sqlalchemy import func, select, text
+from utils.database import get_database
+from utils.vector_store import DEFAULT_COLLECTION, QUANTIZATION_MODES, ChunkVectorStore
+
+
+def sample_queries(store: ChunkVectorStore, count: int, noise: float, seed: int):
+    """Stored vectors of random chunks plus gaussian noise, with their owner."""
+    rng = np.random.default_rng(seed)
+    with store.engine.begin() as conn:
+        rows = conn.execute(
+            select(DocumentChunk.embedding, DocumentChunk.user_id)
+            .where(DocumentChunk.collection == store.collection_name)
+            .order_by(func.random())
+            .limit(count)
+        ).all()
+    queries = []
+    for embedding, user_id in rows:
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector + rng.normal(0, noise, vector.shape).astype(np.float32)
+        queries.append((vector.tolist(), {"user_id": user_id}))
+    return queries
+
+
+def exact_ids(store: ChunkVectorStore, vector, k: int, filter: dict) -> set:
+    """Ground truth: the true top k, ignoring every index."""
+    with store.engine.begin() as conn:
+        conn.execute(text("SET LOCAL enable_indexscan = off"))
+        rows = conn.execute(store._search_statement(vector, k, filter)).all()
+    return {row[0] for row in rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-filter", action="store_true", help="Search all users")
+    args = parser.parse_args()
+
+    if not load_env.IS_ENV_LOADED:
+        raise RuntimeError("Environment variables not loaded")
+    db_url = get_database().get_db_url()
+    stores = {
+        mode: ChunkVectorStore(None, args.collection, db_url, quantization=mode)
+        for mode in QUANTIZATION_MODES
+    }
+
+    queries = sample_queries(stores["none"], args.queries, args.noise, args.seed)
+    if args.no_filter:
+        queries = [(vector, {}) for vector, _ in queries]
+    truth = [exact_ids(stores["none"], vector, args.k, f) for vector, f in queries]
+    print(f"{len(queries)} queries, k={args.k}, collection={args.collection}")
+
+    for mode, store in stores.items():
+        recalls = []
+        latencies = []
+        for (vector, filter), expected in zip(queries, truth):
+            started = time.perf_counter()
+            docs = store.similarity_search_by_vector(vector, args.k, filter)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if expected:
+                recalls.append(len({d.id for d in docs} & expected) / len(expected))
+        print(
+            f"{mode:>8}: recall@{args.k}={np.mean(recalls):.3f} "
+            f"p50={np.percentile(latencies, 50):.1f}ms "
+            f"p95={np.percentile(latencies, 95):.1f}ms "
+            f"oversample={store.oversample}"
+        )
+
+
+if __name__ == "__main__":
+    main()
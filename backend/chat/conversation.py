@@ -7,6 +7,7 @@ from models.conversation import ConversationHistory, Message
 from schemas.conversation import ChatRequest
 from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import mark_recent_write
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +41,7 @@ class ConversationService:
             conversation = ConversationHistory(user_id=user_id)
         db.add(conversation)
         await db.commit()
+        mark_recent_write(user_id=user_id, conversation_id=conversation.conversation_id)
         return conversation
 
     @staticmethod
@@ -179,4 +181,5 @@ class ConversationService:
         )
 
         await db.commit()
+        mark_recent_write(user_id=user_id, conversation_id=conversation.conversation_id)
         return conversation
@@ -5,8 +5,9 @@ Document Management System
 1. Core Routes
    ├── Upload (/upload)
    ├── List (/user_id)
+   ├── Download (/document_id/content)
    ├── Update/Delete (/document_id)
-   ├── Ingest (/ingest)
+   ├── Ingest (/ingest, /jobs/job_id)
    ├── Search (/search)
    └── Move (/move/document_id)
 
@@ -17,9 +18,7 @@ Document Management System
    │   └── Directory Management
    │
    └── Processing
-       ├── PDF Ingestion
-       ├── Chunking
-       └── Embedding
+       └── Ingestion jobs (parsing, chunking and embedding run in worker.py)
 
 3. Data & Models
    ├── Document/UserDocument
@@ -32,14 +31,21 @@ Document Management System
    └── Search Functionality
 """
 
+import asyncio
 import logging
+import mimetypes
 import os
-import shutil
-from pathlib import Path
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
-from langchain_community.document_loaders import PyPDFLoader
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+)
 from models.document import Document
 from models.user_document import UserDocument
 from schemas.document import (
@@ -47,16 +53,21 @@ from schemas.document import (
     DirectoryTreeResponse,
     DocumentResponse,
     DocumentWithChunksResponse,
+    IngestJobResponse,
     IngestRequest,
+    IngestResponse,
     SearchRequest,
 )
-from sqlalchemy import delete, select
+from sqlalchemy import delete, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from utils.database import get_db
-from utils.docs.chunk import Chunk
+from utils.database import get_database, get_db, get_read_db, mark_recent_write
+from utils.docs.blobs import BlobStore
+from utils.docs.corpus import aget_corpus_version, bump_corpus_versions
 from utils.docs.directory import build_directory_tree
-from utils.docs.embed import Embeddings
-from utils.docs.search import Search
+from utils.docs.jobs import JobQueue
+from utils.docs.search import Search, SearchResultCache
+from utils.responses import storage_response
+from utils.storage import StoredFile, get_storage, spool_upload
 
 # Configure logging
 logging.basicConfig(
@@ -68,11 +79,14 @@ logger = logging.getLogger(__name__)
 class DocumentRoutes:
     def __init__(self):
         self.router = APIRouter(prefix="/api/documents", tags=["documents"])
-        self.upload_dir = Path("uploads")
-        self.upload_dir.mkdir(exist_ok=True)
-        self.chunk_service = Chunk()
-        self.embeddings_service = Embeddings()
+        self.storage = get_storage()
+        self.blob_store = BlobStore(self.storage)
+        self._write_semaphore = asyncio.Semaphore(
+            int(os.getenv("UPLOAD_WRITE_CONCURRENCY", "8"))
+        )
+        self.job_queue = JobQueue()
         self.search_service = Search()
+        self.result_cache = SearchResultCache()
         self._setup_routes()
 
     def _setup_routes(self):
@@ -88,23 +102,37 @@ class DocumentRoutes:
             methods=["GET"],
             response_model=DirectoryTreeResponse,
         )
+        self.router.add_api_route(
+            "/{document_id}/content", self.download_document, methods=["GET"]
+        )
         self.router.add_api_route(
             "/{document_id}", self.update_document, methods=["PUT"]
         )
         self.router.add_api_route(
             "/{document_id}", self.delete_document, methods=["DELETE"]
         )
-        self.router.add_api_route("/ingest", self.ingest_documents, methods=["POST"])
+        self.router.add_api_route(
+            "/ingest",
+            self.ingest_documents,
+            methods=["POST"],
+            status_code=202,
+            response_model=IngestResponse,
+        )
+        self.router.add_api_route(
+            "/jobs/{job_id}",
+            self.get_ingest_job,
+            methods=["GET"],
+            response_model=IngestJobResponse,
+        )
         self.router.add_api_route("/search", self.search_documents, methods=["POST"])
         self.router.add_api_route(
             "/move/{document_id}", self.move_document, methods=["PUT"]
         )
 
-    def _get_storage_filename(self, document_id: int, original_filename: str) -> str:
-        """Generate a unique storage filename based on document ID and original extension."""
-        # Extract extension from original filename, default to .pdf if none
-        ext = os.path.splitext(original_filename)[1].lower() or ".pdf"
-        return f"{document_id}{ext}"
+    async def _spool_upload(self, file: UploadFile) -> StoredFile:
+        """Stream an upload into the storage backend's spool directory."""
+        async with self._write_semaphore:
+            return await spool_upload(file, self.storage.spool_dir)
 
     async def upload_documents(
         self,
@@ -115,59 +143,69 @@ class DocumentRoutes:
         ),
         db: AsyncSession = Depends(get_db),
     ):
+        spooled: List[StoredFile] = []
         try:
             logger.info(f"Starting document upload for user_id={user_id}")
 
             # Convert path string to array if provided
             path_array = path.split("/") if path else []
 
-            saved_files = []
-            for file in files:
-                # Create document record first to get the ID
-                doc = Document(
-                    filename=file.filename,
-                    path_array=path_array + [file.filename],
-                    file_path="",  # Temporary empty path
-                    is_ingested=False,
-                )
-                db.add(doc)
-                await db.commit()
-                await db.refresh(doc)
-
-                # Generate unique storage filename
-                storage_filename = self._get_storage_filename(doc.id, file.filename)
-
-                # Save file directly to upload directory
-                file_path = self.upload_dir / storage_filename
-                with file_path.open("wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
-
-                # Update document with actual file path
-                doc.file_path = str(file_path.absolute())
-                await db.commit()
-                await db.refresh(doc)
-
-                # Create user-document mapping
-                user_doc = UserDocument(user_id=user_id, document_id=doc.id)
-                db.add(user_doc)
-                await db.commit()
-
-                saved_files.append(
-                    DocumentResponse.model_validate(
-                        {
-                            "id": doc.id,
-                            "filename": doc.filename,
-                            "path_array": doc.path_array,
-                            "is_ingested": doc.is_ingested,
-                            "created_at": (
-                                doc.created_at.isoformat() if doc.created_at else None
-                            ),
-                            "updated_at": (
-                                doc.updated_at.isoformat() if doc.updated_at else None
-                            ),
-                        }
-                    )
+            # Spool every upload to a temporary file concurrently before touching
+            # the database, so the session is only held for the bulk statements
+            results = await asyncio.gather(
+                *(self._spool_upload(file) for file in files),
+                return_exceptions=True,
+            )
+            spooled = [r for r in results if isinstance(r, StoredFile)]
+            for r in results:
+                if isinstance(r, BaseException):
+                    raise r
+
+            # Reference (or create) one blob per distinct content hash
+            blob_keys = await self.blob_store.acquire(
+                db, [(stored, file.filename) for stored, file in zip(spooled, files)]
+            )
+
+            # Insert all documents and their user mappings in one transaction
+            result = await db.execute(
+                insert(Document).returning(Document, sort_by_parameter_order=True),
+                [
+                    {
+                        "filename": file.filename,
+                        "path_array": path_array + [file.filename],
+                        "file_path": blob_keys[stored.sha256],
+                        "content_hash": stored.sha256,
+                        "is_ingested": False,
+                    }
+                    for stored, file in zip(spooled, files)
+                ],
+            )
+            docs = result.scalars().all()
+            await db.execute(
+                insert(UserDocument),
+                [{"user_id": user_id, "document_id": doc.id} for doc in docs],
+            )
+            await bump_corpus_versions(db, [user_id])
+            await db.commit()
+            mark_recent_write(user_id=user_id)
+
+            saved_files = [
+                DocumentResponse.model_validate(
+                    {
+                        "id": doc.id,
+                        "filename": doc.filename,
+                        "path_array": doc.path_array,
+                        "is_ingested": doc.is_ingested,
+                        "created_at": (
+                            doc.created_at.isoformat() if doc.created_at else None
+                        ),
+                        "updated_at": (
+                            doc.updated_at.isoformat() if doc.updated_at else None
+                        ),
+                    }
                 )
+                for doc in docs
+            ]
 
             logger.info(f"Successfully uploaded {len(saved_files)} files")
             return saved_files
@@ -175,6 +213,10 @@ class DocumentRoutes:
         except Exception as e:
             logger.error(f"Error during document upload: {str(e)}")
             await db.rollback()
+            # Blob files that were already moved are left for garbage collection,
+            # since a concurrent upload of the same content may now own them
+            for stored in spooled:
+                stored.path.unlink(missing_ok=True)
             raise HTTPException(status_code=500, detail=str(e))
 
     async def list_documents(
@@ -182,7 +224,7 @@ class DocumentRoutes:
         user_id: int,
         path: Optional[str] = Query(None, description="Filter by directory path"),
         recursive: bool = Query(True, description="Include subdirectories"),
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
     ):
         try:
             # Convert path string to array if provided
@@ -214,6 +256,53 @@ class DocumentRoutes:
             logger.error(f"Error listing documents: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
+    async def download_document(
+        self,
+        request: Request,
+        document_id: int,
+        user_id: int,
+        db: AsyncSession = Depends(get_read_db),
+    ):
+        """
+        Serve a document's file with Range and conditional request support.
+
+        The ETag is the content hash, so it stays valid across replicas and
+        storage backends and changes whenever the document is replaced.
+        """
+        query = (
+            select(Document)
+            .join(UserDocument)
+            .where(Document.id == document_id)
+            .where(UserDocument.user_id == user_id)
+        )
+        result = await db.execute(query)
+        document = result.scalar_one_or_none()
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+
+        # Release the connection before streaming the body
+        await db.close()
+
+        if not await self.storage.exists(document.file_path):
+            logger.error(
+                f"File for document {document_id} missing from storage: {document.file_path}"
+            )
+            raise HTTPException(status_code=404, detail="Document file not found")
+
+        media_type = (
+            mimetypes.guess_type(document.filename)[0] or "application/octet-stream"
+        )
+        # Pre-blob documents have no hash and fall back to a stat-based ETag
+        etag = f'"{document.content_hash}"' if document.content_hash else None
+        return await storage_response(
+            request,
+            self.storage,
+            document.file_path,
+            filename=document.filename,
+            media_type=media_type,
+            etag=etag,
+        )
+
     async def update_document(
         self,
         document_id: int,
@@ -235,25 +324,38 @@ class DocumentRoutes:
             if not document:
                 raise HTTPException(status_code=404, detail="Document not found")
 
-            # Delete old file
-            old_file_path = Path(document.file_path)
-            if old_file_path.exists():
-                old_file_path.unlink()
-
-            # Generate storage filename using existing document ID
-            storage_filename = self._get_storage_filename(document_id, file.filename)
+            # Stream the new file and reference its blob
+            stored = await self._spool_upload(file)
+            try:
+                blob_keys = await self.blob_store.acquire(db, [(stored, file.filename)])
+            finally:
+                stored.path.unlink(missing_ok=True)
+            logger.info(
+                f"Stored document {document_id} ({stored.size} bytes, sha256={stored.sha256})"
+            )
 
-            # Save new file directly to upload directory
-            file_path = self.upload_dir / storage_filename
-            with file_path.open("wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            old_content_hash = document.content_hash
+            old_file_path = document.file_path
+            content_changed = old_content_hash != stored.sha256
 
-            # Update document record
+            # Update document record; identical content keeps its embeddings
             document.filename = file.filename  # Keep original filename in DB
-            document.file_path = str(file_path.absolute())
-            document.is_ingested = False
+            document.file_path = blob_keys[stored.sha256]
+            document.content_hash = stored.sha256
+            if content_changed:
+                document.is_ingested = False
+            await db.flush()
+
+            # Release the previous blob, or the file of a pre-blob document
+            unreferenced = await self.blob_store.release(db, [old_content_hash])
+            if not old_content_hash:
+                unreferenced.append(old_file_path)
+            await bump_corpus_versions(db, [user_id])
             await db.commit()
             await db.refresh(document)
+            mark_recent_write(user_id=user_id)
+
+            await self.blob_store.delete_files(db, unreferenced)
 
             return DocumentResponse.model_validate(
                 {
@@ -292,17 +394,26 @@ class DocumentRoutes:
             if not document:
                 raise HTTPException(status_code=404, detail="Document not found")
 
-            # Delete file from filesystem
-            file_path = Path(document.file_path)
-            if file_path.exists():
-                file_path.unlink()
-
             # Delete document and user_document records
             await db.execute(
                 delete(UserDocument).where(UserDocument.document_id == document_id)
             )
             await db.execute(delete(Document).where(Document.id == document_id))
+
+            # Drop the blob reference; the file goes once nothing else uses it
+            unreferenced = await self.blob_store.release(db, [document.content_hash])
+            if not document.content_hash:
+                unreferenced.append(document.file_path)
+
+            # Vectors are removed in batches by the worker, not in this request
+            await self.job_queue.cancel(db, [document_id], ("ingest", "ingest_full"))
+            await self.job_queue.enqueue(db, [document_id], user_id, kind="purge")
+            await bump_corpus_versions(db, [user_id])
             await db.commit()
+            mark_recent_write(user_id=user_id)
+
+            # Delete unreferenced files from storage
+            await self.blob_store.delete_files(db, unreferenced)
 
             return {"message": "Document deleted successfully"}
 
@@ -313,85 +424,61 @@ class DocumentRoutes:
     async def ingest_documents(
         self, request: IngestRequest, user_id: int, db: AsyncSession = Depends(get_db)
     ):
+        """Queue documents for ingestion by the background worker."""
         try:
-            logger.info(f"Starting document ingestion for user_id={user_id}")
-            all_docs = []
+            logger.info(f"Queueing document ingestion for user_id={user_id}")
 
             # Verify all documents exist and belong to user
-            for doc_id in request.document_ids:
-                query = (
-                    select(Document)
-                    .distinct()
-                    .join(UserDocument)
-                    .where(Document.id == doc_id)
-                    .where(UserDocument.user_id == user_id)
-                )
-                result = await db.execute(query)
-                document = result.unique().scalar_one_or_none()
-
-                if not document:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"Document with id {doc_id} not found or not accessible",
-                    )
-                all_docs.append(document)
-
-            # Process all documents
-            processed_docs = []
-            for document in all_docs:
-                try:
-                    loader = PyPDFLoader(document.file_path)
-                    pages = loader.load()
-
-                    # Add document_id to each page's metadata
-                    for page in pages:
-                        page.metadata["document_id"] = document.id
-                        page.metadata["user_id"] = user_id
-                    processed_docs.extend(pages)
-
-                    # Update document status
-                    document.is_ingested = True
-                    await db.commit()
-                except Exception as e:
-                    logger.error(f"Error processing document {document.id}: {str(e)}")
-                    continue
-
-            if not processed_docs:
-                logger.error("No documents could be processed successfully")
+            document_ids = list(dict.fromkeys(request.document_ids))
+            query = (
+                select(Document.id)
+                .join(UserDocument)
+                .where(Document.id.in_(document_ids))
+                .where(UserDocument.user_id == user_id)
+            )
+            found = set((await db.execute(query)).scalars().all())
+            missing = [doc_id for doc_id in document_ids if doc_id not in found]
+            if missing:
                 raise HTTPException(
-                    status_code=422,
-                    detail="No documents could be processed successfully",
+                    status_code=404,
+                    detail=f"Document with id {missing[0]} not found or not accessible",
                 )
 
-            # Process documents through chunking and embedding pipeline
-            logger.info(f"Starting chunking process for {len(processed_docs)} pages")
-            chunks = self.chunk_service.chunk_docs(processed_docs)
-            logger.info(f"Chunking complete. Created {len(chunks)} chunks")
-
-            logger.info("Starting embedding process")
-            embeddings = self.embeddings_service.embed_docs(chunks)
-            logger.info(f"Embedding complete")
-
-            return {
-                "message": "Documents ingested successfully",
-                "document_ids": request.document_ids,
-                "chunks_created": len(chunks),
-                "embeddings_created": (
-                    len(embeddings) if isinstance(embeddings, list) else 1
-                ),
-            }
+            jobs = await self.job_queue.enqueue(
+                db,
+                document_ids,
+                user_id,
+                kind="ingest_full" if request.full else "ingest",
+            )
+            await db.commit()
+            logger.info(f"Queued {len(jobs)} ingest jobs for user_id={user_id}")
+
+            return IngestResponse(
+                message="Documents queued for ingestion",
+                document_ids=document_ids,
+                jobs=[IngestJobResponse.model_validate(job) for job in jobs],
+            )
 
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error during document ingestion: {str(e)}")
+            logger.error(f"Error queueing document ingestion: {str(e)}")
             await db.rollback()
             raise HTTPException(
                 status_code=500, detail=f"Error during document ingestion: {str(e)}"
             )
 
+    async def get_ingest_job(
+        self, job_id: int, user_id: int, db: AsyncSession = Depends(get_db)
+    ):
+        """Report the status of an ingest job."""
+        job = await self.job_queue.get(db, job_id, user_id=user_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return IngestJobResponse.model_validate(job)
+
     async def search_documents(
-        self, request: SearchRequest, db: AsyncSession = Depends(get_db)
+        self, request: SearchRequest, db: AsyncSession = Depends(get_read_db)
     ):
         try:
             # Input validation
@@ -402,6 +489,33 @@ class DocumentRoutes:
 
             logger.info(f"Starting search for query='{request.query}'")
 
+            # Responses are cached per corpus version, read before searching so
+            # a write during the search only makes the entry unreachable. Writes
+            # bump it on the primary, which is read too when this session is on
+            # a replica; a replica behind it is not searched and the response,
+            # whose document metadata comes from the replica, is not cached
+            version = await aget_corpus_version(db, request.user_id)
+            replica = get_database().replica_of(db)
+            cacheable = True
+            if replica is not None:
+                async with get_database().async_session() as primary:
+                    primary_version = await aget_corpus_version(
+                        primary, request.user_id
+                    )
+                if primary_version != version:
+                    version, replica, cacheable = primary_version, None, False
+            cache_params = (
+                request.chunks_per_document,
+                request.min_score,
+                request.sort_by_score,
+            )
+            cached = self.result_cache.get(
+                request.user_id, version, request.query, cache_params
+            )
+            if cached is not None:
+                logger.info("Search served from the result cache")
+                return cached
+
             # First verify if user has any documents
             user_docs_query = (
                 select(Document.id)
@@ -420,10 +534,12 @@ class DocumentRoutes:
 
             # Perform multi-query search with user filtering
             try:
-                search_results = self.search_service.search(
+                search_results = await self.search_service.asearch(
                     query=request.query,
                     user_id=request.user_id,
                     limit=request.chunks_per_document,
+                    corpus_version=version,
+                    replica=replica,
                 )
                 logger.info(f"Search complete")
             except Exception as e:
@@ -490,11 +606,27 @@ class DocumentRoutes:
                 )
                 response_documents.append(doc_response)
 
-            return {
+            response = {
                 "documents": response_documents,
                 "total": len(response_documents),
                 "total_chunks": sum(len(doc.chunks) for doc in response_documents),
             }
+            # Chunk text dominates; the rest is a rough per-document overhead
+            size = sum(
+                len(chunk.content) + 64
+                for doc in response_documents
+                for chunk in doc.chunks
+            ) + 512 * (len(response_documents) + 1)
+            if cacheable:
+                self.result_cache.put(
+                    request.user_id,
+                    version,
+                    request.query,
+                    cache_params,
+                    response,
+                    size,
+                )
+            return response
 
         except HTTPException:
             raise
@@ -535,8 +667,10 @@ class DocumentRoutes:
 
             # Update document record with new path_array (no need to move the file)
             document.path_array = new_path_array
+            await bump_corpus_versions(db, [user_id])
             await db.commit()
             await db.refresh(document)
+            mark_recent_write(user_id=user_id)
 
             return DocumentResponse(
                 id=document.id,
@@ -15,7 +15,7 @@ from models.user_document import UserDocument
 from schemas.document import DocumentPrefixSearchResponse, DocumentResponse
 from sqlalchemy import func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from utils.database import get_db
+from utils.database import get_read_db
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -40,7 +40,7 @@ class SearchRoutes:
         user_id: int,
         query: str,
         similarity_threshold: float = 0.3,
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
     ) -> DocumentPrefixSearchResponse:
         try:
             # Input validation
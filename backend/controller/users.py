@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
-from utils.database import get_db
+from utils.database import get_db, get_read_db, mark_recent_write
 from models.user import User
 from models.organization import Organization
 from schemas.user import UserCreate, UserResponse, UserUpdate
@@ -42,6 +42,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
         db.add(db_user)
         await db.commit()
         await db.refresh(db_user)
+        mark_recent_write(user_id=db_user.id)
         return db_user
     except Exception as e:
         await db.rollback()
@@ -52,7 +53,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get user by ID."""
     stmt = select(User).where(User.id == user_id)
     result = await db.execute(stmt)
@@ -69,7 +70,7 @@ async def list_users(
     skip: int = 0,
     limit: int = 100,
     organization_id: int = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """List all users with optional organization filter and pagination."""
     stmt = select(User)
@@ -119,6 +120,7 @@ async def update_user(
             setattr(db_user, key, value)
         await db.commit()
         await db.refresh(db_user)
+        mark_recent_write(user_id=user_id)
         return db_user
     except Exception as e:
         await db.rollback()
@@ -142,6 +144,7 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
     try:
         await db.delete(db_user)
         await db.commit()
+        mark_recent_write(user_id=user_id)
     except Exception as e:
         await db.rollback()
         raise HTTPException(
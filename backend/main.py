@@ -15,8 +15,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from models.relationships import setup_relationships
 from schemas.streaming import StreamingChatRequest
 from sqlalchemy.ext.asyncio import AsyncSession
-from utils.database import get_db
+from utils.database import (
+    close_database,
+    get_database,
+    get_db,
+    get_read_db,
+    init_database,
+    mark_recent_write,
+)
 from utils.logging_config import setup_logging
+from utils.vector_store import close_vector_engines
 
 # Set up logging
 setup_logging()
@@ -37,11 +45,17 @@ async def lifespan(app: FastAPI):
         setup_relationships()
         logger.info("Database relationships configured")
 
+        # Create the shared connection pool once for the application lifetime
+        init_database()
+        logger.info("Database engine initialized")
+
         logger.info("Application startup complete")
         yield
 
         # Shutdown
         logger.info("Application shutdown initiated")
+        await close_vector_engines()
+        await close_database()
     except Exception as e:
         logger.error(f"Error during application lifecycle: {str(e)}", exc_info=True)
         raise
@@ -107,6 +121,22 @@ def read_root():
     return {"status": "healthy", "service": "Hermes API"}
 
 
+@app.get("/api/health/db")
+def database_health():
+    """Connection pool statistics for sizing the pool against worker count."""
+    return get_database().pool_status()
+
+
+@app.get("/api/health/search")
+def search_health():
+    """Hit rates of the search caches and size of the in-process index."""
+    routes = documents.document_routes
+    return {
+        **routes.search_service.stats(),
+        "result_cache": routes.result_cache.stats(),
+    }
+
+
 # Initialize agents
 agent = Agent()
 rag_streaming_agent = RAGStreamingAgent()
@@ -124,7 +154,7 @@ async def create_conversation(user_id: str, db_session: AsyncSession = Depends(g
 
 @app.get("/api/chat/conversation/{conversation_id}")
 async def get_conversation_messages(
-    conversation_id: UUID, db_session: AsyncSession = Depends(get_db)
+    conversation_id: UUID, db_session: AsyncSession = Depends(get_read_db)
 ):
     messages = await ConversationService.get_conversation_messages(
         db_session, conversation_id
@@ -133,7 +163,9 @@ async def get_conversation_messages(
 
 
 @app.get("/api/chat/conversations/{user_id}")
-async def list_conversations(user_id: str, db_session: AsyncSession = Depends(get_db)):
+async def list_conversations(
+    user_id: str, db_session: AsyncSession = Depends(get_read_db)
+):
     return await ConversationService.list_conversations(db_session, user_id)
 
 
@@ -143,6 +175,7 @@ async def delete_conversation(
 ):
     success = await ConversationService.delete_conversation(db_session, conversation_id)
     await db_session.commit()
+    mark_recent_write(conversation_id=conversation_id)
     return {"success": success}
 
 
@@ -26,7 +26,14 @@ if config.config_file_name is not None:
 
 # Import all your models here
 from models.base import Base
+from models.blob import Blob
+from models.chunk_minhash import ChunkMinHash
+from models.corpus_version import CorpusVersion
 from models.document import Document
+from models.document_chunk import DocumentChunk
+from models.document_job import DocumentJob
+from models.embedding_cache import EmbeddingCacheEntry
+from models.query_expansion import QueryExpansion
 from models.conversation import Message, ConversationHistory
 from models.user import User
 from models.organization import Organization
@@ -0,0 +1,166 @@
+"""create_document_chunks_table
+
+Revision ID: a8c4e1d7b2f6
+Revises: f3b9d2a7c1e5
+Create Date: 2026-10-17 18:12:44.905126
+
+"""
+
+import os
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "a8c4e1d7b2f6"
+down_revision: Union[str, None] = "f3b9d2a7c1e5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+BACKFILL_BATCH_SIZE = int(os.getenv("CHUNK_BACKFILL_BATCH_SIZE", "5000"))
+
+# Copy one batch of langchain vectors, keyed after the last copied id. Rows of
+# another dimension cannot go into the typed column and are skipped.
+BACKFILL_BATCH = sa.text(
+    """
+    WITH batch AS (
+        SELECT e.id
+        FROM langchain_pg_embedding e
+        WHERE e.id > :after
+        ORDER BY e.id
+        LIMIT :batch_size
+    ), copied AS (
+        INSERT INTO document_chunks (
+            id, collection, document_id, user_id, page, chunk_index,
+            start_index, end_index, token_count, chunk_hash, content,
+            metadata, embedding
+        )
+        SELECT
+            e.id,
+            c.name,
+            CAST(e.cmetadata->>'document_id' AS integer),
+            CAST(e.cmetadata->>'user_id' AS integer),
+            CAST(e.cmetadata->>'page' AS integer),
+            CAST(e.cmetadata->>'chunk_index' AS integer),
+            CAST(e.cmetadata->>'start_index' AS integer),
+            CAST(e.cmetadata->>'end_index' AS integer),
+            CAST(e.cmetadata->>'token_count' AS integer),
+            e.cmetadata->>'chunk_hash',
+            COALESCE(e.document, ''),
+            COALESCE(e.cmetadata, '{}'::jsonb),
+            CAST(e.embedding AS vector(%(dimensions)d))
+        FROM batch
+        JOIN langchain_pg_embedding e ON e.id = batch.id
+        JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+        WHERE e.cmetadata->>'document_id' IS NOT NULL
+          AND vector_dims(e.embedding) = %(dimensions)d
+        ON CONFLICT (id) DO NOTHING
+    )
+    SELECT max(id) FROM batch
+    """
+    % {"dimensions": EMBEDDING_DIMENSIONS}
+)
+
+
+def _backfill() -> None:
+    """Copy existing vectors in committed batches so the table stays writable."""
+    bind = op.get_bind()
+    exists = bind.execute(
+        sa.text("SELECT to_regclass('langchain_pg_embedding') IS NOT NULL")
+    ).scalar()
+    if not exists:
+        return
+
+    after = ""
+    while True:
+        last = bind.execute(
+            BACKFILL_BATCH, {"after": after, "batch_size": BACKFILL_BATCH_SIZE}
+        ).scalar()
+        if last is None:
+            return
+        after = last
+
+
+def upgrade() -> None:
+    """Create the typed chunk table, backfill it and build its HNSW index."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.create_table(
+        "document_chunks",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "collection",
+            sa.String(length=64),
+            nullable=False,
+            server_default="my_docs",
+        ),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("organization_id", sa.Integer(), nullable=True),
+        sa.Column("page", sa.Integer(), nullable=True),
+        sa.Column("chunk_index", sa.Integer(), nullable=True),
+        sa.Column("start_index", sa.Integer(), nullable=True),
+        sa.Column("end_index", sa.Integer(), nullable=True),
+        sa.Column("token_count", sa.Integer(), nullable=True),
+        sa.Column("chunk_hash", sa.String(length=64), nullable=True),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column(
+            "metadata",
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=False,
+            server_default=sa.text("'{}'::jsonb"),
+        ),
+        sa.Column("embedding", Vector(EMBEDDING_DIMENSIONS), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_document_chunks_collection_user_id",
+        "document_chunks",
+        ["collection", "user_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_document_chunks_organization_id",
+        "document_chunks",
+        ["organization_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_document_chunks_document_id",
+        "document_chunks",
+        ["document_id", "chunk_hash"],
+        unique=False,
+    )
+
+    # Backfill and index outside a transaction: each batch commits on its own
+    # and the HNSW build does not block writes
+    with op.get_context().autocommit_block():
+        _backfill()
+        op.create_index(
+            "ix_document_chunks_embedding_hnsw",
+            "document_chunks",
+            ["embedding"],
+            unique=False,
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Drop the chunk table; langchain_pg_embedding was left in place."""
+    op.drop_index("ix_document_chunks_embedding_hnsw", table_name="document_chunks")
+    op.drop_index("ix_document_chunks_document_id", table_name="document_chunks")
+    op.drop_index("ix_document_chunks_organization_id", table_name="document_chunks")
+    op.drop_index("ix_document_chunks_collection_user_id", table_name="document_chunks")
+    op.drop_table("document_chunks")
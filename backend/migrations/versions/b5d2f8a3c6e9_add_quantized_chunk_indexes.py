@@ -0,0 +1,57 @@
+"""add_quantized_chunk_indexes
+
+Revision ID: b5d2f8a3c6e9
+Revises: a8c4e1d7b2f6
+Create Date: 2026-10-17 19:40:08.271553
+
+"""
+
+import os
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b5d2f8a3c6e9"
+down_revision: Union[str, None] = "a8c4e1d7b2f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+# Quantized HNSW indexes by mode. Their expressions must match the ORDER BY
+# built by ChunkVectorStore for the planner to use them.
+INDEXES = {
+    "halfvec": (
+        "ix_document_chunks_embedding_halfvec",
+        f"((CAST(embedding AS halfvec({EMBEDDING_DIMENSIONS}))) halfvec_cosine_ops)",
+    ),
+    "binary": (
+        "ix_document_chunks_embedding_binary",
+        f"((CAST(binary_quantize(embedding) AS bit({EMBEDDING_DIMENSIONS}))) "
+        "bit_hamming_ops)",
+    ),
+}
+
+
+def _modes():
+    value = os.getenv("VECTOR_QUANTIZED_INDEXES", "halfvec,binary")
+    return [mode.strip() for mode in value.split(",") if mode.strip() in INDEXES]
+
+
+def upgrade() -> None:
+    """Build the quantized HNSW indexes without blocking writes."""
+    with op.get_context().autocommit_block():
+        for mode in _modes():
+            name, expression = INDEXES[mode]
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON document_chunks USING hnsw {expression}"
+            )
+
+
+def downgrade() -> None:
+    """Drop the quantized HNSW indexes."""
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES.values():
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,59 @@
+"""add_content_addressed_blobs
+
+Revision ID: c3f1a9e2b7d4
+Revises: 27c6f6b52425
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c3f1a9e2b7d4"
+down_revision: Union[str, None] = "27c6f6b52425"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create blobs table and link documents to their content hash."""
+    op.create_table(
+        "blobs",
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("file_path", sa.String(), nullable=False),
+        sa.Column("size_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("content_hash"),
+    )
+    op.add_column(
+        "documents", sa.Column("content_hash", sa.String(length=64), nullable=True)
+    )
+    op.create_foreign_key(
+        "fk_documents_content_hash_blobs",
+        "documents",
+        "blobs",
+        ["content_hash"],
+        ["content_hash"],
+    )
+    op.create_index(
+        "ix_documents_content_hash", "documents", ["content_hash"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Drop blobs table and the documents.content_hash column."""
+    op.drop_index("ix_documents_content_hash", table_name="documents")
+    op.drop_constraint(
+        "fk_documents_content_hash_blobs", "documents", type_="foreignkey"
+    )
+    op.drop_column("documents", "content_hash")
+    op.drop_table("blobs")
@@ -0,0 +1,39 @@
+"""create_corpus_versions_table
+
+Revision ID: c9e3a7f2d4b8
+Revises: b5d2f8a3c6e9
+Create Date: 2026-10-17 21:05:37.618240
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c9e3a7f2d4b8"
+down_revision: Union[str, None] = "b5d2f8a3c6e9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the per-user corpus version counters."""
+    op.create_table(
+        "corpus_versions",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    """Drop the per-user corpus version counters."""
+    op.drop_table("corpus_versions")
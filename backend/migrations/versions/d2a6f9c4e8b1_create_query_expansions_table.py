@@ -0,0 +1,50 @@
+"""create_query_expansions_table
+
+Revision ID: d2a6f9c4e8b1
+Revises: c9e3a7f2d4b8
+Create Date: 2026-10-17 22:14:52.390417
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "d2a6f9c4e8b1"
+down_revision: Union[str, None] = "c9e3a7f2d4b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the persistent query expansion cache."""
+    op.create_table(
+        "query_expansions",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("prompt_version", sa.String(length=16), nullable=False),
+        sa.Column("question", sa.Text(), nullable=False),
+        sa.Column("queries", postgresql.ARRAY(sa.Text()), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index(
+        "ix_query_expansions_created_at",
+        "query_expansions",
+        ["created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Drop the query expansion cache."""
+    op.drop_index("ix_query_expansions_created_at", table_name="query_expansions")
+    op.drop_table("query_expansions")
@@ -0,0 +1,82 @@
+"""create_document_jobs_table
+
+Revision ID: d4e8b1f6a2c9
+Revises: c3f1a9e2b7d4
+Create Date: 2026-10-17 11:02:17.540913
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "d4e8b1f6a2c9"
+down_revision: Union[str, None] = "c3f1a9e2b7d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the background job queue for document processing."""
+    op.create_table(
+        "document_jobs",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column(
+            "kind", sa.String(length=32), nullable=False, server_default="ingest"
+        ),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column(
+            "status", sa.String(length=16), nullable=False, server_default="queued"
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer(), nullable=False, server_default="5"),
+        sa.Column(
+            "run_after",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("locked_by", sa.String(), nullable=True),
+        sa.Column("locked_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("result", postgresql.JSONB(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_document_jobs_document_id", "document_jobs", ["document_id"], unique=False
+    )
+    op.create_index(
+        "ix_document_jobs_runnable",
+        "document_jobs",
+        ["run_after"],
+        unique=False,
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+    op.create_index(
+        "ix_document_jobs_running",
+        "document_jobs",
+        ["locked_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 'running'"),
+    )
+
+
+def downgrade() -> None:
+    """Drop the document job queue."""
+    op.drop_index("ix_document_jobs_running", table_name="document_jobs")
+    op.drop_index("ix_document_jobs_runnable", table_name="document_jobs")
+    op.drop_index("ix_document_jobs_document_id", table_name="document_jobs")
+    op.drop_table("document_jobs")
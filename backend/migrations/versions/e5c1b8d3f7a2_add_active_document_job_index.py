@@ -0,0 +1,48 @@
+"""add_active_document_job_index
+
+Revision ID: e5c1b8d3f7a2
+Revises: d2a6f9c4e8b1
+Create Date: 2026-10-17 23:41:08.162734
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5c1b8d3f7a2"
+down_revision: Union[str, None] = "d2a6f9c4e8b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Allow one queued or running job per document and kind."""
+    # Cancel queued duplicates, keeping the running job or the oldest one
+    op.execute(
+        """
+        UPDATE document_jobs j
+        SET status = 'cancelled', finished_at = now()
+        WHERE j.status = 'queued'
+          AND EXISTS (
+              SELECT 1 FROM document_jobs o
+              WHERE o.document_id = j.document_id
+                AND o.kind = j.kind
+                AND (o.status = 'running' OR (o.status = 'queued' AND o.id < j.id))
+          )
+        """
+    )
+    op.create_index(
+        "ux_document_jobs_active",
+        "document_jobs",
+        ["document_id", "kind"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    """Drop the active job index."""
+    op.drop_index("ux_document_jobs_active", table_name="document_jobs")
@@ -0,0 +1,55 @@
+"""create_embedding_cache_table
+
+Revision ID: e7a2c5d9f1b3
+Revises: d4e8b1f6a2c9
+Create Date: 2026-10-17 13:26:05.118342
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a2c5d9f1b3"
+down_revision: Union[str, None] = "d4e8b1f6a2c9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the persistent embedding cache."""
+    op.create_table(
+        "embedding_cache",
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("text_hash", sa.String(length=64), nullable=False),
+        sa.Column("dimensions", sa.Integer(), nullable=False),
+        sa.Column("embedding", sa.LargeBinary(), nullable=False),
+        sa.Column("hit_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column(
+            "last_used_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("model", "text_hash"),
+    )
+    op.create_index(
+        "ix_embedding_cache_last_used_at",
+        "embedding_cache",
+        ["last_used_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Drop the embedding cache."""
+    op.drop_index("ix_embedding_cache_last_used_at", table_name="embedding_cache")
+    op.drop_table("embedding_cache")
@@ -0,0 +1,70 @@
+"""create_chunk_minhashes_table
+
+Revision ID: f3b9d2a7c1e5
+Revises: e7a2c5d9f1b3
+Create Date: 2026-10-17 16:48:31.402617
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "f3b9d2a7c1e5"
+down_revision: Union[str, None] = "e7a2c5d9f1b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the MinHash signatures used for near-duplicate chunk detection."""
+    op.create_table(
+        "chunk_minhashes",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("signature", sa.LargeBinary(), nullable=False),
+        sa.Column("bands", postgresql.ARRAY(sa.BigInteger()), nullable=False),
+        sa.Column("representative_id", sa.String(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_chunk_minhashes_document_id",
+        "chunk_minhashes",
+        ["document_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_chunk_minhashes_representative_id",
+        "chunk_minhashes",
+        ["representative_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_chunk_minhashes_user_id", "chunk_minhashes", ["user_id"], unique=False
+    )
+    op.create_index(
+        "ix_chunk_minhashes_bands",
+        "chunk_minhashes",
+        ["bands"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    """Drop the MinHash signatures."""
+    op.drop_index("ix_chunk_minhashes_bands", table_name="chunk_minhashes")
+    op.drop_index("ix_chunk_minhashes_user_id", table_name="chunk_minhashes")
+    op.drop_index("ix_chunk_minhashes_representative_id", table_name="chunk_minhashes")
+    op.drop_index("ix_chunk_minhashes_document_id", table_name="chunk_minhashes")
+    op.drop_table("chunk_minhashes")
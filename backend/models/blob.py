@@ -0,0 +1,13 @@
+from models.base import Base
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String
+from sqlalchemy.sql import func
+
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    content_hash = Column(String(64), primary_key=True)  # SHA-256 of the file
+    file_path = Column(String, nullable=False)  # Local or S3 path
+    size_bytes = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # Documents using it
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
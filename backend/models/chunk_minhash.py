@@ -0,0 +1,28 @@
+from models.base import Base
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, LargeBinary, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import func
+
+
+class ChunkMinHash(Base):
+    __tablename__ = "chunk_minhashes"
+
+    id = Column(String, primary_key=True)  # Vector id the chunk has or would have
+    # Not a foreign key so rows of a deleted document can be purged in batches
+    document_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=True)
+    signature = Column(LargeBinary, nullable=False)  # MinHash, uint32 little-endian
+    bands = Column(ARRAY(BigInteger), nullable=False)  # LSH band keys
+    # Set for near-duplicates, which have no vector of their own
+    representative_id = Column(String, nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Candidate lookup: representatives sharing any band with a new chunk
+        Index(
+            "ix_chunk_minhashes_bands",
+            "bands",
+            postgresql_using="gin",
+        ),
+        Index("ix_chunk_minhashes_user_id", "user_id"),
+    )
@@ -0,0 +1,14 @@
+from models.base import Base
+from sqlalchemy import BigInteger, Column, DateTime, Integer
+from sqlalchemy.sql import func
+
+
+class CorpusVersion(Base):
+    __tablename__ = "corpus_versions"
+
+    # Not a foreign key so chunks of deleted users still invalidate caches
+    user_id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)  # Bumped on every write
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
@@ -1,5 +1,15 @@
 from models.base import Base
-from sqlalchemy import ARRAY, Boolean, Column, DateTime, Index, Integer, String, text
+from sqlalchemy import (
+    ARRAY,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    text,
+)
 from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -15,6 +25,9 @@ class Document(Base):
     )  # Directory hierarchy
     path_ltree = Column(String, nullable=False)  # Will store ltree path
     file_path = Column(String, nullable=False)  # Local or S3 path
+    content_hash = Column(
+        String(64), ForeignKey("blobs.content_hash"), nullable=True, index=True
+    )  # Shared content-addressed blob
     is_ingested = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
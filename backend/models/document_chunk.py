@@ -0,0 +1,46 @@
+import os
+
+from models.base import Base
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+# Dimensions of OPENAI_TEXT_EMBEDDING_MODEL (text-embedding-3-small by default)
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+
+    id = Column(String, primary_key=True)  # Deterministic chunk vector id
+    collection = Column(String(64), nullable=False, default="my_docs")
+    # Not a foreign key so a deleted document's chunks can be purged in batches
+    document_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    organization_id = Column(Integer, nullable=True)
+    page = Column(Integer, nullable=True)
+    chunk_index = Column(Integer, nullable=True)
+    start_index = Column(Integer, nullable=True)  # Character offsets in the page
+    end_index = Column(Integer, nullable=True)
+    token_count = Column(Integer, nullable=True)
+    chunk_hash = Column(String(64), nullable=True)  # SHA-256 of normalized text
+    content = Column(Text, nullable=False)
+    chunk_metadata = Column("metadata", JSONB, nullable=False, default=dict)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Filters applied before or alongside the vector search
+        Index("ix_document_chunks_collection_user_id", "collection", "user_id"),
+        Index("ix_document_chunks_organization_id", "organization_id"),
+        Index("ix_document_chunks_document_id", "document_id", "chunk_hash"),
+        # Approximate nearest neighbours by cosine distance
+        Index(
+            "ix_document_chunks_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
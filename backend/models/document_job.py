@@ -0,0 +1,65 @@
+from models.base import Base
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+
+class DocumentJob(Base):
+    __tablename__ = "document_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(
+        String(32), nullable=False, default="ingest"
+    )  # ingest, ingest_full, purge
+    # Not a foreign key so a job can outlive its document
+    document_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    status = Column(
+        String(16), nullable=False, default="queued"
+    )  # queued, running, succeeded, failed, cancelled
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )  # Earliest time a worker may pick the job up
+    locked_by = Column(String, nullable=True)  # Worker holding the job
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(JSONB, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Load server-side defaults (run_after, created_at) on insert
+    __mapper_args__ = {"eager_defaults": True}
+
+    __table_args__ = (
+        # Workers only ever scan runnable jobs, so keep that index small
+        Index(
+            "ix_document_jobs_runnable",
+            "run_after",
+            postgresql_where=text("status = 'queued'"),
+        ),
+        Index(
+            "ix_document_jobs_running",
+            "locked_at",
+            postgresql_where=text("status = 'running'"),
+        ),
+        # One active job per document and kind; enqueue inserts ON CONFLICT
+        Index(
+            "ux_document_jobs_active",
+            "document_id",
+            "kind",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
@@ -0,0 +1,20 @@
+from models.base import Base
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, String
+from sqlalchemy.sql import func
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    model = Column(String, primary_key=True)  # Embedding model name
+    text_hash = Column(String(64), primary_key=True)  # SHA-256 of normalized text
+    dimensions = Column(Integer, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 little-endian
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Eviction drops the least recently used entries
+        Index("ix_embedding_cache_last_used_at", "last_used_at"),
+    )
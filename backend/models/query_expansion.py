@@ -0,0 +1,21 @@
+from models.base import Base
+from sqlalchemy import Column, DateTime, Index, String, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import func
+
+
+class QueryExpansion(Base):
+    __tablename__ = "query_expansions"
+
+    # SHA-256 of (model, prompt version, normalized question)
+    key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    prompt_version = Column(String(16), nullable=False)
+    question = Column(Text, nullable=False)
+    queries = Column(ARRAY(Text), nullable=False)  # Expanded queries, in order
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Expired entries are deleted by age
+        Index("ix_query_expansions_created_at", "created_at"),
+    )
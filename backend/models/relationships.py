@@ -3,7 +3,12 @@ This module sets up SQLAlchemy relationships after all models are defined
 to avoid circular dependencies.
 """
 
+from models.blob import Blob
+from models.chunk_minhash import ChunkMinHash
 from models.document import Document
+from models.document_chunk import DocumentChunk
+from models.document_job import DocumentJob
+from models.embedding_cache import EmbeddingCacheEntry
 from models.organization import Organization
 from models.user import User
 from models.user_document import UserDocument
@@ -59,6 +59,32 @@ class IngestRequest(BaseModel):
     document_ids: List[int] = Field(
         ..., description="List of document IDs to ingest", min_items=1
     )
+    full: bool = Field(
+        default=False,
+        description="Re-embed every chunk instead of only the changed ones",
+    )
+
+
+class IngestJobResponse(BaseModel):
+    id: int
+    document_id: int
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    result: Optional[dict] = None
+    run_after: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class IngestResponse(BaseModel):
+    message: str
+    document_ids: List[int]
+    jobs: List[IngestJobResponse]
 
 
 class DirectoryNode(BaseModel):
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from fastapi import UploadFile
+from sqlalchemy import Delete, Insert, Select, TextClause, Update
+from sqlalchemy.dialects import postgresql
+from utils.docs.blobs import BlobStore
+from utils.storage import LocalStorage, spool_upload
+
+
+class FakeBlobSession:
+    """In-memory blobs table answering the statements BlobStore issues."""
+
+    def __init__(self):
+        # content_hash -> [file_path, size_bytes, ref_count]
+        self.blobs = {}
+        self.locked = []
+        self.commits = 0
+
+    async def execute(self, stmt, params=None):
+        if isinstance(stmt, TextClause):
+            self.locked.append(params["content_hash"])
+            return None
+        values = stmt.compile(dialect=postgresql.dialect()).params
+        if isinstance(stmt, Insert):
+            rows = []
+            i = 0
+            while f"content_hash_m{i}" in values:
+                content_hash = values[f"content_hash_m{i}"]
+                blob = self.blobs.setdefault(
+                    content_hash,
+                    [values[f"file_path_m{i}"], values[f"size_bytes_m{i}"], 0],
+                )
+                blob[2] += values[f"ref_count_m{i}"]
+                rows.append((content_hash, blob[0], blob[2]))
+                i += 1
+            return SimpleNamespace(all=lambda: rows)
+        if isinstance(stmt, Update):
+            self.blobs[values["content_hash_1"]][2] -= values["ref_count_1"]
+            return None
+        if isinstance(stmt, Delete):
+            gone = [
+                h
+                for h in values["content_hash_1"]
+                if h in self.blobs and self.blobs[h][2] <= values["ref_count_1"]
+            ]
+            paths = [self.blobs.pop(h)[0] for h in gone]
+            return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: paths))
+        if isinstance(stmt, Select):
+            found = [h for h in values["content_hash_1"] if h in self.blobs]
+            return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: found))
+        raise AssertionError(f"Unexpected statement {stmt}")
+
+    async def commit(self):
+        self.commits += 1
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(Path(self.tmp.name))
+        self.store = BlobStore(self.storage)
+        self.db = FakeBlobSession()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def spool(self, data: bytes):
+        upload = UploadFile(file=io.BytesIO(data), filename="test.pdf")
+        return asyncio.run(spool_upload(upload, self.storage.spool_dir, "none"))
+
+    def acquire(self, *contents: bytes) -> dict:
+        files = [(self.spool(data), "test.pdf") for data in contents]
+        keys = asyncio.run(self.store.acquire(self.db, files))
+        for stored, _ in files:
+            self.assertFalse(stored.path.exists())
+        return keys
+
+    def test_first_upload_stores_file(self):
+        """Test new content gets a row with one reference and its file"""
+        content_hash = hashlib.sha256(b"first").hexdigest()
+        keys = self.acquire(b"first")
+
+        key = keys[content_hash]
+        self.assertEqual(key, self.store.blob_key(content_hash, "test.pdf"))
+        self.assertEqual(self.db.blobs[content_hash], [key, 5, 1])
+        self.assertEqual(asyncio.run(self.storage.read_bytes(key)), b"first")
+        self.assertEqual(self.db.locked, [content_hash])
+
+    def test_duplicate_upload_adds_reference(self):
+        """Test stored content is referenced again without another file copy"""
+        content_hash = hashlib.sha256(b"same").hexdigest()
+        self.acquire(b"same", b"same")
+        keys = self.acquire(b"same")
+
+        self.assertEqual(self.db.blobs[content_hash][2], 3)
+        self.assertEqual(
+            [o.key for o in asyncio.run(self.storage.list("blobs/"))],
+            [keys[content_hash]],
+        )
+
+    def test_release_of_shared_blob_keeps_file(self):
+        """Test dropping one of several references leaves the blob alone"""
+        content_hash = hashlib.sha256(b"shared").hexdigest()
+        key = self.acquire(b"shared", b"shared")[content_hash]
+
+        unreferenced = asyncio.run(self.store.release(self.db, [content_hash]))
+
+        self.assertEqual(unreferenced, [])
+        self.assertEqual(self.db.blobs[content_hash][2], 1)
+        self.assertTrue(asyncio.run(self.storage.exists(key)))
+
+    def test_last_release_deletes_file(self):
+        """Test the last reference removes the row and, after commit, the file"""
+        content_hash = hashlib.sha256(b"last").hexdigest()
+        key = self.acquire(b"last")[content_hash]
+
+        unreferenced = asyncio.run(self.store.release(self.db, [content_hash]))
+        deleted = asyncio.run(self.store.delete_files(self.db, unreferenced))
+
+        self.assertEqual(unreferenced, [key])
+        self.assertEqual(deleted, [key])
+        self.assertNotIn(content_hash, self.db.blobs)
+        self.assertFalse(asyncio.run(self.storage.exists(key)))
+
+    def test_reupload_before_file_deletion_keeps_file(self):
+        """Test a file is kept when its content was stored again after release"""
+        content_hash = hashlib.sha256(b"again").hexdigest()
+        key = self.acquire(b"again")[content_hash]
+        unreferenced = asyncio.run(self.store.release(self.db, [content_hash]))
+
+        self.acquire(b"again")
+        deleted = asyncio.run(self.store.delete_files(self.db, unreferenced))
+
+        self.assertEqual(deleted, [])
+        self.assertEqual(asyncio.run(self.storage.read_bytes(key)), b"again")
+
+    def test_pre_blob_files_are_deleted(self):
+        """Test files of documents stored before blobs are deleted directly"""
+        legacy = Path(self.tmp.name) / "1.pdf"
+        legacy.write_bytes(b"legacy")
+
+        deleted = asyncio.run(self.store.delete_files(self.db, [str(legacy)]))
+
+        self.assertEqual(deleted, [str(legacy)])
+        self.assertFalse(legacy.exists())
+        self.assertEqual(self.db.locked, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
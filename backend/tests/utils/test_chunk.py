@@ -0,0 +1,67 @@
+import unittest
+
+from langchain.schema import Document
+from utils.docs.chunk import Chunk
+
+
+class ByteEncoding:
+    """One token per UTF-8 byte instead of loading a tiktoken encoding."""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text.encode("utf-8"))
+
+    def decode_tokens_bytes(self, tokens):
+        return [bytes([t]) for t in tokens]
+
+    def decode_with_offsets(self, tokens):
+        data = bytes(tokens)
+        text = data.decode("utf-8")
+        offsets = [len(data[:i].decode("utf-8", "ignore")) for i in range(len(data))]
+        return text, offsets
+
+
+class TestTokenChunking(unittest.TestCase):
+    def setUp(self):
+        self.chunk = Chunk(mode="tokens", encoding=ByteEncoding())
+        self.chunk.chunk_tokens = 10
+        self.chunk.overlap_tokens = 4
+
+    def test_windows_overlap_and_keep_metadata(self):
+        """Test token windows overlap, record offsets and keep the page metadata"""
+        page = Document(page_content="abcdefghijklmnopqrstuvwxyz", metadata={"page": 3})
+        chunks = self.chunk.chunk_docs([page])
+
+        self.assertEqual(
+            [c.page_content for c in chunks],
+            ["abcdefghij", "ghijklmnop", "mnopqrstuv", "stuvwxyz"],
+        )
+        self.assertEqual(chunks[1].metadata["start_index"], 6)
+        self.assertEqual(chunks[1].metadata["end_index"], 16)
+        self.assertEqual(chunks[3].metadata["token_count"], 8)
+        self.assertEqual(chunks[3].metadata["chunk_index"], 3)
+        self.assertEqual(chunks[0].metadata["page"], 3)
+        self.assertNotIn("chunk_index", page.metadata)
+        self.assertEqual(len({c.metadata["chunk_hash"] for c in chunks}), 4)
+
+    def test_multibyte_text_is_sliced_by_characters(self):
+        """Test offsets stay on character boundaries for non-ASCII text"""
+        page = Document(page_content="héllo wörld çà va", metadata={})
+        chunks = self.chunk.chunk_docs([page])
+
+        for chunk in chunks:
+            start, end = chunk.metadata["start_index"], chunk.metadata["end_index"]
+            self.assertEqual(chunk.page_content, page.page_content[start:end])
+        self.assertTrue(chunks[-1].page_content.endswith("va"))
+
+    def test_empty_page(self):
+        """Test blank pages produce no chunks"""
+        self.assertEqual(self.chunk.chunk_docs([Document(page_content="")]), [])
+
+    def test_invalid_mode(self):
+        """Test an unknown chunk mode is rejected"""
+        with self.assertRaises(ValueError):
+            Chunk(mode="sentences")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+from langchain.schema import Document
+from utils.docs.dedupe import ChunkDeduplicator, DedupeRun, MinHasher
+
+FOOTER = (
+    "This document is confidential and intended solely for the use of the "
+    "individual to whom it is addressed. If you have received it in error "
+    "please notify the sender and delete it from your system immediately."
+)
+
+
+class TestMinHasher(unittest.TestCase):
+    def setUp(self):
+        self.hasher = MinHasher()
+
+    def test_similar_texts_have_similar_signatures(self):
+        """Test near-identical texts share bands and unrelated texts do not"""
+        signatures = self.hasher.signatures(
+            [FOOTER, FOOTER.replace("immediately", "at once"), "revenue grew in q3"]
+        )
+        bands = self.hasher.band_keys(signatures)
+
+        self.assertGreater(self.hasher.similarity(signatures[0], signatures[1]), 0.7)
+        self.assertLess(self.hasher.similarity(signatures[0], signatures[2]), 0.2)
+        self.assertTrue(set(bands[0]) & set(bands[1]))
+        self.assertFalse(set(bands[0]) & set(bands[2]))
+
+    def test_signatures_are_stable(self):
+        """Test signatures only depend on the normalized text"""
+        first = MinHasher().signatures([FOOTER])
+        second = MinHasher().signatures(["  " + FOOTER.upper().replace(" ", "\n")])
+        self.assertTrue((first == second).all())
+
+
+class TestChunkDeduplicator(unittest.TestCase):
+    def test_duplicates_within_document_are_dropped(self):
+        """Test only the first of several near-identical chunks is embedded"""
+        deduplicator = ChunkDeduplicator()
+        deduplicator.cross_document = False
+        deduplicator.threshold = 0.7
+        chunks = [
+            Document(page_content=text, id=str(i))
+            for i, text in enumerate(
+                [FOOTER, "Quarterly revenue grew by ten percent.", FOOTER + " Page 2"]
+            )
+        ]
+        run = DedupeRun(document_id=1, user_id=1)
+
+        unique = asyncio.run(
+            deduplicator.filter(run, chunks, chunks, [], deduplicator.sign(chunks))
+        )
+
+        self.assertEqual([c.id for c in unique], ["0", "1"])
+        self.assertEqual(run.duplicates, 1)
+        self.assertEqual(run.rows[2].representative_id, "0")
+        self.assertEqual(run.chars_saved, len(chunks[2].page_content))
+
+
+if __name__ == "__main__":
+    unittest.main()
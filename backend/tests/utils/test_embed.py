@@ -0,0 +1,70 @@
+import asyncio
+import time
+import unittest
+
+import httpx
+import openai
+from utils.docs.embed import EmbeddingExecutor, TokenBucket
+
+
+class WordEncoding:
+    """Counts one token per word instead of loading a tiktoken encoding."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+class FlakyModel:
+    """Fails the first call for any batch containing 'flaky'."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        if "flaky" in texts and sum("flaky" in c for c in self.calls) == 1:
+            response = httpx.Response(
+                429,
+                headers={"retry-after": "0"},
+                request=httpx.Request("POST", "https://api.openai.com"),
+            )
+            raise openai.RateLimitError("rate limited", response=response, body=None)
+        return [[float(len(text))] for text in texts]
+
+
+class TestEmbeddingExecutor(unittest.TestCase):
+    def setUp(self):
+        self.model = FlakyModel()
+        self.executor = EmbeddingExecutor(self.model, encoding=WordEncoding())
+        self.executor.max_batch_tokens = 4
+        self.executor.max_batch_texts = 3
+
+    def test_batches_respect_token_and_size_limits(self):
+        """Test texts are grouped by token count and batch size"""
+        texts = ["a b", "c d", "e", "f", "g", "h i j k l"]
+        self.assertEqual(self.executor.make_batches(texts), [[0, 1], [2, 3, 4], [5]])
+
+    def test_retries_only_failed_batch(self):
+        """Test a throttled batch is retried without re-sending the others"""
+        texts = ["one two", "three four", "flaky", "last"]
+        vectors = asyncio.run(self.executor.embed(texts))
+
+        self.assertEqual(vectors, [[7.0], [10.0], [5.0], [4.0]])
+        self.assertEqual(sum("one two" in call for call in self.model.calls), 1)
+        self.assertEqual(sum("flaky" in call for call in self.model.calls), 2)
+
+    def test_token_bucket_paces_requests(self):
+        """Test the bucket waits for tokens once its capacity is spent"""
+        bucket = TokenBucket(rate_per_minute=600, capacity=1)
+
+        async def take_three():
+            for _ in range(3):
+                await bucket.acquire(1)
+
+        start = time.monotonic()
+        asyncio.run(take_three())
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+
+if __name__ == "__main__":
+    unittest.main()
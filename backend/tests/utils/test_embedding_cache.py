@@ -0,0 +1,112 @@
+import asyncio
+import contextlib
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy import TextClause
+from utils.docs.embedding_cache import (
+    EmbeddingCache,
+    decode_vector,
+    encode_vector,
+    text_hash,
+)
+
+
+class MemoryEmbeddingCache(EmbeddingCache):
+    """Keeps entries in a dict instead of the embedding_cache table."""
+
+    def __init__(self):
+        super().__init__("test-model")
+        self.entries = {}
+
+    async def lookup(self, hashes):
+        return {h: self.entries[h] for h in hashes if h in self.entries}
+
+    async def store(self, vectors):
+        self.entries.update(vectors)
+
+
+class FakeCacheSession:
+    """Answers lookups from (hash, vector, stale) rows and records touches."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.touches = []
+
+    async def execute(self, stmt, params=None):
+        if isinstance(stmt, TextClause):
+            self.touches.append(dict(zip(params["hashes"], params["hits"])))
+            return None
+        return SimpleNamespace(all=lambda: self.rows)
+
+    async def commit(self):
+        pass
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = MemoryEmbeddingCache()
+        self.embedded = []
+
+    async def embed(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t))] for t in texts]
+
+    def test_normalized_hash(self):
+        """Test whitespace-only differences share a cache key"""
+        self.assertEqual(text_hash("Hello   world\n"), text_hash(" Hello world"))
+        self.assertNotEqual(text_hash("Hello world"), text_hash("hello world"))
+
+    def test_vector_round_trip(self):
+        """Test vectors are stored as float32 bytes"""
+        data = encode_vector([0.5, -1.25, 3.0])
+        self.assertEqual(len(data), 12)
+        self.assertEqual(decode_vector(data), [0.5, -1.25, 3.0])
+
+    def test_only_misses_are_embedded(self):
+        """Test cached texts are not sent to the provider again"""
+        asyncio.run(self.cache.embed(["alpha", "beta"], self.embed))
+        vectors = asyncio.run(
+            self.cache.embed(["alpha", "gamma", "gamma", "beta"], self.embed)
+        )
+
+        self.assertEqual(vectors, [[5.0], [5.0], [5.0], [4.0]])
+        self.assertEqual(self.embedded, ["alpha", "beta", "gamma"])
+        self.assertEqual(self.cache.stats()["hits"], 2)
+        self.assertEqual(self.cache.stats()["misses"], 4)
+
+    def lookup(self, cache, session, hashes):
+        @contextlib.asynccontextmanager
+        async def async_session():
+            yield session
+
+        database = SimpleNamespace(async_session=async_session)
+        with mock.patch("utils.docs.embedding_cache.get_database", lambda: database):
+            return asyncio.run(cache.lookup(hashes))
+
+    def test_recent_hits_are_not_written(self):
+        """Test hits on recently touched entries are only counted in memory"""
+        cache = EmbeddingCache("test-model")
+        session = FakeCacheSession([("a", encode_vector([1.0]), False)])
+        self.lookup(cache, session, ["a"])
+        found = self.lookup(cache, session, ["a"])
+
+        self.assertEqual(found, {"a": [1.0]})
+        self.assertEqual(session.touches, [])
+        self.assertEqual(cache._pending_hits["a"], 2)
+
+    def test_stale_hit_touches_pending_entries_at_once(self):
+        """Test an entry due for a touch writes every pending hit in one statement"""
+        cache = EmbeddingCache("test-model")
+        session = FakeCacheSession([("a", encode_vector([1.0]), False)])
+        self.lookup(cache, session, ["a"])
+        session.rows.append(("b", encode_vector([2.0]), True))
+        self.lookup(cache, session, ["a", "b"])
+
+        self.assertEqual(session.touches, [{"a": 2, "b": 1}])
+        self.assertEqual(cache._pending_hits, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from utils.docs.gc import DELETE_DOCUMENTS_EMBEDDINGS, GarbageCollector, GcReport
+from utils.storage import LocalStorage
+
+
+class ReferencedKeysSession:
+    """Answers every file_path lookup with the same referenced keys."""
+
+    def __init__(self, referenced):
+        self.referenced = referenced
+
+    async def execute(self, stmt, params=None):
+        return self
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return list(self.referenced)
+
+    def __iter__(self):
+        return iter(self.referenced)
+
+    async def commit(self):
+        pass
+
+
+class OrphanChunksSession:
+    """Chunks per document id behind the orphan lookup and batched delete."""
+
+    def __init__(self, chunks, existing):
+        self.chunks = dict(chunks)
+        self.existing = set(existing)
+        self.lookups = []
+
+    async def execute(self, stmt, params):
+        if stmt is DELETE_DOCUMENTS_EMBEDDINGS:
+            deleted = 0
+            for document_id in params["document_ids"]:
+                take = min(self.chunks[document_id], params["batch_size"] - deleted)
+                self.chunks[document_id] -= take
+                deleted += take
+            return SimpleNamespace(one=lambda: (deleted, deleted * 10))
+        self.lookups.append(params["after"])
+        orphans = [
+            document_id
+            for document_id, count in sorted(self.chunks.items())
+            if count
+            and document_id > params["after"]
+            and document_id not in self.existing
+        ]
+        return SimpleNamespace(scalars=lambda: orphans[: params["batch_size"]])
+
+    async def commit(self):
+        pass
+
+
+class FailingConnection:
+    def __init__(self):
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execution_options(self, **options):
+        return self
+
+    async def execute(self, statement):
+        self.statements.append(str(statement))
+        if str(statement).startswith("VACUUM"):
+            raise RuntimeError("canceling statement due to statement timeout")
+
+
+class TestGarbageCollector(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(Path(self.tmp.name))
+        self.gc = GarbageCollector(self.storage)
+        self.gc.grace_seconds = 60
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, key: str, data: bytes, age: float) -> Path:
+        path = self.storage.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_unreferenced_old_files_are_deleted(self):
+        """Test only old blob files without a row are removed and counted"""
+        kept = self.write("blobs/aa/bb/kept.pdf", b"kept", age=600)
+        orphan = self.write("blobs/cc/dd/orphan.pdf", b"orphan", age=600)
+        fresh = self.write("blobs/ee/ff/fresh.pdf", b"fresh", age=0)
+        report = GcReport()
+
+        asyncio.run(
+            self.gc._collect_files(
+                ReferencedKeysSession(["blobs/aa/bb/kept.pdf"]), report
+            )
+        )
+
+        self.assertTrue(kept.exists())
+        self.assertFalse(orphan.exists())
+        self.assertTrue(fresh.exists())
+        self.assertEqual((report.files_deleted, report.file_bytes), (1, 6))
+
+    def test_abandoned_spool_files_are_deleted(self):
+        """Test stale spooled uploads are swept and in-flight ones are not"""
+        stale = self.write("tmp/.old.part", b"12345", age=600)
+        active = self.write("tmp/.new.part", b"12", age=0)
+        report = GcReport()
+
+        asyncio.run(self.gc._collect_spool(report))
+
+        self.assertFalse(stale.exists())
+        self.assertTrue(active.exists())
+        self.assertEqual(report.file_bytes, 5)
+
+    def test_orphan_embeddings_are_deleted_by_document(self):
+        """Test vectors of deleted documents go in batches, pages of ids at a time"""
+        self.gc.batch_size = 2
+        db = OrphanChunksSession({1: 3, 2: 1, 3: 2, 4: 1}, existing=[2])
+        report = GcReport()
+
+        asyncio.run(self.gc._collect_embeddings(db, report))
+
+        self.assertEqual(db.chunks, {1: 0, 2: 1, 3: 0, 4: 0})
+        self.assertEqual(report.embeddings_deleted, 6)
+        self.assertEqual(db.lookups, [0, 3])
+
+    def test_failed_maintenance_is_reported(self):
+        """Test maintenance lifts the statement timeout and reports failures"""
+        conn = FailingConnection()
+        database = SimpleNamespace(engine=SimpleNamespace(connect=lambda: conn))
+        report = GcReport()
+
+        with mock.patch("utils.docs.gc.get_database", return_value=database):
+            asyncio.run(self.gc._maintain("VACUUM (ANALYZE) document_chunks", report))
+
+        self.assertEqual(
+            conn.statements,
+            [
+                "SET statement_timeout = 0",
+                "VACUUM (ANALYZE) document_chunks",
+                "RESET statement_timeout",
+            ],
+        )
+        self.assertEqual(report.maintenance, [])
+        self.assertEqual(len(report.as_dict()["errors"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+import asyncio
+import contextlib
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from langchain.schema import Document
+from utils.docs.ingest import IngestService
+from utils.docs.pipeline import IngestPipeline
+from utils.vector_store import chunk_vector_id
+
+
+class FakeParser:
+    async def iter_pages(self, data: bytes, source: str):
+        yield [
+            Document(page_content=chr(c), metadata={"page": i})
+            for i, c in enumerate(data)
+        ]
+
+
+class FakeChunk:
+    def chunk_docs(self, docs):
+        for doc in docs:
+            doc.metadata["chunk_hash"] = doc.page_content
+        return docs
+
+
+class FakeTable:
+    """Chunk rows, with deletes held back until the session commits."""
+
+    def __init__(self, ids):
+        self.rows = set(ids)
+        self.pending_deletes = set()
+
+    async def aembed_texts(self, texts):
+        return [[1.0] for _ in texts]
+
+    def add_embeddings(self, docs, vectors):
+        for doc in docs:
+            if doc.id in self.pending_deletes:
+                raise AssertionError(f"upsert of {doc.id} waits on the delete")
+            self.rows.add(doc.id)
+        return [doc.id for doc in docs]
+
+    async def delete(self, db, ids):
+        self.pending_deletes.update(ids)
+        return len(set(ids) & self.rows)
+
+
+class FakeSession:
+    def __init__(self, document, table):
+        self.document = document
+        self.table = table
+
+    async def get(self, model, key):
+        return self.document
+
+    async def commit(self):
+        self.table.rows -= self.table.pending_deletes
+        self.table.pending_deletes.clear()
+
+
+class SourceSession(FakeSession):
+    """Finds an ingested duplicate and keeps deletes of rolled back savepoints out."""
+
+    def __init__(self, document, table, source_id):
+        super().__init__(document, table)
+        self.source_id = source_id
+
+    async def execute(self, stmt):
+        return SimpleNamespace(scalar_one_or_none=lambda: self.source_id)
+
+    @contextlib.asynccontextmanager
+    async def begin_nested(self):
+        pending = set(self.table.pending_deletes)
+        try:
+            yield
+        except BaseException:
+            self.table.pending_deletes = pending
+            raise
+
+
+class TestIngestService(unittest.TestCase):
+    def test_full_reingest_of_unchanged_document(self):
+        """Test incremental=False rewrites the same ids without deleting them first"""
+        ids = [chunk_vector_id(7, c, 0) for c in "abc"]
+        table = FakeTable(ids)
+        document = SimpleNamespace(
+            id=7, content_hash=None, file_path="blobs/x", is_ingested=True
+        )
+
+        service = IngestService.__new__(IngestService)
+        service.storage = SimpleNamespace(
+            read_bytes=mock.AsyncMock(return_value=b"abc")
+        )
+        service.job_queue = None
+        service.pipeline = IngestPipeline(FakeChunk(), table, FakeParser())
+
+        async def run():
+            try:
+                return await service.ingest_document(
+                    FakeSession(document, table), 7, None, incremental=False
+                )
+            finally:
+                await service.pipeline.close()
+
+        async def delete_document(db, document_id):
+            return await table.delete(db, list(table.rows))
+
+        stored = {c: [i] for c, i in zip("abc", ids)}
+        with mock.patch.multiple(
+            "utils.docs.ingest",
+            get_document_chunk_hashes=mock.AsyncMock(return_value=stored),
+            delete_embeddings=mock.AsyncMock(side_effect=table.delete),
+            delete_document_embeddings=mock.AsyncMock(side_effect=delete_document),
+            update_embedding_metadata=mock.AsyncMock(return_value=0),
+            save_signatures=mock.AsyncMock(return_value=[]),
+            requeue_referencing=mock.AsyncMock(return_value=0),
+            bump_corpus_versions=mock.AsyncMock(),
+            mark_recent_write=mock.Mock(),
+        ):
+            result = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+        self.assertEqual(result["embeddings_created"], 3)
+        self.assertEqual(result["embeddings_deleted"], 0)
+        self.assertEqual(table.rows, set(ids))
+        self.assertTrue(document.is_ingested)
+
+    def test_failed_link_rolls_back_its_delete(self):
+        """Test a link that copies nothing does not leave its delete behind"""
+        ids = [chunk_vector_id(7, c, 0) for c in "abc"]
+        table = FakeTable(ids)
+        document = SimpleNamespace(
+            id=7, content_hash="same", file_path="blobs/x", is_ingested=False
+        )
+
+        service = IngestService.__new__(IngestService)
+        service.storage = SimpleNamespace(
+            read_bytes=mock.AsyncMock(return_value=b"abc")
+        )
+        service.job_queue = None
+        service.pipeline = IngestPipeline(FakeChunk(), table, FakeParser())
+
+        async def run():
+            try:
+                return await service.ingest_document(
+                    SourceSession(document, table, 9), 7, None, incremental=False
+                )
+            finally:
+                await service.pipeline.close()
+
+        async def delete_document(db, document_id):
+            return await table.delete(db, list(table.rows))
+
+        stored = {c: [i] for c, i in zip("abc", ids)}
+        source = {c: [f"source-{c}"] for c in "abc"}
+        with mock.patch.multiple(
+            "utils.docs.ingest",
+            get_document_chunk_hashes=mock.AsyncMock(
+                side_effect=lambda db, document_id: (
+                    source if document_id == 9 else stored
+                )
+            ),
+            clone_document_embeddings=mock.AsyncMock(return_value=0),
+            has_duplicate_chunks=mock.AsyncMock(return_value=False),
+            delete_embeddings=mock.AsyncMock(side_effect=table.delete),
+            delete_document_embeddings=mock.AsyncMock(side_effect=delete_document),
+            update_embedding_metadata=mock.AsyncMock(return_value=0),
+            save_signatures=mock.AsyncMock(return_value=[]),
+            requeue_referencing=mock.AsyncMock(return_value=0),
+            bump_corpus_versions=mock.AsyncMock(),
+            mark_recent_write=mock.Mock(),
+        ):
+            result = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+        self.assertEqual(result["embeddings_linked"], 0)
+        self.assertEqual(result["embeddings_created"], 3)
+        self.assertEqual(table.rows, set(ids))
+        self.assertTrue(document.is_ingested)
+
+    def link(self, source_has_duplicates: bool):
+        """Ingest document 7 whose content matches ingested document 9."""
+        # Also stands in for the owner, which has no organization
+        document = SimpleNamespace(
+            id=7,
+            content_hash="same",
+            file_path="blobs/x",
+            is_ingested=False,
+            organization_id=None,
+        )
+        table = FakeTable([])
+        service = IngestService.__new__(IngestService)
+        service.storage = SimpleNamespace(
+            read_bytes=mock.AsyncMock(return_value=b"abc")
+        )
+        service.job_queue = None
+        service.pipeline = IngestPipeline(FakeChunk(), table, FakeParser())
+
+        async def run():
+            try:
+                return await service.ingest_document(
+                    SourceSession(document, table, 9), 7, 3
+                )
+            finally:
+                await service.pipeline.close()
+
+        source = {c: [f"source-{c}"] for c in "abc"}
+        mocks = dict(
+            get_document_chunk_hashes=mock.AsyncMock(
+                side_effect=lambda db, document_id: source if document_id == 9 else {}
+            ),
+            clone_document_embeddings=mock.AsyncMock(return_value=3),
+            has_duplicate_chunks=mock.AsyncMock(return_value=source_has_duplicates),
+            clone_signatures=mock.AsyncMock(return_value=["old-representative"]),
+            delete_embeddings=mock.AsyncMock(side_effect=table.delete),
+            delete_document_embeddings=mock.AsyncMock(return_value=0),
+            update_embedding_metadata=mock.AsyncMock(return_value=0),
+            save_signatures=mock.AsyncMock(return_value=[]),
+            requeue_referencing=mock.AsyncMock(return_value=0),
+            bump_corpus_versions=mock.AsyncMock(),
+            mark_recent_write=mock.Mock(),
+        )
+        with mock.patch.multiple("utils.docs.ingest", **mocks):
+            result = asyncio.run(asyncio.wait_for(run(), timeout=5))
+        return result, mocks
+
+    def test_link_copies_signatures(self):
+        """Test a linked document gets the source's signatures under its own ids"""
+        result, mocks = self.link(source_has_duplicates=False)
+
+        self.assertEqual(result["embeddings_linked"], 3)
+        ids = {f"source-{c}": chunk_vector_id(7, c, 0) for c in "abc"}
+        self.assertEqual(
+            mocks["clone_document_embeddings"].await_args.kwargs["ids"], ids
+        )
+        mocks["clone_signatures"].assert_awaited_once_with(mock.ANY, 9, 7, ids, 3)
+        mocks["requeue_referencing"].assert_awaited_once_with(
+            mock.ANY, ["old-representative"], None, 7
+        )
+
+    def test_source_with_near_duplicates_is_not_linked(self):
+        """Test chunks the source deduped are embedded rather than lost"""
+        result, mocks = self.link(source_has_duplicates=True)
+
+        self.assertEqual(result["embeddings_linked"], 0)
+        self.assertEqual(result["embeddings_created"], 3)
+        mocks["clone_document_embeddings"].assert_not_awaited()
+        mocks["clone_signatures"].assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from models.document_job import DocumentJob
+from sqlalchemy import Insert
+from sqlalchemy.dialects import postgresql
+from utils.docs.jobs import JobQueue
+
+
+class RecordingSession:
+    """Captures statements instead of running them."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+        return self
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+    async def commit(self):
+        pass
+
+
+class JobTableSession:
+    """Active jobs answering enqueue's lookup; inserts get the next ids."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.statements = []
+
+    async def execute(self, stmt):
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        self.statements.append(str(compiled))
+        if isinstance(stmt, Insert):
+            values = compiled.params
+            inserted = []
+            i = 0
+            while f"document_id_m{i}" in values:
+                inserted.append(
+                    DocumentJob(
+                        id=100 + len(self.jobs) + i,
+                        kind=values[f"kind_m{i}"],
+                        document_id=values[f"document_id_m{i}"],
+                        status="queued",
+                    )
+                )
+                i += 1
+            self.jobs.extend(inserted)
+            rows = inserted
+        else:
+            rows = [job for job in self.jobs if job.status in ("queued", "running")]
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: rows))
+
+    async def flush(self):
+        pass
+
+
+class TestJobQueue(unittest.TestCase):
+    def test_backoff_grows_and_is_capped(self):
+        """Test retry delays double per attempt up to the configured maximum"""
+        queue = JobQueue()
+        queue.backoff_base = 10
+        queue.backoff_max = 60
+
+        self.assertTrue(5 <= queue.backoff(1) <= 10)
+        self.assertTrue(20 <= queue.backoff(3) <= 40)
+        self.assertTrue(30 <= queue.backoff(10) <= 60)
+
+    def test_claim_skips_locked_jobs(self):
+        """Test workers claim jobs with FOR UPDATE SKIP LOCKED"""
+        session = RecordingSession()
+        jobs = asyncio.run(JobQueue().claim(session, "worker-1", limit=4))
+
+        self.assertEqual(jobs, [])
+        self.assertIn("FOR UPDATE SKIP LOCKED", session.statements[0])
+        self.assertIn("RETURNING", session.statements[0])
+
+    def test_claim_waits_for_conflicting_running_jobs(self):
+        """Test queued jobs are not claimed next to a conflicting running job"""
+        session = RecordingSession()
+        asyncio.run(JobQueue().claim(session, "worker-1"))
+
+        self.assertIn("NOT (EXISTS", session.statements[0])
+
+    def test_heartbeat_refreshes_own_lock(self):
+        """Test a heartbeat only touches a job still running under the worker"""
+        session = RecordingSession()
+        session.scalar_one_or_none = lambda: 7
+
+        self.assertTrue(asyncio.run(JobQueue().heartbeat(session, 7, "worker-1")))
+        self.assertIn("SET locked_at=now()", session.statements[0])
+        self.assertIn("locked_by", session.statements[0])
+
+    def enqueue(self, jobs, kind):
+        session = JobTableSession(jobs)
+        result = asyncio.run(JobQueue().enqueue(session, [1], 3, kind=kind))
+        return result[0], session
+
+    def test_full_ingest_upgrades_queued_ingest(self):
+        """Test a queued incremental ingestion becomes a full one"""
+        queued = DocumentJob(id=1, kind="ingest", document_id=1, status="queued")
+        job, session = self.enqueue([queued], "ingest_full")
+
+        self.assertIs(job, queued)
+        self.assertEqual(job.kind, "ingest_full")
+        self.assertEqual(len(session.statements), 1)
+
+    def test_full_ingest_queued_behind_running_ingest(self):
+        """Test a running incremental ingestion is not reused for a full one"""
+        running = DocumentJob(id=1, kind="ingest", document_id=1, status="running")
+        job, session = self.enqueue([running], "ingest_full")
+
+        self.assertIsNot(job, running)
+        self.assertEqual((job.kind, running.kind), ("ingest_full", "ingest"))
+        self.assertIn("ON CONFLICT (document_id, kind)", session.statements[1])
+        self.assertIn("DO NOTHING", session.statements[1])
+
+    def test_ingest_reuses_active_full_ingest(self):
+        """Test an incremental ingestion is covered by an active full one"""
+        full = DocumentJob(id=1, kind="ingest_full", document_id=1, status="queued")
+        job, _ = self.enqueue([full], "ingest")
+
+        self.assertIs(job, full)
+        self.assertEqual(job.kind, "ingest_full")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from utils.docs.pdf import PdfParseError, PdfParser, load_pdf_pages
+
+
+def make_pdf(pages: int) -> bytes:
+    """Build a minimal PDF whose page i contains the text 'Page i'."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids ["
+        + b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(pages))
+        + b"] /Count %d >>" % pages,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (Page %d) Tj ET" % i
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i)
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return out
+
+
+class TestPdfParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = PdfParser(max_workers=2, timeout=60, pages_per_task=2)
+
+    def tearDown(self):
+        self.parser.shutdown()
+
+    def test_pages_in_order(self):
+        """Test pages extracted in the pool come back in order with metadata"""
+        pages = asyncio.run(self.parser.load_pages(make_pdf(5), "doc.pdf"))
+
+        self.assertEqual([p.metadata["page"] for p in pages], [0, 1, 2, 3, 4])
+        self.assertEqual(pages[3].page_content.strip(), "Page 3")
+        self.assertEqual(pages[0].metadata["total_pages"], 5)
+        self.assertEqual(
+            [p.page_content for p in pages],
+            [p.page_content for p in load_pdf_pages(make_pdf(5), "doc.pdf")],
+        )
+
+    def test_timeout(self):
+        """Test a document that exceeds its time limit is abandoned"""
+        self.parser.timeout = 0.000001
+        with self.assertRaises(PdfParseError):
+            asyncio.run(self.parser.load_pages(make_pdf(1), "doc.pdf"))
+
+    def test_timeout_spares_other_documents(self):
+        """Test a timed-out document does not fail documents parsed alongside it"""
+
+        async def run():
+            normal = asyncio.ensure_future(
+                self.parser.load_pages(make_pdf(6), "normal.pdf")
+            )
+            # Let the first document take its deadline before shortening it
+            await asyncio.sleep(0)
+            self.parser.timeout = 0.000001
+            slow = self.parser.load_pages(make_pdf(1), "slow.pdf")
+            return await asyncio.gather(normal, slow, return_exceptions=True)
+
+        pages, error = asyncio.run(run())
+
+        self.assertIsInstance(error, PdfParseError)
+        self.assertEqual([p.metadata["page"] for p in pages], list(range(6)))
+        self.assertEqual(self.parser._pools, set())
+
+    def test_single_batch_is_parsed_without_pool(self):
+        """Test a document of at most one batch starts no worker processes"""
+        with mock.patch.object(self.parser, "_start_pool") as start_pool:
+            pages = asyncio.run(self.parser.load_pages(make_pdf(2), "doc.pdf"))
+
+        start_pool.assert_not_called()
+        self.assertEqual([p.page_content.strip() for p in pages], ["Page 0", "Page 1"])
+
+    def test_pool_is_sized_to_the_batches(self):
+        """Test a document gets no more workers than it has batches"""
+        self.parser.max_workers = 8
+        with mock.patch.object(
+            self.parser, "_start_pool", wraps=self.parser._start_pool
+        ) as start_pool:
+            pages = asyncio.run(self.parser.load_pages(make_pdf(5), "doc.pdf"))
+
+        self.assertEqual(start_pool.call_args.args[1], 3)
+        self.assertEqual(len(pages), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+
+from langchain.schema import Document
+from utils.docs.pipeline import IngestPipeline
+
+
+class FakeParser:
+    async def iter_pages(self, data: bytes, source: str):
+        for start in range(0, len(data), 2):
+            yield [
+                Document(page_content=chr(c), metadata={"page": start + i})
+                for i, c in enumerate(data[start : start + 2])
+            ]
+
+
+class FakeChunk:
+    def chunk_docs(self, docs):
+        for doc in docs:
+            doc.metadata["chunk_hash"] = doc.page_content
+        return docs
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.stored = []
+        self.ids = []
+
+    async def aembed_texts(self, texts):
+        if "!" in texts:
+            raise ValueError("embedding failed")
+        return [[float(ord(t))] for t in texts]
+
+    def add_embeddings(self, docs, vectors):
+        self.stored.extend(
+            (doc.metadata["document_id"], doc.page_content) for doc in docs
+        )
+        self.ids.extend(doc.id for doc in docs)
+        return [str(i) for i in range(len(docs))]
+
+
+class TestIngestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.embeddings = FakeEmbeddings()
+        self.pipeline = IngestPipeline(
+            FakeChunk(),
+            self.embeddings,
+            FakeParser(),
+            queue_size=1,
+            embed_batch_size=1,
+        )
+
+    def run_documents(self, documents, existing=None):
+        async def run():
+            try:
+                return await asyncio.gather(
+                    *(
+                        self.pipeline.process(doc_id, 1, data, "src", existing)
+                        for doc_id, data in documents.items()
+                    ),
+                    return_exceptions=True,
+                )
+            finally:
+                await self.pipeline.close()
+
+        return asyncio.run(run())
+
+    def test_documents_stream_through(self):
+        """Test concurrent documents are fully embedded and stored"""
+        results = self.run_documents({1: b"abcde", 2: b"xyz"})
+
+        self.assertEqual(results[0]["chunks_created"], 5)
+        self.assertEqual(results[0]["embeddings_created"], 5)
+        self.assertEqual(results[1]["embeddings_created"], 3)
+        self.assertEqual(
+            [text for doc_id, text in self.embeddings.stored if doc_id == 1],
+            list("abcde"),
+        )
+
+    def test_failure_is_isolated(self):
+        """Test a failing document does not stop other documents"""
+        results = self.run_documents({1: b"ab!cd", 2: b"xyz"})
+
+        self.assertIsInstance(results[0], ValueError)
+        self.assertEqual(results[1]["embeddings_created"], 3)
+
+    def test_unchanged_chunks_are_kept(self):
+        """Test re-ingestion only embeds new chunks and reports vanished ones"""
+        existing = {"a": ["id-a"], "b": ["id-b1", "id-b2"], "z": ["id-z"]}
+        (result,) = self.run_documents({1: b"abcb"}, existing)
+
+        self.assertEqual(result["embeddings_created"], 1)
+        self.assertEqual(result["embeddings_kept"], 3)
+        self.assertEqual(
+            sorted(i for i, _ in result["kept"]), ["id-a", "id-b1", "id-b2"]
+        )
+        self.assertEqual(result["stale_ids"], ["id-z"])
+        self.assertEqual(self.embeddings.stored, [(1, "c")])
+
+    def test_chunk_ids_are_deterministic(self):
+        """Test repeated ingestion writes the same ids and repeated text gets distinct ids"""
+        self.run_documents({1: b"abca"})
+        first = list(self.embeddings.ids)
+        self.embeddings.ids.clear()
+        self.run_documents({1: b"abca"})
+
+        self.assertEqual(self.embeddings.ids, first)
+        self.assertEqual(len(set(first)), 4)
+
+    def test_new_ids_skip_stored_rows(self):
+        """Test a new chunk never reuses the id of a stored row"""
+        self.run_documents({1: b"aa"})
+        stored_id = self.embeddings.ids[1]
+        self.embeddings.ids.clear()
+        (result,) = self.run_documents({1: b"aa"}, {"a": [stored_id]})
+
+        self.assertEqual(result["kept"][0][0], stored_id)
+        self.assertNotIn(stored_id, self.embeddings.ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from tests.utils.test_storage import FakeS3Client
+from utils.responses import storage_response
+from utils.storage import LocalStorage, S3Storage, StoredFile
+
+KEY = "blobs/ab/cd/abcd.pdf"
+ETAG = '"abcd"'
+
+
+def make_client(storage) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/content")
+    async def content(request: Request):
+        return await storage_response(
+            request, storage, KEY, "report.pdf", "application/pdf", etag=ETAG
+        )
+
+    return TestClient(app)
+
+
+class TestStorageResponse(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def put(self, storage, data: bytes):
+        spooled = storage.spool_dir / "upload.part"
+        spooled.write_bytes(data)
+        asyncio.run(storage.put(KEY, StoredFile(spooled, "abcd", len(data))))
+
+    def check_responses(self, client: TestClient):
+        response = client.get("/content")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"0123456789")
+        self.assertEqual(response.headers["etag"], ETAG)
+        self.assertIn("inline", response.headers["content-disposition"])
+
+        response = client.get("/content", headers={"range": "bytes=2-5"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b"2345")
+        self.assertEqual(response.headers["content-range"], "bytes 2-5/10")
+
+        response = client.get("/content", headers={"if-none-match": ETAG})
+        self.assertEqual(response.status_code, 304)
+
+        response = client.get("/content", headers={"range": "bytes=20-"})
+        self.assertEqual(response.status_code, 416)
+
+    def test_local_storage(self):
+        """Test local files are served with ranges and revalidation"""
+        storage = LocalStorage(self.dir)
+        self.put(storage, b"0123456789")
+        self.check_responses(make_client(storage))
+
+    def test_remote_storage(self):
+        """Test remote objects are streamed with ranges and revalidation"""
+        storage = S3Storage(bucket="docs", client=FakeS3Client())
+        self.put(storage, b"0123456789")
+        self.check_responses(make_client(storage))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,258 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+from utils.docs.search import (
+    FanOutRetriever,
+    IndexedRetriever,
+    QueryExpansionCache,
+    Search,
+    SearchResultCache,
+    TenantIndex,
+    _TenantMatrix,
+)
+
+
+def tenant_matrix(version, vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    return _TenantMatrix(version, ids, ids, [{"page": i} for i in ids], matrix)
+
+
+class TestTenantIndex(unittest.TestCase):
+    def test_matrix_search_ranks_by_cosine(self):
+        """Test top k comes from one product, scored by cosine similarity"""
+        entry = tenant_matrix(1, [[1, 0], [0, 1], [1, 1], [-1, 0]])
+        docs = entry.search([2.0, 0.0], 2)
+
+        self.assertEqual([d.id for d in docs], ["c0", "c2"])
+        self.assertAlmostEqual(docs[0].metadata["score"], 1.0, places=6)
+        self.assertAlmostEqual(docs[1].metadata["score"], 0.7071, places=4)
+        self.assertEqual(docs[0].metadata["page"], "c0")
+
+    def test_least_recently_used_users_are_evicted(self):
+        """Test loading past the memory budget drops the oldest user"""
+        index = TenantIndex(max_bytes=40)
+        index._put(("docs", 1), tenant_matrix(1, [[1, 0], [0, 1]]))  # 20 bytes
+        index._put(("docs", 2), tenant_matrix(1, [[1, 0], [0, 1]]))
+        index._get(("docs", 1))
+        index._put(("docs", 3), tenant_matrix(1, [[1, 0], [0, 1]]))
+
+        self.assertIsNotNone(index._get(("docs", 1)))
+        self.assertIsNone(index._get(("docs", 2)))
+        self.assertEqual(index.stats()["bytes"], 40)
+        self.assertEqual(index.evictions, 1)
+
+    def test_oversized_user_stays_on_pgvector(self):
+        """Test a user larger than the whole budget is remembered without vectors"""
+        index = TenantIndex(max_bytes=10)
+        index._put(("docs", 1), tenant_matrix(1, [[1, 0], [0, 1]]))
+
+        self.assertIsNone(index._get(("docs", 1)).matrix)
+        self.assertEqual(index.stats()["bytes"], 0)
+
+    def test_loaded_user_is_served_without_a_query(self):
+        """Test a user at the passed corpus version is searched without the database"""
+        index = TenantIndex()
+        index.enabled = True
+        index._put(("docs", 1), tenant_matrix(4, [[1, 0], [0, 1]]))
+        store = SimpleNamespace(collection_name="docs", engine=None)
+
+        docs = index.search(store, 1, 4, [0.0, 1.0], 1)
+
+        self.assertEqual([d.id for d in docs], ["c1"])
+        self.assertEqual(index.hits, 1)
+
+    def test_users_load_once_hot(self):
+        """Test cold users are only counted until they reach min_queries"""
+        index = TenantIndex(min_queries=3)
+
+        self.assertEqual(
+            [index._is_hot(("docs", 1)) for _ in range(3)], [False, False, True]
+        )
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    async def aembed_queries(self, texts):
+        self.calls.append(list(texts))
+        return [[float(i)] for i in range(len(texts))]
+
+
+class FakeStore:
+    def __init__(self, slow=()):
+        self.embeddings = FakeEmbeddings()
+        self.slow = set(slow)
+
+    async def asimilarity_search_by_vector(self, vector, k, filter):
+        if vector[0] in self.slow:
+            await asyncio.sleep(1)
+        return [Document(id=f"d{vector[0]:.0f}", page_content=f"doc {vector[0]}")]
+
+
+class TestFanOutRetriever(unittest.TestCase):
+    def retriever(self, store, queries, **kwargs):
+        return FanOutRetriever(
+            retriever=IndexedRetriever(store=store, k=2, filter={"user_id": 1}),
+            llm_chain=RunnableLambda(lambda _: queries),
+            **kwargs,
+        )
+
+    def test_queries_are_embedded_in_one_call_and_capped(self):
+        """Test expanded queries are deduplicated, capped and embedded together"""
+        store = FakeStore()
+        retriever = self.retriever(store, ["a", "b", "a", "c", "d"], max_queries=3)
+        docs = asyncio.run(retriever.ainvoke("question"))
+
+        self.assertEqual(store.embeddings.calls, [["a", "b", "c"]])
+        self.assertEqual([d.id for d in docs], ["d0", "d1", "d2"])
+
+    def test_slow_query_is_dropped(self):
+        """Test a query past its timeout is left out instead of delaying the rest"""
+        store = FakeStore(slow={1.0})
+        retriever = self.retriever(store, ["a", "b", "c"], query_timeout=0.05)
+        docs = asyncio.run(retriever.ainvoke("question"))
+
+        self.assertEqual([d.id for d in docs], ["d0", "d2"])
+
+    def test_all_queries_failing_raises(self):
+        """Test a search where every query times out reports the error"""
+        store = FakeStore(slow={0.0})
+        retriever = self.retriever(store, ["a"], query_timeout=0.05)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(retriever.ainvoke("question"))
+
+
+class TestSearchRouting(unittest.TestCase):
+    def setUp(self):
+        self.search = Search.__new__(Search)
+        self.search.vector_store = FakeStore()
+        self.search.read_vector_stores = {"replica": FakeStore()}
+        self.search.index = SimpleNamespace(enabled=True)
+        self.search._corpus_version = mock.AsyncMock(return_value=3)
+        self.search._read_store = mock.AsyncMock()
+        self.search._retriever = mock.Mock(
+            return_value=SimpleNamespace(ainvoke=mock.AsyncMock(return_value=[]))
+        )
+
+    def store(self, **kwargs):
+        asyncio.run(self.search.asearch("question", 1, **kwargs))
+        return self.search._retriever.call_args.args[2]
+
+    def test_caller_routing_is_not_checked_again(self):
+        """Test a version and replica read by the caller cost no further queries"""
+        replica = SimpleNamespace(url="replica")
+
+        self.assertIs(
+            self.store(corpus_version=3, replica=replica),
+            self.search.read_vector_stores["replica"],
+        )
+        self.assertIs(self.store(corpus_version=3), self.search.vector_store)
+        self.search._corpus_version.assert_not_awaited()
+        self.search._read_store.assert_not_awaited()
+
+    def test_version_is_read_once_without_caller(self):
+        """Test a search without a caller's version reads it and picks a replica"""
+        self.store()
+
+        self.search._corpus_version.assert_awaited_once_with(1)
+        self.search._read_store.assert_awaited_once_with(1, 3)
+
+
+class TestQueryExpansionCache(unittest.TestCase):
+    def test_repeated_question_skips_the_llm(self):
+        """Test a question differing only in case and spacing reuses the expansion"""
+        calls = []
+
+        def expand(inputs):
+            calls.append(inputs["question"])
+            return ["a", "b"]
+
+        cache = QueryExpansionCache("prompt", "model", persist=False)
+        retriever = FanOutRetriever(
+            retriever=IndexedRetriever(store=FakeStore(), k=2, filter={"user_id": 1}),
+            llm_chain=RunnableLambda(expand),
+            expansion_cache=cache,
+        )
+        asyncio.run(retriever.ainvoke("CIBC  balance"))
+        docs = asyncio.run(retriever.ainvoke("cibc balance "))
+
+        self.assertEqual(calls, ["CIBC  balance"])
+        self.assertEqual(len(docs), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key_depends_on_prompt_and_model(self):
+        """Test a new prompt or model does not reuse old expansions"""
+        cache = QueryExpansionCache("prompt", "model", persist=False)
+        cache.put("question", ["a"])
+
+        self.assertEqual(cache.get("question"), ["a"])
+        for other in (
+            QueryExpansionCache("prompt v2", "model", persist=False),
+            QueryExpansionCache("prompt", "other", persist=False),
+        ):
+            self.assertNotEqual(other.key("question"), cache.key("question"))
+
+    def test_empty_expansion_is_not_cached(self):
+        """Test failed expansions are retried next time"""
+        cache = QueryExpansionCache("prompt", "model", persist=False)
+        cache.put("question", [])
+
+        self.assertIsNone(cache.get("question"))
+
+
+class TestSearchResultCache(unittest.TestCase):
+    def test_hit_requires_same_version(self):
+        """Test responses are reused until the user's corpus version moves"""
+        cache = SearchResultCache()
+        cache.put(1, 3, "CIBC balance", (10,), {"total": 1}, 100)
+
+        self.assertEqual(cache.get(1, 3, " cibc  BALANCE", (10,)), {"total": 1})
+        self.assertIsNone(cache.get(1, 3, "cibc balance", (50,)))
+        self.assertIsNone(cache.get(1, 4, "cibc balance", (10,)))
+        self.assertIsNone(cache.get(1, 3, "cibc balance", (10,)))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_response_from_older_version_is_not_stored(self):
+        """Test a search that raced a write cannot overwrite newer entries"""
+        cache = SearchResultCache()
+        cache.put(1, 5, "q", (), "new", 10)
+        cache.put(1, 4, "other", (), "old", 10)
+
+        self.assertIsNone(cache.get(1, 5, "other", ()))
+        self.assertEqual(cache.get(1, 5, "q", ()), "new")
+
+    def test_lookup_at_older_version_keeps_newer_entries(self):
+        """Test a request that read an older version cannot drop newer responses"""
+        cache = SearchResultCache()
+        cache.put(1, 5, "q", (), "new", 10)
+
+        self.assertIsNone(cache.get(1, 4, "q", ()))
+        self.assertEqual(cache.get(1, 5, "q", ()), "new")
+        self.assertEqual(cache.stats()["invalidations"], 0)
+
+    def test_memory_caps(self):
+        """Test per-user and global budgets evict least recently used entries"""
+        cache = SearchResultCache(max_bytes=250, user_max_bytes=100)
+        cache.put(1, 1, "a", (), "a", 60)
+        cache.put(1, 1, "b", (), "b", 60)
+        cache.put(2, 1, "c", (), "c", 100)
+        cache.put(3, 1, "d", (), "d", 100)
+
+        self.assertIsNone(cache.get(1, 1, "a", ()))
+        self.assertIsNone(cache.get(1, 1, "b", ()))
+        self.assertEqual(cache.get(3, 1, "d", ()), "d")
+        self.assertLessEqual(cache.stats()["bytes"], 250)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+from fastapi import UploadFile
+from utils.storage import (
+    LocalStorage,
+    S3Storage,
+    get_storage,
+    spool_upload,
+    write_upload,
+)
+
+
+def make_upload(data: bytes, filename: str = "test.pdf") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+class TestWriteUpload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hash_and_size(self):
+        """Test the upload is written with its SHA-256 and byte count"""
+        data = b"%PDF-1.4 " + b"x" * 3_000_000
+        stored = asyncio.run(write_upload(make_upload(data), self.dir / "1.pdf"))
+
+        self.assertEqual(stored.path, self.dir / "1.pdf")
+        self.assertEqual(stored.size, len(data))
+        self.assertEqual(stored.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(stored.path.read_bytes(), data)
+
+    def test_replaces_existing_file(self):
+        """Test an existing file is atomically replaced and no temp files remain"""
+        destination = self.dir / "1.pdf"
+        destination.write_bytes(b"old")
+        asyncio.run(write_upload(make_upload(b"new"), destination, "full"))
+
+        self.assertEqual(destination.read_bytes(), b"new")
+        self.assertEqual(list(self.dir.glob("*.part")), [])
+
+    def test_spool_keeps_temp_file(self):
+        """Test spooling leaves a hidden temp file for the caller to commit"""
+        stored = asyncio.run(spool_upload(make_upload(b"data"), self.dir, "none"))
+
+        self.assertTrue(stored.path.exists())
+        self.assertTrue(stored.path.name.endswith(".part"))
+        self.assertEqual(stored.size, 4)
+
+    def test_invalid_policy(self):
+        """Test an unknown fsync policy is rejected"""
+        with self.assertRaises(ValueError):
+            asyncio.run(write_upload(make_upload(b"data"), self.dir / "1.pdf", "bad"))
+
+
+async def collect(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+class FakeS3Client:
+    """In-memory stand-in for the subset of the boto3 S3 client we use."""
+
+    class NotFound(Exception):
+        response = {"Error": {"Code": "404"}}
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_file(self, filename, bucket, key):
+        self.objects[(bucket, key)] = Path(filename).read_bytes()
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            start, end = Range.removeprefix("bytes=").split("-")
+            data = data[int(start) : int(end) + 1 if end else None]
+        return {"Body": io.BytesIO(data)}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.NotFound()
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        # One key per page to exercise pagination
+        keys = sorted(
+            k for b, k in self.objects if b == Bucket and k.startswith(Prefix)
+        )
+        start = int(ContinuationToken or 0)
+        page = keys[start : start + 1]
+        response = {
+            "Contents": [
+                {
+                    "Key": key,
+                    "Size": len(self.objects[(Bucket, key)]),
+                    "LastModified": datetime(2024, 1, 1, tzinfo=timezone.utc),
+                }
+                for key in page
+            ],
+            "IsTruncated": start + 1 < len(keys),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + 1)
+        return response
+
+
+class TestStorageBackends(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def spool(self, storage, data: bytes):
+        return asyncio.run(spool_upload(make_upload(data), storage.spool_dir, "none"))
+
+    def test_local_put_and_range_read(self):
+        """Test local files land under nested keys and support range reads"""
+        storage = LocalStorage(self.dir)
+        key = "blobs/ab/cd/abcd.pdf"
+        asyncio.run(storage.put(key, self.spool(storage, b"0123456789")))
+
+        self.assertTrue((self.dir / key).exists())
+        self.assertEqual(asyncio.run(storage.size(key)), 10)
+        self.assertEqual(asyncio.run(collect(storage.open(key, 2, 5))), b"2345")
+        self.assertEqual(asyncio.run(storage.read_bytes(key)), b"0123456789")
+
+        asyncio.run(storage.delete(key))
+        self.assertFalse(asyncio.run(storage.exists(key)))
+
+    def test_local_legacy_absolute_path(self):
+        """Test absolute paths stored before backends existed still resolve"""
+        legacy = self.dir / "1.pdf"
+        legacy.write_bytes(b"legacy")
+        storage = LocalStorage(self.dir / "root")
+        self.assertEqual(asyncio.run(storage.read_bytes(str(legacy))), b"legacy")
+
+    def test_s3_round_trip(self):
+        """Test the S3 backend against an in-memory client"""
+        client = FakeS3Client()
+        storage = S3Storage(bucket="docs", prefix="hermes", client=client)
+        stored = self.spool(storage, b"0123456789")
+        asyncio.run(storage.put("blobs/ab/cd/abcd.pdf", stored))
+
+        self.assertFalse(stored.path.exists())
+        self.assertIn(("docs", "hermes/blobs/ab/cd/abcd.pdf"), client.objects)
+        self.assertTrue(asyncio.run(storage.exists("blobs/ab/cd/abcd.pdf")))
+        self.assertEqual(
+            asyncio.run(collect(storage.open("blobs/ab/cd/abcd.pdf", 7))), b"789"
+        )
+
+        asyncio.run(storage.delete("blobs/ab/cd/abcd.pdf"))
+        self.assertFalse(asyncio.run(storage.exists("blobs/ab/cd/abcd.pdf")))
+
+    def test_local_list_and_missing_delete(self):
+        """Test local listing returns keys under a prefix and deletes are idempotent"""
+        storage = LocalStorage(self.dir)
+        for key in ("blobs/ab/cd/one.pdf", "blobs/ef/gh/two.pdf", "other/three.pdf"):
+            asyncio.run(storage.put(key, self.spool(storage, b"12345")))
+
+        objects = asyncio.run(storage.list("blobs/"))
+        self.assertEqual(
+            sorted(o.key for o in objects),
+            ["blobs/ab/cd/one.pdf", "blobs/ef/gh/two.pdf"],
+        )
+        self.assertEqual({o.size for o in objects}, {5})
+        self.assertEqual(asyncio.run(storage.list("missing/")), [])
+
+        asyncio.run(storage.delete("blobs/ab/cd/one.pdf"))
+        asyncio.run(storage.delete("blobs/ab/cd/one.pdf"))
+        self.assertFalse(asyncio.run(storage.exists("blobs/ab/cd/one.pdf")))
+
+    def test_s3_list_pages_and_strips_prefix(self):
+        """Test S3 listing follows continuation tokens and returns backend keys"""
+        client = FakeS3Client()
+        storage = S3Storage(bucket="docs", prefix="hermes/", client=client)
+        for key in ("blobs/a.pdf", "blobs/b.pdf", "other/c.pdf"):
+            asyncio.run(storage.put(key, self.spool(storage, b"data")))
+
+        objects = asyncio.run(storage.list("blobs/"))
+
+        self.assertEqual([o.key for o in objects], ["blobs/a.pdf", "blobs/b.pdf"])
+        self.assertEqual([o.size for o in objects], [4, 4])
+        self.assertFalse(asyncio.run(storage.exists("blobs/missing.pdf")))
+
+    def test_backend_selection(self):
+        """Test STORAGE_BACKEND picks the backend and rejects bad settings"""
+        env = {"STORAGE_BACKEND": "local", "STORAGE_LOCAL_ROOT": str(self.dir)}
+        with mock.patch("utils.storage._storage", None):
+            with mock.patch.dict(os.environ, env):
+                storage = get_storage()
+            self.assertIsInstance(storage, LocalStorage)
+            self.assertEqual(storage.root, self.dir)
+
+        for env in ({"STORAGE_BACKEND": "s3"}, {"STORAGE_BACKEND": "ftp"}):
+            with mock.patch("utils.storage._storage", None):
+                with mock.patch.dict(os.environ, env, clear=True):
+                    with self.assertRaises(ValueError):
+                        get_storage()
+
+
+if __name__ == "__main__":
+    unittest.main()
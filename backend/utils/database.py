@@ -1,13 +1,126 @@
+import itertools
 import logging
+import math
 import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
+from fastapi import Request
 from models.base import Base
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 logger = logging.getLogger(__name__)
 
 
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(name: str) -> List[str]:
+    value = os.getenv(name) or ""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# Replication delay on a streaming replica; zero when it has replayed all received WAL
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+        )
+    END
+    """
+)
+
+
+@dataclass
+class PoolStats:
+    """Counters describing how long requests wait for a pooled connection."""
+
+    checkouts: int = 0
+    timeouts: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.total_wait_seconds += seconds
+        if seconds > self.max_wait_seconds:
+            self.max_wait_seconds = seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        avg = self.total_wait_seconds / self.checkouts if self.checkouts else 0.0
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(avg * 1000, 3),
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+        }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Async queue pool that records the time callers spend waiting for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # Keep counters across engine.dispose() / pool invalidation
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def _statement_timeout_connect_args(url: str, timeout_ms: int) -> Dict[str, Any]:
+    """Build driver specific connect args that set a server-side statement timeout."""
+    if timeout_ms <= 0:
+        return {}
+    driver = make_url(url).get_driver_name()
+    if driver == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(timeout_ms)}}
+    if driver.startswith("psycopg"):
+        return {"options": f"-c statement_timeout={timeout_ms}"}
+    logger.warning(f"Statement timeout not supported for driver '{driver}'")
+    return {}
+
+
+@dataclass
+class Replica:
+    """A read replica with its own pool and the last measured replication lag."""
+
+    url: str
+    engine: AsyncEngine
+    async_session: sessionmaker
+    sync_url: str
+    lag_seconds: float = 0.0
+    lag_checked_at: float = 0.0
+
+
 class Database:
     def __init__(self):
         try:
@@ -19,20 +132,85 @@ class Database:
                 logger.error("Database URLs not found in environment variables")
                 raise ValueError("Database URLs not configured")
 
+            # Pool configuration, sized against the number of uvicorn workers
+            self.pool_size = _env_int("DB_POOL_SIZE", 5)
+            self.max_overflow = _env_int("DB_MAX_OVERFLOW", 10)
+            self.pool_timeout = _env_int("DB_POOL_TIMEOUT", 30)
+            self.pool_recycle = _env_int("DB_POOL_RECYCLE", 1800)
+            self.pool_pre_ping = _env_bool("DB_POOL_PRE_PING", True)
+            self.statement_timeout_ms = _env_int("DB_STATEMENT_TIMEOUT_MS", 30000)
+
             logger.debug(f"Creating async engine with URL: {self.DATABASE_ASYNC_URL}")
-            self.engine: AsyncEngine = create_async_engine(
-                self.DATABASE_ASYNC_URL, echo=True, future=True
-            )
+            self.engine: AsyncEngine = self._create_engine(self.DATABASE_ASYNC_URL)
 
             self.async_session = sessionmaker(
                 self.engine, class_=AsyncSession, expire_on_commit=False
             )
-            logger.info("Database connection initialized successfully")
+
+            # Read replicas; reads fall back to the primary when none are usable
+            self.replica_max_lag = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+            self.replica_lag_check_interval = float(
+                os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "10")
+            )
+            self.read_your_writes_window = float(
+                os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10")
+            )
+            self.replicas: List[Replica] = []
+            # Synchronous URLs (vector search) pair up with the async ones by
+            # position; without them the async URL is reused with psycopg
+            sync_urls = _env_list("DATABASE_REPLICA_URLS")
+            for i, url in enumerate(_env_list("DATABASE_REPLICA_ASYNC_URLS")):
+                engine = self._create_engine(url)
+                self.replicas.append(
+                    Replica(
+                        url=url,
+                        engine=engine,
+                        async_session=sessionmaker(
+                            engine, class_=AsyncSession, expire_on_commit=False
+                        ),
+                        sync_url=(
+                            sync_urls[i]
+                            if i < len(sync_urls)
+                            else make_url(url)
+                            .set(drivername="postgresql+psycopg")
+                            .render_as_string(hide_password=False)
+                        ),
+                    )
+                )
+            self._replica_cursor = itertools.count()
+            # Consistency key (e.g. "user_id:3") -> monotonic time until which
+            # reads for that key are pinned to the primary
+            self._recent_writes: Dict[str, float] = {}
+
+            logger.info(
+                f"Database connection initialized successfully "
+                f"(pool_size={self.pool_size}, max_overflow={self.max_overflow}, "
+                f"pool_recycle={self.pool_recycle}s, pre_ping={self.pool_pre_ping}, "
+                f"statement_timeout={self.statement_timeout_ms}ms, "
+                f"replicas={len(self.replicas)})"
+            )
 
         except Exception as e:
             logger.error(f"Failed to initialize database: {str(e)}", exc_info=True)
             raise
 
+    def _create_engine(self, url: str) -> AsyncEngine:
+        """Create a pooled async engine using the configured pool settings."""
+        return create_async_engine(
+            url,
+            echo=_env_bool("DB_ECHO", False),
+            future=True,
+            poolclass=InstrumentedPool,
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=self.pool_pre_ping,
+            connect_args=_statement_timeout_connect_args(
+                url, self.statement_timeout_ms
+            ),
+        )
+
     async def get_session(self) -> AsyncSession:
         """Get a database session."""
         try:
@@ -48,11 +226,155 @@ class Database:
         """Get the synchronous database URL."""
         return self.DATABASE_URL
 
+    def mark_write(self, *keys: str) -> None:
+        """
+        Pin reads for the given consistency keys to the primary for a short window.
+
+        Pins live in this process only: a write made by another process (the
+        worker's ingests) does not pin the API's reads. Reads that must see
+        those writes compare the user's corpus version on the replica with the
+        primary's instead (see utils.docs.search).
+        """
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        lag = max(
+            (r.lag_seconds for r in self.replicas if math.isfinite(r.lag_seconds)),
+            default=0.0,
+        )
+        expires_at = now + max(self.read_your_writes_window, lag)
+        for key in keys:
+            self._recent_writes[key] = expires_at
+
+        # Drop expired entries so the map stays bounded by recent writers
+        if len(self._recent_writes) > 10000:
+            self._recent_writes = {
+                k: v for k, v in self._recent_writes.items() if v > now
+            }
+
+    def is_pinned(self, *keys: str) -> bool:
+        """Whether this process recently wrote for any of these keys."""
+        now = time.monotonic()
+        return any(self._recent_writes.get(key, 0.0) > now for key in keys)
+
+    async def _measure_lag(self, replica: Replica) -> float:
+        async with replica.engine.connect() as conn:
+            lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar()
+        return float(lag or 0.0)
+
+    async def _refresh_lag(self, replica: Replica) -> None:
+        """Measure replication lag, at most once per check interval."""
+        now = time.monotonic()
+        if now - replica.lag_checked_at < self.replica_lag_check_interval:
+            return
+        # Stamp before awaiting so concurrent requests do not all re-check
+        replica.lag_checked_at = now
+        try:
+            replica.lag_seconds = await self._measure_lag(replica)
+        except Exception as e:
+            logger.warning(f"Replica lag check failed, excluding replica: {str(e)}")
+            replica.lag_seconds = float("inf")
+
+    async def choose_read_replica(self, *keys: str) -> Optional[Replica]:
+        """
+        Pick a replica for a read-only request, or None for the primary.
+
+        Each replica's lag is re-measured once its check interval expired before
+        it is judged, so a replica excluded after a failed check or a lag spike
+        serves reads again once it has caught up.
+        """
+        if not self.replicas or self.is_pinned(*keys):
+            return None
+
+        start = next(self._replica_cursor)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            await self._refresh_lag(replica)
+            if replica.lag_seconds <= self.replica_max_lag:
+                return replica
+
+        logger.warning("All read replicas are lagging, routing read to primary")
+        return None
+
+    async def choose_read_session(self, *keys: str) -> sessionmaker:
+        """Pick a session factory for a read-only request."""
+        replica = await self.choose_read_replica(*keys)
+        return replica.async_session if replica is not None else self.async_session
+
+    def replica_of(self, session: AsyncSession) -> Optional[Replica]:
+        """The replica a session reads from, or None for the primary."""
+        return next((r for r in self.replicas if r.engine is session.bind), None)
+
+    def pool_status(self) -> Dict[str, Any]:
+        """Describe the current state of the primary and replica connection pools."""
+        status = self._engine_pool_status(self.engine)
+        if self.replicas:
+            status["replicas"] = [
+                {
+                    **self._engine_pool_status(replica.engine),
+                    "lag_seconds": (
+                        replica.lag_seconds
+                        if math.isfinite(replica.lag_seconds)
+                        else None
+                    ),
+                }
+                for replica in self.replicas
+            ]
+        return status
+
+    def _engine_pool_status(self, engine: AsyncEngine) -> Dict[str, Any]:
+        pool = engine.pool
+        status = {
+            "pool_size": pool.size(),
+            "max_overflow": self.max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            # QueuePool reports negative overflow while the pool is still filling
+            "overflow": max(pool.overflow(), 0),
+        }
+        if isinstance(pool, InstrumentedPool):
+            status.update(pool.stats.as_dict())
+        return status
+
+    async def dispose(self) -> None:
+        """Close all pooled connections."""
+        logger.info(
+            f"Disposing database engine, final pool status: {self.pool_status()}"
+        )
+        await self.engine.dispose()
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+# Process-wide database, created once in the application lifespan
+_database: Optional[Database] = None
+
+
+def init_database() -> Database:
+    """Create the process-wide database engine if it does not exist yet."""
+    global _database
+    if _database is None:
+        _database = Database()
+    return _database
+
+
+def get_database() -> Database:
+    """Return the process-wide database, creating it on first use."""
+    return init_database()
+
+
+async def close_database() -> None:
+    """Dispose the process-wide database engine."""
+    global _database
+    if _database is not None:
+        await _database.dispose()
+        _database = None
+
 
 # Make the database session available as a dependency
 async def get_db():
     """Database session dependency."""
-    db = Database()
+    db = get_database()
     try:
         logger.debug("Starting database session")
         async for session in db.get_session():
@@ -68,3 +390,40 @@ async def get_db():
     except Exception as e:
         logger.error(f"Failed to get database session: {str(e)}", exc_info=True)
         raise
+
+
+def _consistency_keys(request: Request) -> List[str]:
+    """Keys identifying whose recent writes a read request must observe."""
+    keys = []
+    for name in ("user_id", "conversation_id"):
+        value = request.path_params.get(name) or request.query_params.get(name)
+        if value:
+            keys.append(f"{name}:{value}")
+    return keys
+
+
+def mark_recent_write(user_id=None, conversation_id=None) -> None:
+    """
+    Record a write so the writer's follow-up reads are served by the primary.
+
+    Only reads handled by this process are pinned; see Database.mark_write.
+    """
+    keys = []
+    if user_id is not None:
+        keys.append(f"user_id:{user_id}")
+    if conversation_id is not None:
+        keys.append(f"conversation_id:{conversation_id}")
+    get_database().mark_write(*keys)
+
+
+async def get_read_db(request: Request):
+    """Read-only database session dependency routed to a replica when possible."""
+    db = get_database()
+    session_factory = await db.choose_read_session(*_consistency_keys(request))
+    async with session_factory() as session:
+        try:
+            yield session
+        except Exception as e:
+            logger.error(f"Error during read session: {str(e)}", exc_info=True)
+            await session.rollback()
+            raise
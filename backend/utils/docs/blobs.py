@@ -0,0 +1,192 @@
+"""
+Content-addressed storage for uploaded documents.
+
+Every distinct file is stored once, keyed by its SHA-256, and shared by all
+documents with the same content. Blob.ref_count tracks how many documents point
+at a blob; the file is removed once the last reference is released. Keys are
+sharded two levels deep (blobs/ab/cd/abcd...) so no directory grows unbounded.
+
+Storing a blob and deleting its file take a transaction-scoped advisory lock on
+the content hash, so a file is only deleted while no blob row refers to it: an
+upload of the same content that races with the last release either commits
+its row first (and the file is kept) or stores the file again afterwards.
+"""
+
+import logging
+import os
+from collections import Counter
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models.blob import Blob
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.storage import StorageBackend, StoredFile
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary first key of the per-content advisory locks
+BLOB_LOCK_NAMESPACE = 727_105_002
+
+BLOB_LOCK = text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:content_hash))")
+
+
+class BlobStore:
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+
+    def blob_key(self, content_hash: str, filename: str) -> str:
+        """Storage key for a content hash, keeping the original extension."""
+        ext = os.path.splitext(filename)[1].lower() or ".pdf"
+        return f"blobs/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{ext}"
+
+    @staticmethod
+    def key_hash(key: str) -> Optional[str]:
+        """Content hash of a blob key, None for files stored before blobs."""
+        if not key.startswith("blobs/"):
+            return None
+        return PurePosixPath(key).stem
+
+    async def _lock(self, db: AsyncSession, content_hashes: Iterable[str]) -> None:
+        """Hold the content hashes' locks until the transaction ends."""
+        # Sorted so concurrent transactions lock in the same order
+        for content_hash in sorted(set(content_hashes)):
+            await db.execute(
+                BLOB_LOCK,
+                {"namespace": BLOB_LOCK_NAMESPACE, "content_hash": content_hash},
+            )
+
+    async def acquire(
+        self, db: AsyncSession, files: Sequence[Tuple[StoredFile, str]]
+    ) -> Dict[str, str]:
+        """
+        Add one blob reference per spooled upload.
+
+        New content is moved into the store; spooled copies of content that is
+        already stored are discarded.
+
+        Args:
+            db: Session whose transaction will hold the reference counts
+            files: Spooled uploads paired with their original filenames
+
+        Returns:
+            Mapping of content hash to storage key
+        """
+        if not files:
+            return {}
+
+        counts = Counter(stored.sha256 for stored, _ in files)
+        first: Dict[str, StoredFile] = {}
+        rows = []
+        for stored, filename in files:
+            if stored.sha256 in first:
+                continue
+            first[stored.sha256] = stored
+            rows.append(
+                {
+                    "content_hash": stored.sha256,
+                    "file_path": self.blob_key(stored.sha256, filename),
+                    "size_bytes": stored.size,
+                    "ref_count": counts[stored.sha256],
+                }
+            )
+
+        await self._lock(db, first)
+
+        # One upsert for the whole batch; duplicates within the batch were
+        # folded into a single row with a larger increment above
+        stmt = insert(Blob).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Blob.content_hash],
+            set_={"ref_count": Blob.ref_count + stmt.excluded.ref_count},
+        ).returning(Blob.content_hash, Blob.file_path, Blob.ref_count)
+        result = await db.execute(stmt)
+
+        keys = {}
+        moved = set()
+        for content_hash, key, ref_count in result.all():
+            keys[content_hash] = key
+            is_new = ref_count == counts[content_hash]
+            # Also restore the file if an existing blob lost it
+            if is_new or not await self.storage.exists(key):
+                await self.storage.put(key, first[content_hash])
+                moved.add(content_hash)
+
+        deduplicated = 0
+        for stored, _ in files:
+            if stored.sha256 not in moved or stored is not first[stored.sha256]:
+                stored.path.unlink(missing_ok=True)
+                deduplicated += 1
+        if deduplicated:
+            logger.info(f"Deduplicated {deduplicated} uploads against stored blobs")
+
+        return keys
+
+    async def release(
+        self, db: AsyncSession, content_hashes: Iterable[str]
+    ) -> List[str]:
+        """
+        Drop one reference per content hash.
+
+        Documents pointing at the blobs must already be deleted or repointed
+        (and flushed) in the same transaction.
+
+        Returns:
+            Storage keys that are no longer referenced; pass them to
+            delete_files after committing
+        """
+        counts = Counter(h for h in content_hashes if h)
+        if not counts:
+            return []
+
+        for content_hash, count in counts.items():
+            await db.execute(
+                update(Blob)
+                .where(Blob.content_hash == content_hash)
+                .values(ref_count=Blob.ref_count - count)
+            )
+
+        result = await db.execute(
+            delete(Blob)
+            .where(Blob.content_hash.in_(list(counts)))
+            .where(Blob.ref_count <= 0)
+            .returning(Blob.file_path)
+        )
+        return list(result.scalars().all())
+
+    async def delete_files(self, db: AsyncSession, keys: Iterable[str]) -> List[str]:
+        """
+        Delete the files of released blobs unless their content was stored again.
+
+        Runs in a transaction of its own, committed before returning. Files of
+        documents stored before blobs existed are deleted as they are.
+
+        Args:
+            db: Session with no transaction in progress
+            keys: Storage keys returned by release
+
+        Returns:
+            Keys whose files were deleted
+        """
+        keys = list(dict.fromkeys(keys))
+        hashes = [h for h in map(self.key_hash, keys) if h]
+        stored = set()
+        deleted = []
+        try:
+            if hashes:
+                await self._lock(db, hashes)
+                result = await db.execute(
+                    select(Blob.content_hash).where(Blob.content_hash.in_(hashes))
+                )
+                stored = set(result.scalars().all())
+            for key in keys:
+                if self.key_hash(key) in stored:
+                    logger.info(f"Keeping {key}, its content was uploaded again")
+                    continue
+                await self.storage.delete(key)
+                deleted.append(key)
+        finally:
+            # Releases the locks
+            await db.commit()
+        return deleted
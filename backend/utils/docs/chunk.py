@@ -1,28 +1,85 @@
+"""
+Splitting of parsed pages into chunks for embedding.
+
+Two modes, selected with CHUNK_MODE:
+
+- characters (default): RecursiveCharacterTextSplitter, 1000 characters with
+  200 characters of overlap
+- tokens: fixed windows of CHUNK_SIZE_TOKENS tiktoken tokens with
+  CHUNK_OVERLAP_TOKENS of overlap. Each page is encoded once and chunks are
+  sliced out of the page text by token offsets, so no text is re-tokenized.
+  Chunks carry chunk_index, start_index, end_index and token_count.
+
+Switching modes changes every chunk hash, so documents are re-embedded on
+their next ingestion.
+
+Environment:
+    CHUNK_MODE: characters or tokens (default characters)
+    CHUNK_SIZE_TOKENS: tokens per chunk in token mode (default 256)
+    CHUNK_OVERLAP_TOKENS: tokens shared by consecutive chunks (default 50)
+    CHUNK_ENCODING: tiktoken encoding used in token mode (default cl100k_base)
+"""
+
+import logging
+import os
+from itertools import accumulate
+from typing import List, Optional, Sequence
+
+import tiktoken
 from langchain.schema import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
-import logging
+from utils.docs.embedding_cache import text_hash
 
 logger = logging.getLogger(__name__)
 
+CHUNK_MODES = ("characters", "tokens")
+
 
 class Chunk:
-    def __init__(self):
+    def __init__(self, mode: Optional[str] = None, encoding=None):
         """Initialize the text splitter with specific configuration."""
         logger.info("Initializing Chunk service")
         try:
+            self.mode = (mode or os.getenv("CHUNK_MODE", "characters")).lower()
+            if self.mode not in CHUNK_MODES:
+                raise ValueError(
+                    f"Invalid CHUNK_MODE '{self.mode}', expected one of {CHUNK_MODES}"
+                )
+            self.chunk_tokens = int(os.getenv("CHUNK_SIZE_TOKENS", "256"))
+            self.overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+            if not 0 <= self.overlap_tokens < self.chunk_tokens:
+                raise ValueError("CHUNK_OVERLAP_TOKENS must be below CHUNK_SIZE_TOKENS")
+            self.encoding_name = os.getenv("CHUNK_ENCODING", "cl100k_base")
+            self._encoding = encoding
             self.text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=1000, chunk_overlap=200, add_start_index=True
             )
-            logger.debug("Text splitter initialized with chunk_size=1000, overlap=200")
+            logger.info(
+                f"Chunk service using {self.mode} mode"
+                + (
+                    f" ({self.chunk_tokens} tokens, overlap {self.overlap_tokens})"
+                    if self.mode == "tokens"
+                    else " (1000 characters, overlap 200)"
+                )
+            )
         except Exception as e:
             logger.error(f"Failed to initialize Chunk service: {str(e)}", exc_info=True)
             raise
 
+    @property
+    def encoding(self):
+        # Loaded lazily: tiktoken fetches the encoding file on first use
+        if self._encoding is None:
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        return self._encoding
+
     def chunk_docs(self, docs: List[Document]) -> List[Document]:
         """
         Split documents into chunks for processing.
 
+        Chunks keep their page's metadata (document_id, user_id, page, ...) and
+        gain a chunk_hash identifying their text.
+
         Args:
             docs: List of documents to chunk
 
@@ -30,43 +87,69 @@ class Chunk:
             List of chunked documents
         """
         try:
-            logger.info(f"Starting document chunking for {len(docs)} documents")
+            if self.mode == "tokens":
+                chunks = [chunk for doc in docs for chunk in self.split_tokens(doc)]
+            else:
+                chunks = self.text_splitter.split_documents(docs)
+                for chunk in chunks:
+                    # Identify the chunk by its text for incremental re-ingestion
+                    chunk.metadata["chunk_hash"] = text_hash(chunk.page_content)
 
-            # Log document details before chunking
-            for i, doc in enumerate(docs):
+            if logger.isEnabledFor(logging.DEBUG) and chunks:
                 logger.debug(
-                    f"Document {i+1}: "
-                    f"metadata={doc.metadata}, "
-                    f"content_length={len(doc.page_content)}"
+                    f"Chunked {len(docs)} pages into {len(chunks)} chunks, average "
+                    f"{sum(len(c.page_content) for c in chunks) / len(chunks):.0f} characters"
                 )
-
-            chunks = self.text_splitter.split_documents(docs)
-
-            # Log chunking results
-            logger.info(f"Chunking complete. Created {len(chunks)} chunks")
-            logger.debug(
-                f"Average chunk size: {sum(len(c.page_content) for c in chunks) / len(chunks):.0f} characters"
-            )
-
-            # Ensure each chunk preserves both document_id and user_id from its parent document
-            for i, chunk in enumerate(chunks):
-                if hasattr(chunk, "metadata"):
-                    parent_metadata = chunk.metadata
-                    # Preserve document_id
-                    if "document_id" in parent_metadata:
-                        chunk.metadata["document_id"] = parent_metadata["document_id"]
-                        logger.debug(
-                            f"Chunk {i+1}: Preserved document_id={parent_metadata['document_id']}"
-                        )
-                    # Preserve user_id
-                    if "user_id" in parent_metadata:
-                        chunk.metadata["user_id"] = parent_metadata["user_id"]
-                        logger.debug(
-                            f"Chunk {i+1}: Preserved user_id={parent_metadata['user_id']}"
-                        )
-
             return chunks
 
         except Exception as e:
             logger.error(f"Error during document chunking: {str(e)}", exc_info=True)
             raise
+
+    def split_tokens(self, doc: Document) -> List[Document]:
+        """
+        Split one page into windows of chunk_tokens tokens.
+
+        Args:
+            doc: Page to split
+
+        Returns:
+            Chunks with character offsets into the page and their token count
+        """
+        page = doc.page_content
+        tokens = self.encoding.encode(page, disallowed_special=())
+        if not tokens:
+            return []
+        offsets = self._token_offsets(page, tokens)
+        offsets.append(len(page))
+
+        chunks = []
+        step = self.chunk_tokens - self.overlap_tokens
+        for index, start in enumerate(range(0, len(tokens), step)):
+            stop = min(start + self.chunk_tokens, len(tokens))
+            text = page[offsets[start] : offsets[stop]]
+            if text.strip():
+                chunks.append(
+                    Document(
+                        page_content=text,
+                        metadata={
+                            **doc.metadata,
+                            "chunk_index": index,
+                            "start_index": offsets[start],
+                            "end_index": offsets[stop],
+                            "token_count": stop - start,
+                            "chunk_hash": text_hash(text),
+                        },
+                    )
+                )
+            if stop == len(tokens):
+                break
+        return chunks
+
+    def _token_offsets(self, page: str, tokens: Sequence[int]) -> List[int]:
+        """Character offset at which each token starts."""
+        if page.isascii():
+            # One byte per character, so byte offsets are character offsets
+            lengths = map(len, self.encoding.decode_tokens_bytes(tokens))
+            return [0, *accumulate(lengths)][:-1]
+        return self.encoding.decode_with_offsets(tokens)[1]
@@ -0,0 +1,58 @@
+"""
+Per-user corpus versions.
+
+Every transaction that changes what a user's searches return (upload, update,
+move and delete of documents, ingestion and linking, purges) bumps the user's
+row in corpus_versions before it commits. State derived from it and cached in
+memory, such as the tenant index and the result cache of utils.docs.search,
+compares versions instead of data: one primary key lookup tells whether another
+process (usually the worker) wrote since it was loaded.
+"""
+
+from typing import Iterable, Optional
+
+from models.corpus_version import CorpusVersion
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+
+async def bump_corpus_versions(
+    db: AsyncSession, user_ids: Iterable[Optional[int]]
+) -> None:
+    """
+    Increment the corpus version of users whose chunks changed.
+
+    The caller commits the transaction.
+    """
+    # Sorted so concurrent bumps lock rows in the same order
+    ids = sorted({user_id for user_id in user_ids if user_id is not None})
+    if not ids:
+        return
+    stmt = insert(CorpusVersion).values(
+        [{"user_id": user_id, "version": 1} for user_id in ids]
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[CorpusVersion.user_id],
+            set_={"version": CorpusVersion.version + 1, "updated_at": func.now()},
+        )
+    )
+
+
+def get_corpus_version(conn: Connection, user_id: int) -> int:
+    """Current corpus version of a user, 0 before the first write."""
+    version = conn.execute(
+        select(CorpusVersion.version).where(CorpusVersion.user_id == user_id)
+    ).scalar_one_or_none()
+    return version or 0
+
+
+async def aget_corpus_version(db: AsyncSession, user_id: int) -> int:
+    """Current corpus version of a user, 0 before the first write."""
+    result = await db.execute(
+        select(CorpusVersion.version).where(CorpusVersion.user_id == user_id)
+    )
+    return result.scalar_one_or_none() or 0
@@ -0,0 +1,362 @@
+"""
+Near-duplicate chunk detection with MinHash and locality-sensitive hashing.
+
+Headers, footers, disclaimers and repeated tables turn into many chunks that
+differ by a few words. Each chunk gets a MinHash signature of its word
+shingles; chunks whose estimated Jaccard similarity with an earlier chunk of
+the same document, or with a chunk of another document of the same user,
+reaches DEDUPE_THRESHOLD are not embedded. They are recorded in chunk_minhashes
+as references to their representative instead, which keeps one copy in the
+vector store and out of the way of other results.
+
+Candidates are found by LSH: the signature is split into DEDUPE_BANDS bands and
+chunks sharing any band key are compared. Signatures and band keys are
+computed with NumPy for a whole batch of chunks at once.
+
+When a representative disappears (its document is deleted or re-ingested
+without it), the documents referencing it are queued for ingestion again so
+their chunks get embedded.
+
+Environment:
+    DEDUPE_ENABLED: true/false (default false)
+    DEDUPE_THRESHOLD: estimated Jaccard similarity of a duplicate (default 0.9)
+    DEDUPE_NUM_PERM: MinHash permutations (default 128)
+    DEDUPE_BANDS: LSH bands, must divide DEDUPE_NUM_PERM (default 16)
+    DEDUPE_SHINGLE_SIZE: words per shingle (default 3)
+    DEDUPE_CROSS_DOCUMENT: also match other documents of the user (default true)
+"""
+
+import logging
+import os
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from models.chunk_minhash import ChunkMinHash
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import get_database
+from utils.docs.embedding_cache import normalize_text
+from utils.docs.jobs import JobQueue
+
+logger = logging.getLogger(__name__)
+
+# Largest prime below 2**32: hashes and permutations stay below 2**64 as uint64
+_PRIME = np.uint64(4294967291)
+
+# Bounds the rows fetched per candidate lookup
+MAX_CANDIDATES = 1000
+
+
+class MinHasher:
+    def __init__(
+        self, num_perm: int = 128, bands: int = 16, shingle_size: int = 3, seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError("DEDUPE_BANDS must divide DEDUPE_NUM_PERM")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.band_coeffs = rng.integers(1, 2**63, size=self.rows, dtype=np.uint64)
+        self.band_salts = rng.integers(0, 2**63, size=bands, dtype=np.uint64)
+
+    def shingles(self, value: str) -> np.ndarray:
+        """Hashes of the distinct word shingles of a text."""
+        words = normalize_text(value).lower().split(" ")
+        k = self.shingle_size
+        grams = (
+            {" ".join(words[i : i + k]) for i in range(len(words) - k + 1)}
+            if len(words) > k
+            else {" ".join(words)}
+        )
+        return np.fromiter(
+            (zlib.crc32(g.encode("utf-8")) for g in grams),
+            dtype=np.uint64,
+            count=len(grams),
+        )
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """MinHash signatures, one uint32 row of num_perm values per text."""
+        out = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for i, value in enumerate(texts):
+            hashes = self.shingles(value)
+            permuted = (np.outer(self.a, hashes) + self.b[:, None]) % _PRIME
+            out[i] = permuted.min(axis=1)
+        return out
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """LSH band keys (int64, one column per band) of a signature matrix."""
+        rows = signatures.astype(np.uint64).reshape(-1, self.bands, self.rows)
+        # uint64 arithmetic wraps, which is what a hash wants
+        keys = (rows * self.band_coeffs).sum(axis=2, dtype=np.uint64)
+        return (keys ^ self.band_salts).view(np.int64)
+
+    @staticmethod
+    def similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+        """Estimated Jaccard similarity between one signature and many."""
+        return (others == signature).mean(axis=-1)
+
+
+@dataclass
+class ChunkSignature:
+    id: str
+    signature: np.ndarray
+    bands: np.ndarray
+    representative_id: Optional[str] = None
+
+
+@dataclass
+class DedupeRun:
+    """Signatures of one document seen so far, indexed by band key."""
+
+    document_id: int
+    user_id: Optional[int]
+    rows: List[ChunkSignature] = field(default_factory=list)
+    buckets: Dict[int, List[int]] = field(default_factory=lambda: defaultdict(list))
+    duplicates: int = 0
+    chars_saved: int = 0
+
+    def add(self, row: ChunkSignature) -> None:
+        self.rows.append(row)
+        if row.representative_id is None:
+            for key in row.bands.tolist():
+                self.buckets[key].append(len(self.rows) - 1)
+
+    def candidates(self, bands: np.ndarray) -> List[ChunkSignature]:
+        seen = {i for key in bands.tolist() for i in self.buckets.get(key, ())}
+        return [self.rows[i] for i in sorted(seen)]
+
+
+class ChunkDeduplicator:
+    def __init__(self, hasher: Optional[MinHasher] = None):
+        self.enabled = os.getenv("DEDUPE_ENABLED", "false").lower() == "true"
+        self.threshold = float(os.getenv("DEDUPE_THRESHOLD", "0.9"))
+        self.cross_document = (
+            os.getenv("DEDUPE_CROSS_DOCUMENT", "true").lower() == "true"
+        )
+        self.hasher = hasher or MinHasher(
+            num_perm=int(os.getenv("DEDUPE_NUM_PERM", "128")),
+            bands=int(os.getenv("DEDUPE_BANDS", "16")),
+            shingle_size=int(os.getenv("DEDUPE_SHINGLE_SIZE", "3")),
+        )
+
+    def sign(self, chunks: Sequence[Document]) -> Tuple[np.ndarray, np.ndarray]:
+        """Signatures and band keys of chunks; CPU-bound, run it in a thread."""
+        signatures = self.hasher.signatures([c.page_content for c in chunks])
+        return signatures, self.hasher.band_keys(signatures)
+
+    def _best(
+        self, signature: np.ndarray, candidates: Sequence[ChunkSignature]
+    ) -> Optional[str]:
+        if not candidates:
+            return None
+        scores = self.hasher.similarity(
+            signature, np.stack([c.signature for c in candidates])
+        )
+        best = int(scores.argmax())
+        return candidates[best].id if scores[best] >= self.threshold else None
+
+    async def filter(
+        self,
+        run: DedupeRun,
+        chunks: Sequence[Document],
+        new: Sequence[Document],
+        kept_ids: Sequence[str],
+        signed: Tuple[np.ndarray, np.ndarray],
+    ) -> List[Document]:
+        """
+        Record the signatures of a batch of chunks and drop near-duplicates.
+
+        Args:
+            run: Dedupe state of the document
+            chunks: Every chunk of the batch, in order
+            new: Chunks that need a vector, with ids assigned
+            kept_ids: Vector ids of the other chunks, in order
+            signed: Signatures and band keys of chunks from sign()
+
+        Returns:
+            The new chunks that still need embedding
+        """
+        signatures, bands = signed
+        new_ids = {id(chunk) for chunk in new}
+        kept = iter(kept_ids)
+        pending = []
+        for i, chunk in enumerate(chunks):
+            if id(chunk) in new_ids:
+                pending.append(i)
+            else:
+                run.add(ChunkSignature(next(kept), signatures[i], bands[i]))
+
+        remote = {}
+        if self.cross_document and pending:
+            try:
+                remote = await self.lookup(run, np.unique(bands[pending]))
+            except Exception as e:
+                logger.warning(f"Duplicate chunk lookup failed: {str(e)}")
+
+        unique = []
+        for i in pending:
+            chunk = chunks[i]
+            candidates = run.candidates(bands[i]) + [
+                remote[key] for key in bands[i].tolist() if key in remote
+            ]
+            representative = self._best(signatures[i], candidates)
+            run.add(ChunkSignature(chunk.id, signatures[i], bands[i], representative))
+            if representative is None:
+                unique.append(chunk)
+            else:
+                run.duplicates += 1
+                run.chars_saved += len(chunk.page_content)
+        return unique
+
+    async def lookup(
+        self, run: DedupeRun, band_keys: np.ndarray
+    ) -> Dict[int, ChunkSignature]:
+        """Representatives of the user's other documents sharing a band key."""
+        async with get_database().async_session() as db:
+            result = await db.execute(
+                select(ChunkMinHash.id, ChunkMinHash.signature, ChunkMinHash.bands)
+                .where(ChunkMinHash.user_id == run.user_id)
+                .where(ChunkMinHash.document_id != run.document_id)
+                .where(ChunkMinHash.representative_id.is_(None))
+                .where(ChunkMinHash.bands.overlap(band_keys.tolist()))
+                .limit(MAX_CANDIDATES)
+            )
+            rows = result.all()
+
+        wanted = set(band_keys.tolist())
+        matches: Dict[int, ChunkSignature] = {}
+        for chunk_id, data, row_bands in rows:
+            signature = np.frombuffer(data, dtype="<u4")
+            row = ChunkSignature(chunk_id, signature, np.asarray(row_bands))
+            for key in row_bands:
+                if key in wanted:
+                    matches.setdefault(key, row)
+        return matches
+
+
+async def save_signatures(
+    db: AsyncSession,
+    document_id: int,
+    rows: Sequence[ChunkSignature],
+    user_id: Optional[int] = None,
+) -> List[str]:
+    """
+    Replace the stored signatures of a document.
+
+    The caller commits the transaction.
+
+    Returns:
+        Representative ids that went away and may still be referenced
+    """
+    result = await db.execute(
+        delete(ChunkMinHash)
+        .where(ChunkMinHash.document_id == document_id)
+        .returning(ChunkMinHash.id, ChunkMinHash.representative_id)
+    )
+    removed = {row_id for row_id, rep in result.all() if rep is None}
+
+    values = [
+        {
+            "id": row.id,
+            "document_id": document_id,
+            "user_id": user_id,
+            "signature": row.signature.astype("<u4").tobytes(),
+            "bands": row.bands.tolist(),
+            "representative_id": row.representative_id,
+        }
+        for row in rows
+    ]
+    # Stay well under the driver's bind parameter limit
+    for i in range(0, len(values), 500):
+        await db.execute(
+            insert(ChunkMinHash).values(values[i : i + 500]).on_conflict_do_nothing()
+        )
+    return sorted(removed - {row.id for row in rows if row.representative_id is None})
+
+
+async def has_duplicate_chunks(db: AsyncSession, document_id: int) -> bool:
+    """Whether some chunks of a document were skipped as near-duplicates."""
+    result = await db.execute(
+        select(ChunkMinHash.id)
+        .where(ChunkMinHash.document_id == document_id)
+        .where(ChunkMinHash.representative_id.is_not(None))
+        .limit(1)
+    )
+    return result.first() is not None
+
+
+async def clone_signatures(
+    db: AsyncSession,
+    source_document_id: int,
+    document_id: int,
+    ids: Dict[str, str],
+    user_id: Optional[int] = None,
+) -> List[str]:
+    """
+    Replace the stored signatures of a document with copies of another's.
+
+    Only representatives are copied, under the ids their vectors were copied
+    to; the caller checks the source has no near-duplicates beforehand.
+    The caller commits the transaction.
+
+    Args:
+        ids: New vector id by source vector id, from cloned_chunk_ids
+
+    Returns:
+        Representative ids that went away and may still be referenced
+    """
+    result = await db.execute(
+        select(ChunkMinHash.id, ChunkMinHash.signature, ChunkMinHash.bands)
+        .where(ChunkMinHash.document_id == source_document_id)
+        .where(ChunkMinHash.representative_id.is_(None))
+    )
+    rows = [
+        ChunkSignature(
+            ids[row_id], np.frombuffer(data, dtype="<u4"), np.asarray(row_bands)
+        )
+        for row_id, data, row_bands in result.all()
+        if row_id in ids
+    ]
+    return await save_signatures(db, document_id, rows, user_id)
+
+
+async def requeue_referencing(
+    db: AsyncSession,
+    representative_ids: Sequence[str],
+    job_queue: JobQueue,
+    exclude_document_id: Optional[int] = None,
+) -> int:
+    """
+    Queue ingestion of documents whose duplicates point at removed representatives.
+
+    The caller commits the transaction.
+
+    Returns:
+        Number of documents queued
+    """
+    if not representative_ids:
+        return 0
+    result = await db.execute(
+        select(ChunkMinHash.document_id, ChunkMinHash.user_id)
+        .where(ChunkMinHash.representative_id.in_(list(representative_ids)))
+        .where(ChunkMinHash.document_id != (exclude_document_id or -1))
+        .distinct()
+    )
+    by_user: Dict[Optional[int], List[int]] = defaultdict(list)
+    for document_id, user_id in result.all():
+        by_user[user_id].append(document_id)
+    for user_id, document_ids in by_user.items():
+        await job_queue.enqueue(db, document_ids, user_id, kind="ingest")
+    queued = sum(len(ids) for ids in by_user.values())
+    if queued:
+        logger.info(f"Queued {queued} documents whose duplicate chunks lost their copy")
+    return queued
@@ -1,22 +1,189 @@
+import asyncio
 import os
-from typing import List
+import random
+import time
+from typing import List, Optional
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings as EmbeddingsModel
 from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
 from uuid import uuid4
 from utils.database import Database
 import logging
+import openai
+import tiktoken
+from utils.docs.embedding_cache import EmbeddingCache
 from utils.vector_store import get_vector_store
 
 logger = logging.getLogger(__name__)
 
+# Errors worth retrying: throttling, timeouts and provider-side failures
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Wait until amount tokens are available and take them."""
+        # A single request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class EmbeddingExecutor:
+    """
+    Embeds texts in token-bounded batches with limited concurrency.
+
+    Requests are paced by token buckets for the provider's requests-per-minute
+    and tokens-per-minute limits, and each batch is retried on its own with
+    exponential backoff, so one throttled batch does not fail the others.
+
+    Environment:
+        EMBED_BATCH_MAX_TOKENS: tokens per request (default 100000)
+        EMBED_BATCH_MAX_TEXTS: texts per request (default 512)
+        EMBED_MAX_CONCURRENCY: requests in flight (default 4)
+        EMBED_TPM / EMBED_RPM: provider limits (default 1000000 / 3000)
+        EMBED_MAX_RETRIES: attempts per batch after the first (default 5)
+    """
+
+    def __init__(self, model: EmbeddingsModel, encoding=None):
+        self.model = model
+        self.max_batch_tokens = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "100000"))
+        self.max_batch_texts = int(os.getenv("EMBED_BATCH_MAX_TEXTS", "512"))
+        self.max_retries = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+        self.backoff_base = float(os.getenv("EMBED_BACKOFF_BASE_SECONDS", "1"))
+        self._semaphore = asyncio.Semaphore(
+            int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+        )
+        self._tpm = TokenBucket(float(os.getenv("EMBED_TPM", "1000000")))
+        self._rpm = TokenBucket(float(os.getenv("EMBED_RPM", "3000")))
+        self._encoding = encoding
+
+    @property
+    def encoding(self):
+        # Loaded lazily: tiktoken fetches the encoding file on first use
+        if self._encoding is None:
+            model_name = getattr(self.model, "tiktoken_model_name", None) or getattr(
+                self.model, "model", ""
+            )
+            try:
+                self._encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Group text indices into batches within the token and size limits.
+
+        A text larger than the token limit gets a batch of its own.
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_texts
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        retry_after = (
+            response.headers.get("retry-after") if response is not None else None
+        )
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        delay = self.backoff_base * 2**attempt
+        return random.uniform(delay / 2, delay)
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(self.count_tokens(text) for text in texts)
+        for attempt in range(self.max_retries + 1):
+            await self._rpm.acquire(1)
+            await self._tpm.acquire(tokens)
+            try:
+                async with self._semaphore:
+                    return await self.model.aembed_documents(texts)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                logger.warning(
+                    f"Embedding batch of {len(texts)} texts failed "
+                    f"({type(e).__name__}), retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, preserving their order.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One vector per text
+        """
+        batches = self.make_batches(texts)
+        results = await asyncio.gather(
+            *(self._embed_batch([texts[i] for i in batch]) for batch in batches)
+        )
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, batch_vectors in zip(batches, results):
+            for i, vector in zip(batch, batch_vectors):
+                vectors[i] = vector
+        return vectors
+
 
 class Embeddings:
     def __init__(self):
-        """Initialize the embeddings service with PGVector."""
+        """Initialize the embeddings service with the chunk vector store."""
         try:
             logger.info("Initializing Embeddings service")
-            self.pgvector = get_vector_store()
+            self.vector_store = get_vector_store()
+            self.executor = EmbeddingExecutor(self.vector_store.embeddings)
+            self.cache = EmbeddingCache(
+                getattr(self.vector_store.embeddings, "model", type(self).__name__)
+            )
             logger.info("Embeddings service initialized successfully")
         except Exception as e:
             logger.error(
@@ -24,7 +191,7 @@ class Embeddings:
             )
             raise
 
-    def embed_docs(self, docs: List[Document]):
+    async def embed_docs(self, docs: List[Document]):
         """
         Embed documents and store them in the vector database.
 
@@ -46,9 +213,10 @@ class Embeddings:
                     f"user_id={doc.metadata.get('user_id', 'not_set')}"
                 )
 
-            # Add documents to vector store
+            # Embed in rate-limited batches, then add to vector store
+            vectors = await self.aembed_texts([doc.page_content for doc in docs])
             logger.debug("Adding documents to vector store")
-            document_ids = self.pgvector.add_documents(docs)
+            document_ids = await asyncio.to_thread(self.add_embeddings, docs, vectors)
 
             # Log embedding results
             logger.info(f"Embedding complete. Created {len(document_ids)} embeddings")
@@ -59,3 +227,36 @@ class Embeddings:
         except Exception as e:
             logger.error(f"Error during document embedding: {str(e)}", exc_info=True)
             raise
+
+    async def aembed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts without storing them, reusing cached vectors where possible.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One vector per text
+        """
+        return await self.cache.embed(texts, self.executor.embed)
+
+    def add_embeddings(
+        self, docs: List[Document], vectors: List[List[float]]
+    ) -> List[str]:
+        """
+        Store precomputed vectors for documents in the vector database.
+
+        Args:
+            docs: Documents the vectors were computed from
+            vectors: One vector per document
+
+        Returns:
+            List of IDs of the stored embeddings
+        """
+        return self.vector_store.add_embeddings(
+            texts=[doc.page_content for doc in docs],
+            embeddings=vectors,
+            metadatas=[doc.metadata for doc in docs],
+            # Documents with an id are upserted on it
+            ids=[doc.id for doc in docs],
+        )
@@ -0,0 +1,239 @@
+"""
+Persistent cache of chunk embeddings.
+
+Entries are keyed by (embedding model, SHA-256 of the normalized chunk text),
+so re-ingesting an edited document or boilerplate repeated across documents
+only sends new text to the provider. Vectors are stored as float32 bytes.
+
+Lookups are plain reads. Hits are counted in memory and written back, with a
+new last_used_at, in one statement once a hit entry was last touched more than
+EMBED_CACHE_TOUCH_SECONDS ago or EMBED_CACHE_TOUCH_BATCH entries have pending
+hits, so last_used_at is accurate to about EMBED_CACHE_TOUCH_SECONDS. The least
+recently used entries beyond EMBED_CACHE_MAX_ENTRIES (or older than
+EMBED_CACHE_TTL_DAYS) are evicted periodically.
+
+Environment:
+    EMBED_CACHE_ENABLED: true/false (default true)
+    EMBED_CACHE_MAX_ENTRIES: entries kept after eviction (default 2000000)
+    EMBED_CACHE_TTL_DAYS: drop entries unused for this long, 0 disables (default 90)
+    EMBED_CACHE_EVICT_EVERY: stored entries between eviction passes (default 5000)
+    EMBED_CACHE_TOUCH_SECONDS: age of last_used_at that a hit refreshes (default 3600)
+    EMBED_CACHE_TOUCH_BATCH: entries with pending hits that force a write (default 1000)
+"""
+
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+import numpy as np
+from models.embedding_cache import EmbeddingCacheEntry
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+from utils.database import get_database
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+EVICT_LEAST_RECENTLY_USED = text(
+    """
+    DELETE FROM embedding_cache
+    WHERE last_used_at < (
+        SELECT last_used_at FROM embedding_cache
+        ORDER BY last_used_at DESC
+        OFFSET :max_entries LIMIT 1
+    )
+    """
+)
+
+
+# Add pending hits to entries and mark them as used now
+TOUCH_ENTRIES = text(
+    """
+    UPDATE embedding_cache AS e
+    SET last_used_at = now(), hit_count = e.hit_count + h.hits
+    FROM unnest(CAST(:hashes AS varchar[]), CAST(:hits AS integer[]))
+        AS h(text_hash, hits)
+    WHERE e.model = :model AND e.text_hash = h.text_hash
+    """
+)
+
+
+def normalize_text(value: str) -> str:
+    """Normalize text so formatting-only differences share a cache entry."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", value)).strip()
+
+
+def text_hash(value: str) -> str:
+    return hashlib.sha256(normalize_text(value).encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector: Sequence[float]) -> bytes:
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def decode_vector(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype="<f4").tolist()
+
+
+class EmbeddingCache:
+    def __init__(self, model: str):
+        self.model = model
+        self.enabled = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+        self.max_entries = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "2000000"))
+        self.ttl_days = int(os.getenv("EMBED_CACHE_TTL_DAYS", "90"))
+        self.evict_every = int(os.getenv("EMBED_CACHE_EVICT_EVERY", "5000"))
+        self.touch_seconds = int(os.getenv("EMBED_CACHE_TOUCH_SECONDS", "3600"))
+        self.touch_batch = int(os.getenv("EMBED_CACHE_TOUCH_BATCH", "1000"))
+        self.hits = 0
+        self.misses = 0
+        self._stored_since_eviction = 0
+        # Hits by text hash not yet written to the table
+        self._pending_hits: Counter = Counter()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    async def embed(
+        self,
+        texts: List[str],
+        embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+    ) -> List[List[float]]:
+        """
+        Return one vector per text, calling embed_fn only for uncached texts.
+
+        Identical texts within the call are embedded once.
+
+        Args:
+            texts: Texts to embed
+            embed_fn: Provider call for the texts missing from the cache
+
+        Returns:
+            One vector per text, in order
+        """
+        if not self.enabled or not texts:
+            return await embed_fn(texts)
+
+        hashes = [text_hash(t) for t in texts]
+        try:
+            cached = await self.lookup(list(set(hashes)))
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed: {str(e)}")
+            cached = {}
+
+        missing: Dict[str, str] = {}
+        misses = 0
+        for h, t in zip(hashes, texts):
+            if h not in cached:
+                missing.setdefault(h, t)
+                misses += 1
+        self.hits += len(texts) - misses
+        self.misses += misses
+
+        if missing:
+            vectors = await embed_fn(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            try:
+                await self.store(new)
+            except Exception as e:
+                logger.warning(f"Embedding cache store failed: {str(e)}")
+            cached.update(new)
+
+        return [cached[h] for h in hashes]
+
+    async def lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        """Fetch cached vectors, recording the hits for a later touch."""
+        async with get_database().async_session() as db:
+            result = await db.execute(
+                select(
+                    EmbeddingCacheEntry.text_hash,
+                    EmbeddingCacheEntry.embedding,
+                    (
+                        EmbeddingCacheEntry.last_used_at
+                        < func.now() - timedelta(seconds=self.touch_seconds)
+                    ).label("stale"),
+                )
+                .where(EmbeddingCacheEntry.model == self.model)
+                .where(EmbeddingCacheEntry.text_hash.in_(hashes))
+            )
+            rows = result.all()
+            self._pending_hits.update(h for h, _, _ in rows)
+            if any(stale for _, _, stale in rows) or (
+                len(self._pending_hits) >= self.touch_batch
+            ):
+                await self.touch(db)
+        return {h: decode_vector(data) for h, data, _ in rows}
+
+    async def touch(self, db) -> None:
+        """Write the pending hits and a new last_used_at in one statement."""
+        pending, self._pending_hits = self._pending_hits, Counter()
+        try:
+            await db.execute(
+                TOUCH_ENTRIES,
+                {
+                    "model": self.model,
+                    "hashes": list(pending),
+                    "hits": list(pending.values()),
+                },
+            )
+            await db.commit()
+        except Exception as e:
+            # Only recency and counters are lost; the vectors were read
+            logger.warning(f"Embedding cache touch failed: {str(e)}")
+
+    async def store(self, vectors: Dict[str, List[float]]) -> None:
+        """Insert new entries and evict old ones every evict_every insertions."""
+        rows = [
+            {
+                "model": self.model,
+                "text_hash": h,
+                "dimensions": len(vector),
+                "embedding": encode_vector(vector),
+            }
+            for h, vector in vectors.items()
+        ]
+        async with get_database().async_session() as db:
+            # Stay well under the driver's bind parameter limit
+            for i in range(0, len(rows), 1000):
+                await db.execute(
+                    insert(EmbeddingCacheEntry)
+                    .values(rows[i : i + 1000])
+                    .on_conflict_do_nothing()
+                )
+            await db.commit()
+
+        self._stored_since_eviction += len(rows)
+        if self._stored_since_eviction >= self.evict_every:
+            self._stored_since_eviction = 0
+            await self.evict()
+
+    async def evict(self) -> int:
+        """Remove expired and least recently used entries."""
+        removed = 0
+        async with get_database().async_session() as db:
+            if self.ttl_days:
+                result = await db.execute(
+                    delete(EmbeddingCacheEntry).where(
+                        EmbeddingCacheEntry.last_used_at
+                        < func.now() - timedelta(days=self.ttl_days)
+                    )
+                )
+                removed += result.rowcount
+            result = await db.execute(
+                EVICT_LEAST_RECENTLY_USED, {"max_entries": self.max_entries}
+            )
+            removed += result.rowcount
+            await db.commit()
+        logger.info(f"Evicted {removed} embedding cache entries; stats={self.stats()}")
+        return removed
@@ -0,0 +1,455 @@
+"""
+Garbage collection of vectors and files left behind by deleted documents.
+
+Deleting a document only removes its rows and queues a purge job; the worker
+then deletes the document's vectors in small batches so a large document never
+holds long row locks or bloats a single transaction. The periodic collector
+catches whatever the purge missed (vectors written by an ingestion that was
+still running, files whose delete failed after commit, abandoned uploads):
+
+- vectors whose document_id no longer exists in documents
+- MinHash signatures of deleted documents (documents whose near-duplicate
+  chunks pointed at them are queued for ingestion again)
+- blobs that no document references any more, with their files
+- files under blobs/ that have no blob row
+- spooled .part uploads older than the grace period
+
+Only one collector runs at a time across workers (Postgres advisory lock). A run
+can optionally VACUUM (ANALYZE) and REINDEX the embedding table once enough
+rows were removed.
+
+Environment:
+    GC_BATCH_SIZE: rows deleted per transaction (default 1000)
+    GC_GRACE_SECONDS: minimum age of files and blobs before removal (default 3600)
+    GC_VACUUM_MIN_ROWS: removed rows that trigger VACUUM/REINDEX (default 10000)
+
+Run once from the backend directory with `python -m utils.docs.gc [--vacuum] [--reindex]`.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from models.blob import Blob
+from models.document import Document
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import get_database
+from utils.docs.blobs import BlobStore
+from utils.docs.corpus import bump_corpus_versions
+from utils.docs.dedupe import requeue_referencing, save_signatures
+from utils.docs.jobs import JobQueue
+from utils.storage import StorageBackend, get_storage
+from utils.vector_store import DEFAULT_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_try_advisory_lock, shared by every collector
+GC_LOCK_KEY = 727_105_001
+
+EMBEDDING_TABLE = "document_chunks"
+
+# One batch of a deleted document's vectors, with the bytes they occupied
+PURGE_DOCUMENT_EMBEDDINGS = text(
+    """
+    WITH doomed AS (
+        SELECT id
+        FROM document_chunks
+        WHERE collection = :collection_name AND document_id = :document_id
+        LIMIT :batch_size
+    ), deleted AS (
+        DELETE FROM document_chunks e
+        USING doomed
+        WHERE e.id = doomed.id
+        RETURNING pg_column_size(e.*) AS size
+    )
+    SELECT count(*), COALESCE(sum(size), 0) FROM deleted
+    """
+)
+
+# Next batch of document ids that still have vectors but no document row. A
+# skip scan of ix_document_chunks_document_id probes the index once per
+# distinct document instead of reading every vector
+ORPHAN_DOCUMENT_IDS = text(
+    """
+    WITH RECURSIVE ids AS (
+        SELECT min(document_id) AS id
+        FROM document_chunks
+        WHERE document_id > :after
+        UNION ALL
+        SELECT (
+            SELECT min(document_id) FROM document_chunks WHERE document_id > ids.id
+        )
+        FROM ids
+        WHERE ids.id IS NOT NULL
+    )
+    SELECT ids.id
+    FROM ids
+    WHERE ids.id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM documents d WHERE d.id = ids.id)
+    LIMIT :batch_size
+    """
+)
+
+# One batch of the vectors of deleted documents, found through the index
+DELETE_DOCUMENTS_EMBEDDINGS = text(
+    """
+    WITH doomed AS (
+        SELECT id
+        FROM document_chunks
+        WHERE document_id = ANY(:document_ids)
+        LIMIT :batch_size
+    ), deleted AS (
+        DELETE FROM document_chunks e
+        USING doomed
+        WHERE e.id = doomed.id
+        RETURNING pg_column_size(e.*) AS size
+    )
+    SELECT count(*), COALESCE(sum(size), 0) FROM deleted
+    """
+)
+
+# Blobs no document points at, e.g. after a reference count drifted
+DELETE_UNREFERENCED_BLOBS = text(
+    """
+    DELETE FROM blobs b
+    WHERE b.content_hash IN (
+        SELECT b2.content_hash FROM blobs b2
+        WHERE b2.created_at < now() - make_interval(secs => :grace_seconds)
+          AND NOT EXISTS (
+              SELECT 1 FROM documents d WHERE d.content_hash = b2.content_hash
+          )
+        LIMIT :batch_size
+    )
+    RETURNING b.file_path, b.size_bytes
+    """
+)
+
+# Signatures of documents that no longer exist
+DELETE_ORPHAN_SIGNATURES = text(
+    """
+    DELETE FROM chunk_minhashes
+    WHERE id IN (
+        SELECT m.id FROM chunk_minhashes m
+        WHERE NOT EXISTS (SELECT 1 FROM documents d WHERE d.id = m.document_id)
+        LIMIT :batch_size
+    )
+    RETURNING id, representative_id
+    """
+)
+
+
+@dataclass
+class GcReport:
+    """What a purge or collection removed."""
+
+    embeddings_deleted: int = 0
+    embedding_bytes: int = 0
+    signatures_deleted: int = 0
+    documents_requeued: int = 0
+    blobs_deleted: int = 0
+    files_deleted: int = 0
+    file_bytes: int = 0
+    maintenance: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "embeddings_deleted": self.embeddings_deleted,
+            "embedding_bytes": self.embedding_bytes,
+            "signatures_deleted": self.signatures_deleted,
+            "documents_requeued": self.documents_requeued,
+            "blobs_deleted": self.blobs_deleted,
+            "files_deleted": self.files_deleted,
+            "file_bytes": self.file_bytes,
+            "maintenance": self.maintenance,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class GarbageCollector:
+    def __init__(
+        self,
+        storage: Optional[StorageBackend] = None,
+        job_queue: Optional[JobQueue] = None,
+    ):
+        self.storage = storage or get_storage()
+        self.blob_store = BlobStore(self.storage)
+        self.job_queue = job_queue or JobQueue()
+        self.batch_size = int(os.getenv("GC_BATCH_SIZE", "1000"))
+        self.grace_seconds = float(os.getenv("GC_GRACE_SECONDS", "3600"))
+        self.vacuum_min_rows = int(os.getenv("GC_VACUUM_MIN_ROWS", "10000"))
+
+    async def _delete_in_batches(
+        self, db: AsyncSession, statement, params: dict, report: GcReport
+    ) -> None:
+        """Run a batched vector delete until it removes nothing, committing per batch."""
+        while True:
+            result = await db.execute(
+                statement, {**params, "batch_size": self.batch_size}
+            )
+            rows, size = result.one()
+            await db.commit()
+            report.embeddings_deleted += rows
+            report.embedding_bytes += int(size)
+            if rows < self.batch_size:
+                return
+
+    async def purge_document(
+        self,
+        db: AsyncSession,
+        document_id: int,
+        user_id: Optional[int] = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> GcReport:
+        """
+        Delete every vector of a deleted document in batches.
+
+        Args:
+            db: Database session; committed after every batch
+            document_id: Document that was deleted
+            user_id: Owner whose corpus version is bumped once the vectors are gone
+            collection_name: Vector collection to purge
+
+        Returns:
+            Report of the rows and bytes reclaimed
+        """
+        started = time.monotonic()
+        report = GcReport()
+        if await db.get(Document, document_id) is not None:
+            logger.warning(f"Document {document_id} exists again, not purging it")
+            return report
+
+        await self._delete_in_batches(
+            db,
+            PURGE_DOCUMENT_EMBEDDINGS,
+            {"collection_name": collection_name, "document_id": document_id},
+            report,
+        )
+        gone = await save_signatures(db, document_id, [])
+        report.documents_requeued += await requeue_referencing(db, gone, self.job_queue)
+        await bump_corpus_versions(db, [user_id])
+        await db.commit()
+        report.seconds = time.monotonic() - started
+        logger.info(f"Purged document {document_id}: {report.as_dict()}")
+        return report
+
+    async def collect(
+        self, db: AsyncSession, vacuum: bool = False, reindex: bool = False
+    ) -> GcReport:
+        """
+        Remove orphaned vectors, blobs and files.
+
+        Args:
+            db: Database session; committed after every batch
+            vacuum: VACUUM (ANALYZE) the embedding table if enough rows went
+            reindex: REINDEX the embedding table if enough rows went
+
+        Returns:
+            Report of what was reclaimed
+        """
+        started = time.monotonic()
+        report = GcReport()
+
+        await self._collect_embeddings(db, report)
+        await self._collect_signatures(db, report)
+        await self._collect_blobs(db, report)
+        await self._collect_files(db, report)
+        await self._collect_spool(report)
+
+        if report.embeddings_deleted >= self.vacuum_min_rows:
+            if vacuum:
+                await self._maintain(f"VACUUM (ANALYZE) {EMBEDDING_TABLE}", report)
+            if reindex:
+                await self._maintain(
+                    f"REINDEX TABLE CONCURRENTLY {EMBEDDING_TABLE}", report
+                )
+
+        report.seconds = time.monotonic() - started
+        logger.info(f"Garbage collection finished: {report.as_dict()}")
+        return report
+
+    async def _collect_embeddings(self, db: AsyncSession, report: GcReport) -> None:
+        """Delete the vectors of documents that no longer exist."""
+        after = 0
+        while True:
+            result = await db.execute(
+                ORPHAN_DOCUMENT_IDS, {"after": after, "batch_size": self.batch_size}
+            )
+            document_ids = list(result.scalars())
+            if document_ids:
+                await self._delete_in_batches(
+                    db,
+                    DELETE_DOCUMENTS_EMBEDDINGS,
+                    {"document_ids": document_ids},
+                    report,
+                )
+            else:
+                await db.commit()
+            if len(document_ids) < self.batch_size:
+                return
+            after = document_ids[-1]
+
+    async def _collect_signatures(self, db: AsyncSession, report: GcReport) -> None:
+        while True:
+            result = await db.execute(
+                DELETE_ORPHAN_SIGNATURES, {"batch_size": self.batch_size}
+            )
+            rows = result.all()
+            gone = [
+                row_id for row_id, representative_id in rows if not representative_id
+            ]
+            report.documents_requeued += await requeue_referencing(
+                db, gone, self.job_queue
+            )
+            await db.commit()
+            report.signatures_deleted += len(rows)
+            if len(rows) < self.batch_size:
+                return
+
+    async def _collect_blobs(self, db: AsyncSession, report: GcReport) -> None:
+        while True:
+            result = await db.execute(
+                DELETE_UNREFERENCED_BLOBS,
+                {"grace_seconds": self.grace_seconds, "batch_size": self.batch_size},
+            )
+            rows = result.all()
+            await db.commit()
+            sizes = dict(rows)
+            for key in await self.blob_store.delete_files(db, sizes):
+                report.files_deleted += 1
+                report.file_bytes += sizes[key]
+            report.blobs_deleted += len(rows)
+            if len(rows) < self.batch_size:
+                return
+
+    async def _collect_files(self, db: AsyncSession, report: GcReport) -> None:
+        """Delete stored blob files that no blob or document row points at."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace_seconds)
+        objects = [
+            o for o in await self.storage.list("blobs/") if o.modified_at < cutoff
+        ]
+        for i in range(0, len(objects), self.batch_size):
+            batch = objects[i : i + self.batch_size]
+            keys = [o.key for o in batch]
+            referenced = set(
+                (
+                    await db.execute(
+                        select(Blob.file_path).where(Blob.file_path.in_(keys))
+                    )
+                ).scalars()
+            )
+            referenced.update(
+                (
+                    await db.execute(
+                        select(Document.file_path).where(Document.file_path.in_(keys))
+                    )
+                ).scalars()
+            )
+            sizes = {o.key: o.size for o in batch if o.key not in referenced}
+            # Re-checked under the blob locks against uploads in progress
+            for key in await self.blob_store.delete_files(db, sizes):
+                report.files_deleted += 1
+                report.file_bytes += sizes[key]
+        await db.commit()
+
+    async def _collect_spool(self, report: GcReport) -> None:
+        """Delete spooled uploads abandoned by a crashed request."""
+        cutoff = time.time() - self.grace_seconds
+
+        def sweep():
+            for path in self.storage.spool_dir.glob(".*.part"):
+                try:
+                    stat = path.stat()
+                    if stat.st_mtime < cutoff:
+                        path.unlink()
+                        report.files_deleted += 1
+                        report.file_bytes += stat.st_size
+                except FileNotFoundError:
+                    continue
+
+        await asyncio.to_thread(sweep)
+
+    async def _maintain(self, statement: str, report: GcReport) -> None:
+        """
+        Run a maintenance statement outside a transaction and without the
+        statement timeout of the pool's connections; a failure is recorded in
+        the report.
+        """
+        try:
+            async with get_database().engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.execute(text("SET statement_timeout = 0"))
+                try:
+                    await conn.execute(text(statement))
+                finally:
+                    await conn.execute(text("RESET statement_timeout"))
+            report.maintenance.append(statement)
+        except Exception as e:
+            logger.error(f"{statement} failed: {str(e)}")
+            report.errors.append(f"{statement}: {str(e)}")
+
+    async def run_exclusive(
+        self, vacuum: bool = False, reindex: bool = False
+    ) -> Optional[GcReport]:
+        """
+        Collect unless another process is already collecting.
+
+        Returns:
+            Report of the run, or None if the lock was held elsewhere
+        """
+        database = get_database()
+        async with database.engine.connect() as lock_conn:
+            locked = (
+                await lock_conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": GC_LOCK_KEY}
+                )
+            ).scalar()
+            await lock_conn.commit()
+            if not locked:
+                logger.info("Garbage collection already running elsewhere")
+                return None
+            try:
+                async with database.async_session() as db:
+                    return await self.collect(db, vacuum=vacuum, reindex=reindex)
+            finally:
+                await lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": GC_LOCK_KEY}
+                )
+                await lock_conn.commit()
+
+
+async def main() -> None:
+    import load_env
+    from models.relationships import setup_relationships
+    from utils.database import close_database
+    from utils.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) after")
+    parser.add_argument("--reindex", action="store_true", help="REINDEX after")
+    args = parser.parse_args()
+
+    setup_logging()
+    if not load_env.IS_ENV_LOADED:
+        raise RuntimeError("Environment variables not loaded")
+    setup_relationships()
+    try:
+        report = await GarbageCollector().run_exclusive(
+            vacuum=args.vacuum, reindex=args.reindex
+        )
+        if report is not None:
+            print(report.as_dict())
+    finally:
+        await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,225 @@
+"""
+Document ingestion: PDF text extraction, chunking and embedding.
+
+Run by the background worker for each ingest job rather than inside the HTTP
+request, since a large PDF can take minutes to parse and embed. The work itself
+streams through IngestPipeline, shared by all documents the worker processes.
+
+Re-ingestion is incremental by default: the new chunks are diffed against the
+stored ones by text hash, so unchanged chunks keep their vectors, only new
+chunks are embedded and vanished chunks are deleted. Vectors left behind by a
+failed attempt are reused the same way.
+
+With DEDUPE_ENABLED, near-duplicate chunks are skipped before embedding (see
+utils.docs.dedupe) and the document's MinHash signatures are replaced in the
+same transaction.
+"""
+
+import logging
+from typing import Optional
+
+from models.document import Document
+from models.user import User
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.database import mark_recent_write
+from utils.docs.chunk import Chunk
+from utils.docs.corpus import bump_corpus_versions
+from utils.docs.dedupe import (
+    ChunkDeduplicator,
+    clone_signatures,
+    has_duplicate_chunks,
+    requeue_referencing,
+    save_signatures,
+)
+from utils.docs.embed import Embeddings
+from utils.docs.jobs import JobQueue
+from utils.docs.pdf import get_pdf_parser
+from utils.docs.pipeline import IngestPipeline
+from utils.storage import StorageBackend, get_storage
+from utils.vector_store import (
+    clone_document_embeddings,
+    cloned_chunk_ids,
+    delete_document_embeddings,
+    delete_embeddings,
+    get_document_chunk_hashes,
+    update_embedding_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class IngestService:
+    def __init__(self, storage: Optional[StorageBackend] = None):
+        self.storage = storage or get_storage()
+        self.chunk_service = Chunk()
+        self.embeddings_service = Embeddings()
+        self.pdf_parser = get_pdf_parser()
+        self.deduplicator = ChunkDeduplicator()
+        self.job_queue = JobQueue()
+        self.pipeline = IngestPipeline(
+            self.chunk_service,
+            self.embeddings_service,
+            self.pdf_parser,
+            deduplicator=self.deduplicator,
+        )
+
+    async def ingest_document(
+        self,
+        db: AsyncSession,
+        document_id: int,
+        user_id: int,
+        incremental: bool = True,
+    ) -> dict:
+        """
+        Ingest one document and mark it as ingested.
+
+        Args:
+            db: Database session; committed once the vectors are stored
+            document_id: Document to ingest
+            user_id: Owner recorded in the chunk metadata
+            incremental: Diff against the stored chunks instead of replacing them
+
+        Returns:
+            Counts of chunks created and embeddings created, kept, deleted or linked
+        """
+        document = await db.get(Document, document_id)
+        if document is None:
+            # Deleted while queued; its purge job removes anything written
+            logger.info(f"Document {document_id} no longer exists, skipping")
+            return {"chunks_created": 0, "embeddings_created": 0, "skipped": True}
+
+        user = await db.get(User, user_id) if user_id is not None else None
+        organization_id = user.organization_id if user is not None else None
+
+        # Identical content already ingested elsewhere only needs linking
+        linked = await self._link_duplicate_embeddings(
+            db, document, user_id, organization_id
+        )
+        if linked:
+            document.is_ingested = True
+            await bump_corpus_versions(db, [user_id])
+            await db.commit()
+            mark_recent_write(user_id=user_id)
+            return {
+                "chunks_created": 0,
+                "embeddings_created": 0,
+                "embeddings_linked": linked,
+            }
+
+        stored = await get_document_chunk_hashes(db, document.id)
+        if incremental:
+            existing, previous_ids = stored, []
+        else:
+            # Re-embed every chunk, but delete the old rows only once the new
+            # ones are written: they reuse the same deterministic ids, so an
+            # uncommitted delete here would block the pipeline's upserts
+            existing = {}
+            previous_ids = [i for ids in stored.values() for i in ids]
+
+        data = await self.storage.read_bytes(document.file_path)
+        result = await self.pipeline.process(
+            document.id,
+            user_id,
+            data,
+            source=document.file_path,
+            existing=existing,
+            organization_id=organization_id,
+        )
+
+        # Drop vanished chunks and refresh page metadata of the kept ones in
+        # the same transaction that flags the document as ingested
+        written = set(result.pop("written_ids"))
+        stale_ids = result.pop("stale_ids") + [
+            i for i in previous_ids if i not in written
+        ]
+        deleted = await delete_embeddings(db, stale_ids)
+        await update_embedding_metadata(db, result.pop("kept"))
+        # Without deduplication the document keeps no signatures; documents
+        # whose duplicates pointed at its chunks need their own vectors then
+        gone = await save_signatures(
+            db, document.id, result.pop("signatures") or [], user_id
+        )
+        await requeue_referencing(db, gone, self.job_queue, document.id)
+        document.is_ingested = True
+        await bump_corpus_versions(db, [user_id])
+        await db.commit()
+        mark_recent_write(user_id=user_id)
+
+        logger.info(
+            f"Ingested document {document_id}: {result['chunks_created']} chunks, "
+            f"{result['embeddings_kept']} unchanged, {deleted} removed, "
+            f"{result['embeddings_deduplicated']} near-duplicates skipped "
+            f"({result['dedupe_chars_saved']} characters not embedded)"
+        )
+        return {**result, "embeddings_deleted": deleted, "embeddings_linked": 0}
+
+    async def _link_duplicate_embeddings(
+        self,
+        db: AsyncSession,
+        document: Document,
+        user_id: int,
+        organization_id: Optional[int] = None,
+    ) -> int:
+        """Copy vectors from an ingested document with the same content, if any."""
+        if not document.content_hash:
+            return 0
+
+        query = (
+            select(Document.id)
+            .where(Document.content_hash == document.content_hash)
+            .where(Document.id != document.id)
+            .where(Document.is_ingested == True)
+            .limit(1)
+        )
+        source_id = (await db.execute(query)).scalar_one_or_none()
+        if source_id is None:
+            return 0
+
+        # The source may have lost its vectors (purged, or re-ingesting);
+        # only replace this document's vectors once there is something to copy
+        source_chunks = await get_document_chunk_hashes(db, source_id)
+        ids = cloned_chunk_ids(document.id, source_chunks)
+        expected = len(ids)
+        if not expected:
+            return 0
+
+        # Near-duplicate chunks of the source have no vector to copy and their
+        # references are keyed by the source's ids, so embed this one instead
+        if await has_duplicate_chunks(db, source_id):
+            logger.info(
+                f"Document {source_id} has near-duplicate chunks, ingesting "
+                f"document {document.id} instead of linking"
+            )
+            return 0
+
+        # Savepoint so a failed or partial copy falls back to a normal ingest;
+        # rolling it back also undoes the delete, whose row locks would
+        # otherwise block the pipeline's upserts of the same ids
+        try:
+            async with db.begin_nested():
+                await delete_document_embeddings(db, document.id)
+                copied = await clone_document_embeddings(
+                    db,
+                    source_document_id=source_id,
+                    document_id=document.id,
+                    user_id=user_id,
+                    ids=ids,
+                    organization_id=organization_id,
+                )
+                if copied != expected:
+                    raise RuntimeError(
+                        f"copied {copied} of the {expected} vectors of document "
+                        f"{source_id}"
+                    )
+                # Carry the signatures over so later documents can dedupe
+                # against the copies; references to the vectors this
+                # document had before are re-embedded by their documents
+                gone = await clone_signatures(db, source_id, document.id, ids, user_id)
+                await requeue_referencing(db, gone, self.job_queue, document.id)
+                return copied
+        except Exception as e:
+            logger.warning(
+                f"Could not link embeddings for document {document.id}: {str(e)}"
+            )
+            return 0
@@ -0,0 +1,317 @@
+"""
+Durable job queue for background document processing, stored in Postgres.
+
+The API enqueues rows in document_jobs and returns immediately. Workers
+(python -m worker) claim runnable rows with SELECT ... FOR UPDATE SKIP LOCKED,
+so any number of them can poll the table without handing out a job twice.
+Failed jobs are retried with exponential backoff until max_attempts. A worker
+refreshes locked_at of its running jobs every JOB_HEARTBEAT_SECONDS; a job
+whose heartbeat is older than JOB_LOCK_TIMEOUT_SECONDS was left by a crashed
+worker and is reclaimed.
+
+A unique partial index allows one active (queued or running) job per document
+and kind, so enqueueing the same work twice returns the existing job.
+"""
+
+import logging
+import os
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+from models.document_job import DocumentJob
+from sqlalchemy import and_, exists, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import func
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# Predicate of the unique index ux_document_jobs_active, spelled out for ON CONFLICT
+ACTIVE_JOB_PREDICATE = text("status IN ('queued', 'running')")
+
+# Job kinds that must not run concurrently for the same document
+CONFLICTING_KINDS = {
+    "ingest": ("ingest", "ingest_full"),
+    "ingest_full": ("ingest", "ingest_full"),
+    "purge": ("purge",),
+}
+
+# Kinds whose active job already does the work of a job of the key's kind
+SATISFIED_BY = {
+    "ingest": ("ingest", "ingest_full"),
+    "ingest_full": ("ingest_full",),
+    "purge": ("purge",),
+}
+
+# Kinds of queued jobs that are changed into the key's kind instead of
+# queueing a second job next to them
+UPGRADES = {"ingest_full": ("ingest",)}
+
+
+class JobQueue:
+    def __init__(self):
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+        self.backoff_base = float(os.getenv("JOB_BACKOFF_BASE_SECONDS", "10"))
+        self.backoff_max = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "3600"))
+        # A running job whose heartbeat is older than this is assumed abandoned
+        self.lock_timeout = float(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "300"))
+        self.heartbeat_interval = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        document_ids: Sequence[int],
+        user_id: Optional[int] = None,
+        kind: str = "ingest",
+    ) -> List[DocumentJob]:
+        """
+        Queue one job per document, reusing jobs that already do the work.
+
+        An active job of the same kind is reused, and so is a full ingestion
+        for an incremental one. A queued incremental ingestion is upgraded in
+        place when a full one is asked for; a running one gets a full ingestion
+        queued behind it, which is not claimed until the running job ends.
+
+        The caller commits the transaction.
+
+        Args:
+            db: Database session
+            document_ids: Documents to process
+            user_id: User the work is done for
+            kind: Job type, which selects the worker handler
+
+        Returns:
+            Jobs in the order of document_ids
+        """
+        # Locked so a queued job is not claimed while it is being upgraded
+        result = await db.execute(
+            select(DocumentJob)
+            .where(DocumentJob.document_id.in_(document_ids))
+            .where(DocumentJob.kind.in_(CONFLICTING_KINDS.get(kind, (kind,))))
+            .where(DocumentJob.status.in_(ACTIVE_STATUSES))
+            .order_by(DocumentJob.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        active: Dict[int, List[DocumentJob]] = defaultdict(list)
+        for job in result.scalars().all():
+            active[job.document_id].append(job)
+
+        jobs: Dict[int, DocumentJob] = {}
+        missing = []
+        for document_id in dict.fromkeys(document_ids):
+            candidates = active.get(document_id, [])
+            job = next(
+                (j for j in candidates if j.kind in SATISFIED_BY.get(kind, (kind,))),
+                None,
+            )
+            if job is None:
+                job = next(
+                    (
+                        j
+                        for j in candidates
+                        if j.status == "queued" and j.kind in UPGRADES.get(kind, ())
+                    ),
+                    None,
+                )
+                if job is not None:
+                    logger.info(f"Upgrading job {job.id} from {job.kind} to {kind}")
+                    job.kind = kind
+            if job is None:
+                missing.append(document_id)
+            else:
+                jobs[document_id] = job
+        await db.flush()
+
+        if missing:
+            # A concurrent enqueue may insert the same jobs first; keep theirs
+            result = await db.execute(
+                insert(DocumentJob)
+                .values(
+                    [
+                        {
+                            "kind": kind,
+                            "document_id": document_id,
+                            "user_id": user_id,
+                            "status": "queued",
+                            "attempts": 0,
+                            "max_attempts": self.max_attempts,
+                        }
+                        for document_id in missing
+                    ]
+                )
+                .on_conflict_do_nothing(
+                    index_elements=[DocumentJob.document_id, DocumentJob.kind],
+                    index_where=ACTIVE_JOB_PREDICATE,
+                )
+                .returning(DocumentJob)
+            )
+            for job in result.scalars().all():
+                jobs[job.document_id] = job
+
+            taken = [document_id for document_id in missing if document_id not in jobs]
+            if taken:
+                result = await db.execute(
+                    select(DocumentJob)
+                    .where(DocumentJob.document_id.in_(taken))
+                    .where(DocumentJob.kind == kind)
+                    .where(DocumentJob.status.in_(ACTIVE_STATUSES))
+                )
+                for job in result.scalars().all():
+                    jobs[job.document_id] = job
+
+        return [jobs[document_id] for document_id in document_ids]
+
+    async def claim(
+        self, db: AsyncSession, worker_id: str, limit: int = 1
+    ) -> List[DocumentJob]:
+        """
+        Lock up to limit runnable jobs for worker_id and mark them running.
+
+        Commits so the claim is visible to other workers straight away.
+        """
+        stale_before = func.now() - timedelta(seconds=self.lock_timeout)
+        # A queued job waits while a conflicting job of its document runs
+        running = aliased(DocumentJob)
+        conflict_running = exists().where(
+            running.document_id == DocumentJob.document_id,
+            running.status == "running",
+            or_(
+                *(
+                    and_(DocumentJob.kind == kind, running.kind.in_(kinds))
+                    for kind, kinds in CONFLICTING_KINDS.items()
+                )
+            ),
+        )
+        runnable = (
+            select(DocumentJob.id)
+            .where(
+                or_(
+                    and_(
+                        DocumentJob.status == "queued",
+                        DocumentJob.run_after <= func.now(),
+                        ~conflict_running,
+                    ),
+                    and_(
+                        DocumentJob.status == "running",
+                        DocumentJob.locked_at < stale_before,
+                    ),
+                )
+            )
+            .order_by(DocumentJob.run_after, DocumentJob.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(DocumentJob)
+            .where(DocumentJob.id.in_(runnable.scalar_subquery()))
+            .values(
+                status="running",
+                locked_by=worker_id,
+                locked_at=func.now(),
+                attempts=DocumentJob.attempts + 1,
+            )
+            .returning(DocumentJob)
+            .execution_options(synchronize_session=False)
+        )
+        jobs = list(result.scalars().all())
+        await db.commit()
+
+        for job in jobs:
+            logger.info(
+                f"Worker {worker_id} claimed job {job.id} ({job.kind} document "
+                f"{job.document_id}, attempt {job.attempts}/{job.max_attempts})"
+            )
+        return jobs
+
+    async def heartbeat(self, db: AsyncSession, job_id: int, worker_id: str) -> bool:
+        """
+        Refresh the lock of a running job and commit.
+
+        Returns:
+            False if the job is no longer running under worker_id
+        """
+        result = await db.execute(
+            update(DocumentJob)
+            .where(DocumentJob.id == job_id)
+            .where(DocumentJob.status == "running")
+            .where(DocumentJob.locked_by == worker_id)
+            .values(locked_at=func.now())
+            .returning(DocumentJob.id)
+            .execution_options(synchronize_session=False)
+        )
+        held = result.scalar_one_or_none() is not None
+        await db.commit()
+        return held
+
+    async def complete(
+        self, db: AsyncSession, job: DocumentJob, result: Optional[dict] = None
+    ) -> None:
+        """Mark a claimed job as succeeded and commit."""
+        job.status = "succeeded"
+        job.result = result
+        job.last_error = None
+        job.locked_by = None
+        job.locked_at = None
+        job.finished_at = func.now()
+        await db.commit()
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds to wait before retry number attempts, with full jitter."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(attempts - 1, 0))
+        return random.uniform(delay / 2, delay)
+
+    async def fail(self, db: AsyncSession, job: DocumentJob, error: str) -> None:
+        """
+        Record a failed attempt and commit.
+
+        The job is requeued with backoff unless it has used all its attempts.
+        """
+        job.last_error = error
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.finished_at = func.now()
+            logger.error(f"Job {job.id} failed permanently: {error}")
+        else:
+            delay = self.backoff(job.attempts)
+            job.status = "queued"
+            job.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            logger.warning(f"Job {job.id} failed, retrying in {delay:.0f}s: {error}")
+        await db.commit()
+
+    async def cancel(
+        self, db: AsyncSession, document_ids: Sequence[int], kinds: Sequence[str]
+    ) -> int:
+        """
+        Cancel queued jobs of the given kinds; running jobs are left to finish.
+
+        The caller commits the transaction.
+
+        Returns:
+            Number of jobs cancelled
+        """
+        result = await db.execute(
+            update(DocumentJob)
+            .where(DocumentJob.document_id.in_(document_ids))
+            .where(DocumentJob.kind.in_(kinds))
+            .where(DocumentJob.status == "queued")
+            .values(status="cancelled", finished_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    async def get(
+        self, db: AsyncSession, job_id: int, user_id: Optional[int] = None
+    ) -> Optional[DocumentJob]:
+        """Fetch a job, optionally restricted to one user's jobs."""
+        query = select(DocumentJob).where(DocumentJob.id == job_id)
+        if user_id is not None:
+            query = query.where(DocumentJob.user_id == user_id)
+        return (await db.execute(query)).scalar_one_or_none()
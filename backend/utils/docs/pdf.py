@@ -0,0 +1,294 @@
+"""
+PDF text extraction from in-memory bytes.
+
+Reading from bytes rather than a path lets ingestion load documents from any
+storage backend without a copy on the API node's disk.
+
+pypdf is pure Python and CPU bound, so PdfParser extracts pages in worker
+processes: parsing uses every core and never blocks the event loop. Each
+document gets a pool of its own whose workers open the document once from a
+temporary file, so page batches are sent as page ranges rather than copies of
+the PDF, and a document that overruns its timeout has only its own pool
+terminated. Each worker process has an address-space limit. Pools get no more
+workers than the document has batches, and documents that fit in a single
+batch are extracted in a thread without a pool. Workers are forked from a
+forkserver that has the parser preloaded, rather than from the multi-threaded
+API or worker process.
+
+Environment:
+    PDF_PARSE_WORKERS: maximum processes per document (default: CPU count)
+    PDF_PARSE_TIMEOUT_SECONDS: per-document time limit (default 300)
+    PDF_PARSE_MEMORY_LIMIT_MB: per-process address space limit, 0 disables (default 2048)
+    PDF_PAGES_PER_TASK: pages extracted per pool task (default 32)
+"""
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from io import BytesIO
+from multiprocessing.pool import Pool
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+from langchain.schema import Document
+from pypdf import PdfReader
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class PdfParseError(Exception):
+    """Raised when a PDF cannot be parsed within the configured limits."""
+
+
+def _page_texts(
+    reader: PdfReader, start: int, stop: Optional[int]
+) -> Tuple[int, List[str]]:
+    total_pages = len(reader.pages)
+    stop = total_pages if stop is None else min(stop, total_pages)
+    return total_pages, [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def _open_document(data: bytes, inline_pages: int) -> Tuple[int, Optional[List[str]]]:
+    """Page count of a document, and its texts when it has at most inline_pages."""
+    reader = PdfReader(BytesIO(data))
+    total_pages = len(reader.pages)
+    if total_pages > inline_pages:
+        return total_pages, None
+    return _page_texts(reader, 0, None)
+
+
+def extract_page_texts(
+    data: bytes, start: int = 0, stop: Optional[int] = None
+) -> Tuple[int, List[str]]:
+    """
+    Extract the text of pages start..stop (exclusive).
+
+    Returns:
+        Total page count and the texts of the requested pages
+    """
+    return _page_texts(PdfReader(BytesIO(data)), start, stop)
+
+
+def _page_documents(
+    texts: List[str], source: str, start: int, total_pages: int
+) -> List[Document]:
+    return [
+        Document(
+            page_content=text,
+            metadata={"source": source, "page": start + i, "total_pages": total_pages},
+        )
+        for i, text in enumerate(texts)
+    ]
+
+
+def load_pdf_pages(data: bytes, source: str) -> List[Document]:
+    """
+    Extract one Document per PDF page in the calling process.
+
+    Args:
+        data: Raw PDF bytes
+        source: Identifier recorded in each page's metadata
+
+    Returns:
+        List of page documents with source, page and total_pages metadata
+    """
+    total_pages, texts = extract_page_texts(data)
+    return _page_documents(texts, source, 0, total_pages)
+
+
+def _limit_memory(limit_bytes: int) -> None:
+    """Cap the calling process's address space."""
+    if limit_bytes and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+
+
+# The document open in this worker process, set by _init_worker
+_reader: Optional[PdfReader] = None
+
+
+def _init_worker(path: str, limit_bytes: int) -> None:
+    """Pool initializer: cap the address space and open the document once."""
+    global _reader
+    _limit_memory(limit_bytes)
+    with open(path, "rb") as f:
+        _reader = PdfReader(BytesIO(f.read()))
+
+
+def _extract_batch(start: int, stop: int) -> Tuple[int, List[str]]:
+    """Pool task: texts of pages start..stop of the worker's document."""
+    return _page_texts(_reader, start, stop)
+
+
+def _spill(data: bytes) -> str:
+    """Write a document to a temporary file for the workers to open."""
+    with tempfile.NamedTemporaryFile(
+        prefix="hermes-pdf-", suffix=".pdf", delete=False
+    ) as f:
+        f.write(data)
+        return f.name
+
+
+def _pool_context():
+    """Start workers from a forkserver where available, never from this process."""
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context()
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+class PdfParser:
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        memory_limit_mb: Optional[int] = None,
+        pages_per_task: Optional[int] = None,
+    ):
+        self.max_workers = max_workers or int(
+            os.getenv("PDF_PARSE_WORKERS", str(os.cpu_count() or 1))
+        )
+        self.timeout = timeout or float(os.getenv("PDF_PARSE_TIMEOUT_SECONDS", "300"))
+        if memory_limit_mb is None:
+            memory_limit_mb = int(os.getenv("PDF_PARSE_MEMORY_LIMIT_MB", "2048"))
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024
+        self.pages_per_task = pages_per_task or int(
+            os.getenv("PDF_PAGES_PER_TASK", "32")
+        )
+        self._pools: Set[Pool] = set()
+        self._context = _pool_context()
+
+    def _start_pool(self, path: str, processes: int) -> Pool:
+        pool = self._context.Pool(
+            processes=processes,
+            initializer=_init_worker,
+            initargs=(path, self.memory_limit_bytes),
+        )
+        self._pools.add(pool)
+        return pool
+
+    def _stop_pool(self, pool: Pool) -> None:
+        """Terminate a document's workers, including any still extracting."""
+        self._pools.discard(pool)
+        pool.terminate()
+
+    async def _extract(
+        self, pool: Pool, start: int, stop: int, deadline: float
+    ) -> Tuple[int, List[str]]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(set_outcome, value) -> None:
+            if not future.done():
+                set_outcome(value)
+
+        pool.apply_async(
+            _extract_batch,
+            (start, stop),
+            callback=lambda r: loop.call_soon_threadsafe(settle, future.set_result, r),
+            error_callback=lambda e: loop.call_soon_threadsafe(
+                settle, future.set_exception, e
+            ),
+        )
+        try:
+            # A worker killed by the OS never answers; the deadline covers it
+            return await asyncio.wait_for(
+                future, timeout=max(deadline - time.monotonic(), 0)
+            )
+        except asyncio.TimeoutError:
+            raise PdfParseError(f"Parsing timed out after {self.timeout:.0f}s")
+        except MemoryError:
+            raise PdfParseError("Parser exceeded its memory limit")
+
+    async def iter_pages(
+        self, data: bytes, source: str
+    ) -> AsyncIterator[List[Document]]:
+        """
+        Extract pages in batches of pages_per_task, in page order.
+
+        Batches are extracted concurrently, up to one per worker ahead of the
+        consumer. A document of a single batch is extracted in a thread
+        instead. The workers are terminated once the document is done, failed
+        or timed out.
+
+        Args:
+            data: Raw PDF bytes
+            source: Identifier recorded in each page's metadata
+
+        Yields:
+            Lists of page documents with source, page and total_pages metadata
+        """
+        deadline = time.monotonic() + self.timeout
+        try:
+            total_pages, texts = await asyncio.wait_for(
+                asyncio.to_thread(_open_document, data, self.pages_per_task),
+                timeout=self.timeout,
+            )
+        except asyncio.TimeoutError:
+            raise PdfParseError(f"Parsing timed out after {self.timeout:.0f}s")
+        # Too small to be worth starting processes for
+        if texts is not None:
+            yield _page_documents(texts, source, 0, total_pages)
+            return
+
+        batches = math.ceil(total_pages / self.pages_per_task)
+        workers = min(self.max_workers, batches)
+        path = await asyncio.to_thread(_spill, data)
+        pool = None
+        pending = deque()
+        try:
+            pool = await asyncio.to_thread(self._start_pool, path, workers)
+            starts = iter(range(0, total_pages, self.pages_per_task))
+
+            def schedule() -> None:
+                start = next(starts, None)
+                if start is not None:
+                    task = asyncio.ensure_future(
+                        self._extract(
+                            pool, start, start + self.pages_per_task, deadline
+                        )
+                    )
+                    pending.append((start, task))
+
+            for _ in range(workers):
+                schedule()
+            while pending:
+                start, task = pending.popleft()
+                _, texts = await task
+                schedule()
+                yield _page_documents(texts, source, start, total_pages)
+        finally:
+            for _, task in pending:
+                task.cancel()
+            if pool is not None:
+                self._stop_pool(pool)
+            os.unlink(path)
+
+    async def load_pages(self, data: bytes, source: str) -> List[Document]:
+        """Extract every page of a PDF in worker processes."""
+        return [page async for batch in self.iter_pages(data, source) for page in batch]
+
+    def shutdown(self) -> None:
+        """Terminate the workers of documents still being parsed."""
+        for pool in list(self._pools):
+            self._stop_pool(pool)
+
+
+_parser: Optional[PdfParser] = None
+
+
+def get_pdf_parser() -> PdfParser:
+    """Return the process-wide PDF parser."""
+    global _parser
+    if _parser is None:
+        _parser = PdfParser()
+    return _parser
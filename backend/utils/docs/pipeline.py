@@ -0,0 +1,277 @@
+"""
+Streaming ingestion pipeline.
+
+Pages flow through four stages connected by bounded queues:
+
+    extract (PdfParser) -> chunk -> embed -> store (vector writes)
+
+Each document streams its pages in batches and ends with a marker; when the
+store stage sees the marker the document is finished and its caller can commit.
+
+For re-ingestion the caller passes the document's stored chunks by hash. New
+chunks matching a stored one keep its vector (only the metadata is refreshed)
+and skip embedding; stored chunks left unmatched are reported as stale. New
+chunks get deterministic ids, so writing a chunk twice upserts a single row.
+With a ChunkDeduplicator enabled, new chunks that nearly duplicate an earlier
+chunk are dropped before embedding and reported with the document's signatures.
+Full queues block the stage feeding them, so memory stays bounded by the queue
+sizes rather than by how many or how large the documents are, and documents
+processed concurrently share the same stages.
+
+Environment:
+    INGEST_QUEUE_SIZE: batches buffered between stages (default 4)
+    INGEST_EMBED_BATCH_SIZE: chunks handed to the embedding stage at a time (default 64)
+"""
+
+import asyncio
+import logging
+import os
+from collections import Counter
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+from utils.docs.chunk import Chunk
+from utils.docs.dedupe import ChunkDeduplicator, DedupeRun
+from utils.docs.embed import Embeddings
+from utils.docs.pdf import PdfParser
+from utils.vector_store import chunk_vector_id
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _DocumentRun:
+    """Progress of one document through the pipeline."""
+
+    document_id: int
+    future: asyncio.Future
+    # Stored vector ids by chunk hash, consumed as chunks are matched
+    existing: Dict[Optional[str], List[str]] = field(default_factory=dict)
+    kept: List[Tuple[str, dict]] = field(default_factory=list)
+    written: List[str] = field(default_factory=list)
+    dedupe: Optional[DedupeRun] = None
+    chunks: int = 0
+    embeddings: int = 0
+    _ordinals: Counter = field(default_factory=Counter)
+    _taken: set = field(default_factory=set)
+
+    def __post_init__(self) -> None:
+        self._taken = {i for ids in self.existing.values() for i in ids}
+
+    def match(self, chunks: List[Document]) -> List[Document]:
+        """
+        Claim stored vectors for unchanged chunks and return the new ones,
+        with their vector ids assigned.
+        """
+        new = []
+        for chunk in chunks:
+            chunk_hash = chunk.metadata.get("chunk_hash")
+            ids = self.existing.get(chunk_hash)
+            if ids:
+                self.kept.append((ids.pop(), chunk.metadata))
+                continue
+            # Skip ordinals whose id belongs to a stored row of this document
+            while True:
+                chunk.id = chunk_vector_id(
+                    self.document_id, chunk_hash, self._ordinals[chunk_hash]
+                )
+                self._ordinals[chunk_hash] += 1
+                if chunk.id not in self._taken:
+                    break
+            self._taken.add(chunk.id)
+            new.append(chunk)
+        return new
+
+    @property
+    def failed(self) -> bool:
+        return self.future.done()
+
+    def fail(self, error: BaseException) -> None:
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+@dataclass
+class _Batch:
+    run: _DocumentRun
+    docs: List[Document]
+    vectors: Optional[asyncio.Task] = field(default=None)
+
+
+@dataclass
+class _End:
+    run: _DocumentRun
+
+
+class IngestPipeline:
+    def __init__(
+        self,
+        chunk_service: Chunk,
+        embeddings_service: Embeddings,
+        pdf_parser: PdfParser,
+        queue_size: Optional[int] = None,
+        embed_batch_size: Optional[int] = None,
+        deduplicator: Optional[ChunkDeduplicator] = None,
+    ):
+        self.chunk_service = chunk_service
+        self.embeddings_service = embeddings_service
+        self.pdf_parser = pdf_parser
+        self.queue_size = queue_size or int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+        self.embed_batch_size = embed_batch_size or int(
+            os.getenv("INGEST_EMBED_BATCH_SIZE", "64")
+        )
+        self.deduplicator = deduplicator
+        self._tasks: List[asyncio.Task] = []
+
+    def _start(self) -> None:
+        if self._tasks:
+            return
+        self._pages: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._chunks: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._vectors: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._chunk_stage()),
+            asyncio.create_task(self._embed_stage()),
+            asyncio.create_task(self._store_stage()),
+        ]
+
+    async def process(
+        self,
+        document_id: int,
+        user_id: int,
+        data: bytes,
+        source: str,
+        existing: Optional[Dict[Optional[str], List[str]]] = None,
+        organization_id: Optional[int] = None,
+    ) -> dict:
+        """
+        Stream one PDF through the pipeline and wait until its vectors are stored.
+
+        Args:
+            document_id: Document recorded in each chunk's metadata
+            user_id: Owner recorded in each chunk's metadata
+            data: Raw PDF bytes
+            source: Identifier recorded in each page's metadata
+            existing: Stored vector ids of the document by chunk hash
+            organization_id: Owner's organization recorded in each chunk's metadata
+
+        Returns:
+            Number of chunks and embeddings created and kept, plus the
+            vectors to keep (id, new metadata), the ids written, the stale
+            vector ids and, when deduplicating, the chunk signatures to store
+        """
+        self._start()
+        run = _DocumentRun(
+            document_id=document_id,
+            future=asyncio.get_running_loop().create_future(),
+            existing={h: list(ids) for h, ids in (existing or {}).items()},
+        )
+        if self.deduplicator is not None and self.deduplicator.enabled:
+            run.dedupe = DedupeRun(document_id=document_id, user_id=user_id)
+
+        # Extract stage: runs per document, feeding the shared stages
+        try:
+            async with aclosing(self.pdf_parser.iter_pages(data, source)) as batches:
+                async for pages in batches:
+                    if run.failed:
+                        break
+                    for page in pages:
+                        page.metadata["document_id"] = document_id
+                        page.metadata["user_id"] = user_id
+                        if organization_id is not None:
+                            page.metadata["organization_id"] = organization_id
+                    await self._pages.put(_Batch(run, pages))
+        except Exception as e:
+            run.fail(e)
+        await self._pages.put(_End(run))
+
+        await run.future
+        stale_ids = [i for ids in run.existing.values() for i in ids]
+        dedupe = run.dedupe
+        logger.info(
+            f"Pipeline finished document {document_id}: {run.chunks} chunks, "
+            f"{run.embeddings} embedded, {len(run.kept)} kept, {len(stale_ids)} stale"
+            + (f", {dedupe.duplicates} near-duplicates skipped" if dedupe else "")
+        )
+        return {
+            "chunks_created": run.chunks,
+            "embeddings_created": run.embeddings,
+            "embeddings_kept": len(run.kept),
+            "embeddings_deduplicated": dedupe.duplicates if dedupe else 0,
+            "dedupe_chars_saved": dedupe.chars_saved if dedupe else 0,
+            "kept": run.kept,
+            "written_ids": run.written,
+            "stale_ids": stale_ids,
+            "signatures": dedupe.rows if dedupe else None,
+        }
+
+    async def _chunk_stage(self) -> None:
+        while True:
+            item = await self._pages.get()
+            if isinstance(item, _Batch) and not item.run.failed:
+                try:
+                    chunks = await asyncio.to_thread(
+                        self.chunk_service.chunk_docs, item.docs
+                    )
+                    item.run.chunks += len(chunks)
+                    kept_before = len(item.run.kept)
+                    new = item.run.match(chunks)
+                    if item.run.dedupe is not None:
+                        signed = await asyncio.to_thread(self.deduplicator.sign, chunks)
+                        new = await self.deduplicator.filter(
+                            item.run.dedupe,
+                            chunks,
+                            new,
+                            [i for i, _ in item.run.kept[kept_before:]],
+                            signed,
+                        )
+                    for i in range(0, len(new), self.embed_batch_size):
+                        batch = new[i : i + self.embed_batch_size]
+                        await self._chunks.put(_Batch(item.run, batch))
+                except Exception as e:
+                    item.run.fail(e)
+            elif isinstance(item, _End):
+                await self._chunks.put(item)
+
+    async def _embed_stage(self) -> None:
+        # Start each batch's embedding and pass the pending task on in order, so
+        # up to queue_size batches are embedded concurrently (the embedding
+        # executor applies the provider's rate limits)
+        while True:
+            item = await self._chunks.get()
+            if isinstance(item, _Batch) and not item.run.failed:
+                item.vectors = asyncio.create_task(
+                    self.embeddings_service.aembed_texts(
+                        [doc.page_content for doc in item.docs]
+                    )
+                )
+                await self._vectors.put(item)
+            elif isinstance(item, _End):
+                await self._vectors.put(item)
+
+    async def _store_stage(self) -> None:
+        while True:
+            item = await self._vectors.get()
+            if isinstance(item, _Batch):
+                try:
+                    vectors = await item.vectors
+                    if item.run.failed:
+                        continue
+                    ids = await asyncio.to_thread(
+                        self.embeddings_service.add_embeddings, item.docs, vectors
+                    )
+                    item.run.embeddings += len(ids)
+                    item.run.written.extend(ids)
+                except Exception as e:
+                    item.run.fail(e)
+            elif isinstance(item, _End) and not item.run.failed:
+                item.run.future.set_result(None)
+
+    async def close(self) -> None:
+        """Stop the stage tasks."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
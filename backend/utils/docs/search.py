@@ -1,14 +1,85 @@
+"""
+Multi-query document search.
+
+An LLM rewrites the question into several queries, each retrieving the user's
+nearest chunks. Retrieval goes to pgvector unless the user's chunks are held by
+the in-process TenantIndex: with SEARCH_INDEX_ENABLED, users queried at least
+SEARCH_INDEX_MIN_QUERIES times with up to SEARCH_INDEX_MAX_CHUNKS chunks get
+their embeddings loaded into one normalized float32 matrix, and top k becomes a
+single matrix-vector product (exact, so also better recall than HNSW). Matrices
+are kept least recently used first within SEARCH_INDEX_MAX_BYTES and reloaded
+when the user's corpus version (see utils.docs.corpus) moves, which every
+ingest, delete and purge bumps. Large and cold users stay on pgvector.
+
+The expanded queries (at most SEARCH_MAX_QUERIES) are embedded in one batched
+call and, on the async path, searched concurrently. A query that fails or takes
+longer than SEARCH_QUERY_TIMEOUT_SECONDS is left out of the results.
+
+Expansions are cached by (normalized question, prompt version, model) in an
+LRU bounded by SEARCH_EXPANSION_CACHE_SIZE whose entries expire after
+SEARCH_EXPANSION_CACHE_TTL_SECONDS; editing SEARCH_PROMPT or switching models
+changes the key. With SEARCH_EXPANSION_CACHE_PERSIST the async path also keeps
+them in the query_expansions table, shared by processes and restarts.
+
+SearchResultCache holds whole search responses per user for the user's current
+corpus version, so a repeated search is answered without the LLM or the vector
+store and a write by the user invalidates all of them at once. Each user gets at
+most SEARCH_RESULT_CACHE_USER_MAX_BYTES; users are evicted least recently used
+first beyond SEARCH_RESULT_CACHE_MAX_BYTES.
+
+Environment:
+    SEARCH_RESULT_CACHE_ENABLED: true/false (default true)
+    SEARCH_RESULT_CACHE_MAX_BYTES: memory for cached responses (default 64 MiB)
+    SEARCH_RESULT_CACHE_USER_MAX_BYTES: memory per user (default 1 MiB)
+    SEARCH_EXPANSION_CACHE_ENABLED: true/false (default true)
+    SEARCH_EXPANSION_CACHE_SIZE: questions kept in memory (default 10000)
+    SEARCH_EXPANSION_CACHE_TTL_SECONDS: lifetime of an expansion (default 3600)
+    SEARCH_EXPANSION_CACHE_PERSIST: true/false (default false)
+    SEARCH_MAX_QUERIES: expanded queries searched per question (default 5)
+    SEARCH_QUERY_TIMEOUT_SECONDS: time allowed per expanded query (default 5)
+    SEARCH_INDEX_ENABLED: true/false (default false)
+    SEARCH_INDEX_MAX_BYTES: memory budget of all loaded users (default 512 MiB)
+    SEARCH_INDEX_MAX_CHUNKS: largest user loaded in memory (default 20000)
+    SEARCH_INDEX_MIN_QUERIES: queries before a user is loaded (default 2)
+"""
+
+import asyncio
+import hashlib
 import logging
 import os
 import re
-from typing import List, Optional
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, List, Optional, Sequence, Tuple
 
+import numpy as np
+from cachetools import TTLCache
 from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
 from langchain_core.output_parsers import BaseOutputParser
 from langchain_core.prompts import PromptTemplate
+from models.document_chunk import DocumentChunk
+from models.query_expansion import QueryExpansion
 from pydantic import BaseModel
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from utils.database import Replica, get_database
+from utils.docs.corpus import aget_corpus_version, get_corpus_version
+from utils.docs.embedding_cache import normalize_text
 from utils.llm import get_openai_llm
-from utils.vector_store import get_vector_store
+from utils.vector_store import (
+    ChunkRetriever,
+    ChunkVectorStore,
+    get_query_embedding_cache,
+    get_vector_store,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -56,12 +127,634 @@ class QueryOutputParser(BaseOutputParser[List[str]]):
         return queries
 
 
+# Persisted expansions stored between deletions of expired rows
+EXPANSION_EVICT_EVERY = 1000
+
+
+class QueryExpansionCache:
+    def __init__(
+        self,
+        prompt: str,
+        model: str,
+        maxsize: Optional[int] = None,
+        ttl: Optional[float] = None,
+        persist: Optional[bool] = None,
+    ):
+        self.enabled = (
+            os.getenv("SEARCH_EXPANSION_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self.ttl = ttl or float(os.getenv("SEARCH_EXPANSION_CACHE_TTL_SECONDS", "3600"))
+        self.persist = (
+            persist
+            if persist is not None
+            else os.getenv("SEARCH_EXPANSION_CACHE_PERSIST", "false").lower() == "true"
+        )
+        self.model = model
+        self.prompt_version = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        self._cache = TTLCache(
+            maxsize=maxsize or int(os.getenv("SEARCH_EXPANSION_CACHE_SIZE", "10000")),
+            ttl=self.ttl,
+        )
+        self._lock = threading.Lock()
+        self._stored_since_eviction = 0
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def key(self, question: str) -> str:
+        normalized = normalize_text(question).casefold()
+        parts = (self.model, self.prompt_version, normalized)
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            queries = self._cache.get(key)
+        return list(queries) if queries is not None else None
+
+    def _memory_put(self, key: str, queries: List[str]) -> None:
+        with self._lock:
+            self._cache[key] = tuple(queries)
+
+    def get(self, question: str) -> Optional[List[str]]:
+        """Cached expansion of a question from memory, or None."""
+        queries = self._memory_get(self.key(question))
+        if queries is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return queries
+
+    def put(self, question: str, queries: List[str]) -> None:
+        # An empty expansion is usually a failed or unparsable response
+        if queries:
+            self._memory_put(self.key(question), queries)
+
+    async def aget(self, question: str) -> Optional[List[str]]:
+        """Cached expansion from memory, then from the persistent store."""
+        key = self.key(question)
+        queries = self._memory_get(key)
+        if queries is None and self.persist:
+            try:
+                queries = await self._load(key)
+            except Exception as e:
+                logger.warning(f"Query expansion cache lookup failed: {str(e)}")
+            if queries is not None:
+                self.persistent_hits += 1
+                self._memory_put(key, queries)
+        if queries is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return queries
+
+    async def aput(self, question: str, queries: List[str]) -> None:
+        if not queries:
+            return
+        key = self.key(question)
+        self._memory_put(key, queries)
+        if self.persist:
+            try:
+                await self._store(key, question, queries)
+            except Exception as e:
+                logger.warning(f"Query expansion cache store failed: {str(e)}")
+
+    async def _load(self, key: str) -> Optional[List[str]]:
+        async with get_database().async_session() as db:
+            result = await db.execute(
+                select(QueryExpansion.queries)
+                .where(QueryExpansion.key == key)
+                .where(
+                    QueryExpansion.created_at > func.now() - timedelta(seconds=self.ttl)
+                )
+            )
+            return result.scalar_one_or_none()
+
+    async def _store(self, key: str, question: str, queries: List[str]) -> None:
+        stmt = insert(QueryExpansion).values(
+            key=key,
+            model=self.model,
+            prompt_version=self.prompt_version,
+            question=question,
+            queries=queries,
+        )
+        async with get_database().async_session() as db:
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[QueryExpansion.key],
+                    set_={"queries": stmt.excluded.queries, "created_at": func.now()},
+                )
+            )
+            self._stored_since_eviction += 1
+            if self._stored_since_eviction >= EXPANSION_EVICT_EVERY:
+                self._stored_since_eviction = 0
+                await db.execute(
+                    delete(QueryExpansion).where(
+                        QueryExpansion.created_at
+                        < func.now() - timedelta(seconds=self.ttl)
+                    )
+                )
+            await db.commit()
+
+
+@dataclass
+class _UserResults:
+    """Cached responses of one user, all computed at the same corpus version."""
+
+    version: int
+    entries: "OrderedDict[tuple, Tuple[Any, int]]"
+    nbytes: int = 0
+
+
+class SearchResultCache:
+    def __init__(
+        self, max_bytes: Optional[int] = None, user_max_bytes: Optional[int] = None
+    ):
+        self.enabled = (
+            os.getenv("SEARCH_RESULT_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self.max_bytes = max_bytes or int(
+            os.getenv("SEARCH_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+        )
+        self.user_max_bytes = user_max_bytes or int(
+            os.getenv("SEARCH_RESULT_CACHE_USER_MAX_BYTES", str(1024 * 1024))
+        )
+        self._users: "OrderedDict[int, _UserResults]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._users),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+    @staticmethod
+    def key(query: str, params: tuple) -> tuple:
+        return (normalize_text(query).casefold(), params)
+
+    def _drop_user(self, user_id: int) -> None:
+        results = self._users.pop(user_id)
+        self._bytes -= results.nbytes
+
+    def get(self, user_id: int, version: int, query: str, params: tuple) -> Any:
+        """
+        Cached response of a search, or None.
+
+        A lookup at a newer corpus version than the user's entries drops them;
+        one at an older version (read before a write another request saw) is a
+        miss that keeps them.
+        """
+        if not self.enabled:
+            return None
+        key = self.key(query, params)
+        with self._lock:
+            results = self._users.get(user_id)
+            if results is not None and results.version < version:
+                self._drop_user(user_id)
+                self.invalidations += 1
+                results = None
+            elif results is not None and results.version > version:
+                results = None
+            entry = results.entries.get(key) if results is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            results.entries.move_to_end(key)
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(
+        self,
+        user_id: int,
+        version: int,
+        query: str,
+        params: tuple,
+        value: Any,
+        size: int,
+    ) -> None:
+        """
+        Cache a response computed after reading the user's corpus version.
+
+        Args:
+            user_id: User who searched
+            version: Corpus version read before the search ran
+            query: Search query
+            params: Search parameters that change the response
+            value: Response to cache
+            size: Approximate size of the response in bytes
+        """
+        if not self.enabled or size > self.user_max_bytes:
+            return
+        key = self.key(query, params)
+        with self._lock:
+            results = self._users.get(user_id)
+            if results is not None and results.version > version:
+                # Computed before a write another search already saw
+                return
+            if results is None or results.version != version:
+                if results is not None:
+                    self._drop_user(user_id)
+                results = self._users[user_id] = _UserResults(version, OrderedDict())
+            old = results.entries.pop(key, None)
+            if old is not None:
+                results.nbytes -= old[1]
+                self._bytes -= old[1]
+            results.entries[key] = (value, size)
+            results.nbytes += size
+            self._bytes += size
+            self._users.move_to_end(user_id)
+
+            while results.nbytes > self.user_max_bytes:
+                _, (_, evicted) = results.entries.popitem(last=False)
+                results.nbytes -= evicted
+                self._bytes -= evicted
+                self.evictions += 1
+            while self._bytes > self.max_bytes:
+                _, evicted_user = self._users.popitem(last=False)
+                self._bytes -= evicted_user.nbytes
+                self.evictions += len(evicted_user.entries)
+
+
+# Users whose query count is tracked before they are loaded
+MAX_TRACKED_USERS = 10000
+
+
+@dataclass
+class _TenantMatrix:
+    """Chunks of one user with their unit-length embeddings as matrix rows."""
+
+    version: int
+    ids: List[str]
+    contents: List[str]
+    metadatas: List[dict]
+    # None when the user is too large for memory and stays on pgvector
+    matrix: Optional[np.ndarray] = None
+
+    @property
+    def nbytes(self) -> int:
+        if self.matrix is None:
+            return 0
+        # Vectors plus text; metadata dicts are small next to either
+        return self.matrix.nbytes + sum(len(c) for c in self.contents)
+
+    def search(self, vector: Sequence[float], k: int) -> List[Document]:
+        """Top k chunks by cosine similarity, reported as metadata["score"]."""
+        if not self.ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.matrix @ (query / norm if norm else query)
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        order = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            Document(
+                id=self.ids[i],
+                page_content=self.contents[i],
+                metadata={**self.metadatas[i], "score": float(scores[i])},
+            )
+            for i in order
+        ]
+
+
+class TenantIndex:
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_chunks: Optional[int] = None,
+        min_queries: Optional[int] = None,
+    ):
+        self.enabled = os.getenv("SEARCH_INDEX_ENABLED", "false").lower() == "true"
+        self.max_bytes = max_bytes or int(
+            os.getenv("SEARCH_INDEX_MAX_BYTES", str(512 * 1024 * 1024))
+        )
+        self.max_chunks = max_chunks or int(
+            os.getenv("SEARCH_INDEX_MAX_CHUNKS", "20000")
+        )
+        self.min_queries = min_queries or int(
+            os.getenv("SEARCH_INDEX_MIN_QUERIES", "2")
+        )
+        self._entries: "OrderedDict[Tuple[str, int], _TenantMatrix]" = OrderedDict()
+        self._queries: "OrderedDict[Tuple[str, int], int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+    def _get(self, key: Tuple[str, int]) -> Optional[_TenantMatrix]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key: Tuple[str, int], entry: _TenantMatrix) -> None:
+        """Store a user's matrix, evicting least recently used users over budget."""
+        if entry.nbytes > self.max_bytes:
+            entry.matrix = None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def _is_hot(self, key: Tuple[str, int]) -> bool:
+        """Count a query of a user not loaded yet; True once it is worth loading."""
+        with self._lock:
+            count = self._queries.pop(key, 0) + 1
+            if count >= self.min_queries:
+                return True
+            self._queries[key] = count
+            while len(self._queries) > MAX_TRACKED_USERS:
+                self._queries.popitem(last=False)
+            return False
+
+    def _load(
+        self, conn: Connection, store: ChunkVectorStore, user_id: int, version: int
+    ) -> _TenantMatrix:
+        user_chunks = (
+            DocumentChunk.collection == store.collection_name,
+            DocumentChunk.user_id == user_id,
+        )
+        count = conn.execute(
+            select(func.count()).select_from(DocumentChunk).where(*user_chunks)
+        ).scalar_one()
+        if count > self.max_chunks:
+            return _TenantMatrix(version, [], [], [])
+
+        rows = conn.execute(
+            select(
+                DocumentChunk.id,
+                DocumentChunk.content,
+                DocumentChunk.chunk_metadata,
+                DocumentChunk.embedding,
+            ).where(*user_chunks)
+        ).all()
+        if rows:
+            matrix = np.stack([np.asarray(row[3], dtype=np.float32) for row in rows])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1.0, norms)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        self.loads += 1
+        logger.info(
+            f"Loaded {len(rows)} chunks of user {user_id} into the search index "
+            f"({matrix.nbytes} bytes, corpus version {version})"
+        )
+        return _TenantMatrix(
+            version,
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [row[2] for row in rows],
+            matrix,
+        )
+
+    def search(
+        self,
+        store: ChunkVectorStore,
+        user_id: int,
+        version: int,
+        vector: Sequence[float],
+        k: int,
+    ) -> Optional[List[Document]]:
+        """
+        Nearest chunks of a user from memory, loading them when worthwhile.
+
+        Args:
+            store: Vector store the chunks are read from
+            user_id: Owner of the chunks
+            version: User's corpus version, read once per search request
+            vector: Query embedding
+            k: Number of chunks to return
+
+        Returns:
+            Chunks ordered from most to least similar, or None when the user
+            should be searched with pgvector instead
+        """
+        if not self.enabled:
+            return None
+        key = (store.collection_name, user_id)
+        entry = self._get(key)
+        if entry is None and not self._is_hot(key):
+            return None
+
+        if entry is None or entry.version != version:
+            # A write after the version was read only causes one extra reload
+            with store.engine.connect() as conn:
+                entry = self._load(conn, store, user_id, version)
+            self._put(key, entry)
+        else:
+            self.hits += 1
+
+        if entry.matrix is None:
+            return None
+        return entry.search(vector, k)
+
+
+class IndexedRetriever(ChunkRetriever):
+    """ChunkRetriever answering user-filtered queries from a TenantIndex."""
+
+    index: Any = None
+    # Corpus version of the filtered user, read once for the whole search
+    corpus_version: Optional[int] = None
+
+    def _indexed_user(self) -> Optional[int]:
+        if (
+            self.index is None
+            or self.corpus_version is None
+            or set(self.filter) != {"user_id"}
+        ):
+            return None
+        return self.filter["user_id"]
+
+    def search_vector(self, vector: Sequence[float]) -> List[Document]:
+        """Nearest chunks of an embedded query."""
+        user_id = self._indexed_user()
+        docs = None
+        if user_id is not None:
+            docs = self.index.search(
+                self.store, user_id, self.corpus_version, vector, self.k
+            )
+        if docs is None:
+            docs = self.store.similarity_search_by_vector(vector, self.k, self.filter)
+        return docs
+
+    async def asearch_vector(self, vector: Sequence[float]) -> List[Document]:
+        """Nearest chunks of an embedded query, without blocking the event loop."""
+        user_id = self._indexed_user()
+        docs = None
+        if user_id is not None:
+            docs = await asyncio.to_thread(
+                self.index.search,
+                self.store,
+                user_id,
+                self.corpus_version,
+                vector,
+                self.k,
+            )
+        if docs is None:
+            docs = await self.store.asimilarity_search_by_vector(
+                vector, self.k, self.filter
+            )
+        return docs
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.search_vector(self.store.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await self.asearch_vector(
+            await self.store.embeddings.aembed_query(query)
+        )
+
+
+class FanOutRetriever(MultiQueryRetriever):
+    """
+    MultiQueryRetriever that embeds all expanded queries in one call and, when
+    async, searches them concurrently, each within query_timeout seconds.
+    """
+
+    retriever: IndexedRetriever
+    max_queries: int = 5
+    query_timeout: float = 5.0
+    expansion_cache: Optional[QueryExpansionCache] = None
+
+    def _caches_expansions(self) -> bool:
+        return self.expansion_cache is not None and self.expansion_cache.enabled
+
+    def generate_queries(
+        self, question: str, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[str]:
+        if not self._caches_expansions():
+            return super().generate_queries(question, run_manager)
+        queries = self.expansion_cache.get(question)
+        if queries is None:
+            queries = super().generate_queries(question, run_manager)
+            self.expansion_cache.put(question, queries)
+        return queries
+
+    async def agenerate_queries(
+        self, question: str, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[str]:
+        if not self._caches_expansions():
+            return await super().agenerate_queries(question, run_manager)
+        queries = await self.expansion_cache.aget(question)
+        if queries is None:
+            queries = await super().agenerate_queries(question, run_manager)
+            await self.expansion_cache.aput(question, queries)
+        return queries
+
+    def _capped(self, queries: List[str]) -> List[str]:
+        # The LLM sometimes repeats a query or returns more than asked for
+        unique = list(dict.fromkeys(q.strip() for q in queries if q.strip()))
+        if len(unique) > self.max_queries:
+            logger.info(
+                f"Searching {self.max_queries} of {len(unique)} expanded queries"
+            )
+        return unique[: self.max_queries]
+
+    def retrieve_documents(
+        self, queries: List[str], run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        queries = self._capped(queries)
+        if not queries:
+            return []
+        vectors = self.retriever.store.embeddings.embed_queries(queries)
+        return [
+            doc for vector in vectors for doc in self.retriever.search_vector(vector)
+        ]
+
+    async def aretrieve_documents(
+        self, queries: List[str], run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        queries = self._capped(queries)
+        if not queries:
+            return []
+        vectors = await self.retriever.store.embeddings.aembed_queries(queries)
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(
+                    self.retriever.asearch_vector(vector), self.query_timeout
+                )
+                for vector in vectors
+            ),
+            return_exceptions=True,
+        )
+
+        documents = []
+        errors = []
+        for query, result in zip(queries, results):
+            if isinstance(result, BaseException):
+                logger.warning(
+                    f"Expanded query '{query}' failed: {type(result).__name__} "
+                    f"{str(result)}"
+                )
+                errors.append(result)
+            else:
+                documents.extend(result)
+        # Partial results beat none, but a search where every query failed is an error
+        if errors and len(errors) == len(queries):
+            raise errors[0]
+        return documents
+
+
 class Search:
     def __init__(self):
         """Initialize the search service with MultiQueryRetriever."""
         try:
             logger.info("Initializing Search service")
             self.vector_store = get_vector_store()
+            # One store per read replica; asearch picks one by measured lag
+            self.read_vector_stores = {
+                replica.url: get_vector_store(
+                    embeddings=self.vector_store.embeddings, db_url=replica.sync_url
+                )
+                for replica in get_database().replicas
+            }
+            self.index = TenantIndex()
+            self.max_queries = int(os.getenv("SEARCH_MAX_QUERIES", "5"))
+            self.query_timeout = float(os.getenv("SEARCH_QUERY_TIMEOUT_SECONDS", "5"))
             self.llm = get_openai_llm(temperature=0)
 
             # Get prompt template from environment variables
@@ -79,6 +772,10 @@ class Search:
 
             # Create the LLM chain
             self.llm_chain = self.query_prompt | self.llm | self.output_parser
+            self.expansion_cache = QueryExpansionCache(
+                search_prompt,
+                model=getattr(self.llm, "model_name", None) or type(self.llm).__name__,
+            )
 
             logger.info("Search service initialized successfully")
         except Exception as e:
@@ -87,10 +784,73 @@ class Search:
             )
             raise
 
+    def stats(self) -> dict:
+        """Cache and index counters for monitoring."""
+        return {
+            "expansion_cache": self.expansion_cache.stats(),
+            "query_embedding_cache": get_query_embedding_cache().stats(),
+            "tenant_index": self.index.stats(),
+        }
+
+    async def _corpus_version(self, user_id: int) -> int:
+        """The user's corpus version on the primary, which every write bumps."""
+        async with get_database().async_session() as session:
+            return await aget_corpus_version(session, user_id)
+
+    async def _read_store(self, user_id: int, version: int) -> ChunkVectorStore:
+        """
+        Vector store for a user's search: a replica within the lag bound that
+        has seen the user's latest write, else the primary.
+
+        Replica lag is measured per replica, and this process's own writes pin
+        the user to the primary. Writes by other processes (the worker's
+        ingests) are caught by comparing the user's corpus version on the
+        replica with the primary's.
+        """
+        replica = await get_database().choose_read_replica(f"user_id:{user_id}")
+        if replica is None:
+            return self.vector_store
+        async with replica.async_session() as session:
+            replica_version = await aget_corpus_version(session, user_id)
+        if replica_version < version:
+            logger.debug(f"Replica has not replayed user {user_id}'s last write")
+            return self.vector_store
+        return self.read_vector_stores[replica.url]
+
+    def _retriever(
+        self,
+        user_id: int,
+        limit: Optional[int],
+        vector_store: ChunkVectorStore,
+        corpus_version: Optional[int],
+    ) -> MultiQueryRetriever:
+        """MultiQueryRetriever over the user's chunks."""
+        # Create a filtered retriever, served from memory for hot users
+        base_retriever = IndexedRetriever(
+            store=vector_store,
+            k=limit,
+            filter={"user_id": user_id},  # Filter by user_id
+            index=self.index,
+            corpus_version=corpus_version,
+        )
+
+        # Create MultiQueryRetriever with our custom prompt
+        return FanOutRetriever(
+            retriever=base_retriever,
+            llm_chain=self.llm_chain,
+            parser_key="text",  # This matches the output of our parser
+            max_queries=self.max_queries,
+            query_timeout=self.query_timeout,
+            expansion_cache=self.expansion_cache,
+        )
+
     def search(self, query: str, user_id: int, limit: Optional[int] = 5):
         """
         Search for documents using MultiQueryRetriever with user filtering.
 
+        Blocks while the LLM and the database answer; async callers use asearch.
+        Reads go to the primary, as choosing a replica measures its lag.
+
         Args:
             query: Search query
             user_id: User ID to filter results
@@ -101,20 +861,12 @@ class Search:
         """
         try:
             logger.info(f"Starting search for query: '{query}' for user_id: {user_id}")
-
-            # Create a filtered retriever
-            base_retriever = self.vector_store.as_retriever(
-                search_kwargs={
-                    "k": limit,
-                    "filter": {"user_id": user_id},  # Filter by user_id
-                }
-            )
-
-            # Create MultiQueryRetriever with our custom prompt
-            retriever = MultiQueryRetriever(
-                retriever=base_retriever,
-                llm_chain=self.llm_chain,
-                parser_key="text",  # This matches the output of our parser
+            corpus_version = None
+            if self.index.enabled:
+                with self.vector_store.engine.connect() as conn:
+                    corpus_version = get_corpus_version(conn, user_id)
+            retriever = self._retriever(
+                user_id, limit, self.vector_store, corpus_version
             )
 
             # Get unique documents across all generated queries
@@ -127,3 +879,52 @@ class Search:
         except Exception as e:
             logger.error(f"Error during document search: {str(e)}", exc_info=True)
             raise
+
+    async def asearch(
+        self,
+        query: str,
+        user_id: int,
+        limit: Optional[int] = 5,
+        corpus_version: Optional[int] = None,
+        replica: Optional[Replica] = None,
+    ):
+        """
+        Async search: the query expansion, the query embeddings and the vector
+        searches of the expanded queries all await I/O instead of blocking.
+
+        Args:
+            query: Search query
+            user_id: User ID to filter results
+            limit: Maximum number of results to return per query
+            corpus_version: User's corpus version on the primary, if the caller
+                already read it; otherwise read once here when needed
+            replica: Replica the caller found at corpus_version, searched
+                without checking it again; with corpus_version given and no
+                replica, the primary is searched
+
+        Returns:
+            List of relevant documents
+        """
+        try:
+            logger.info(f"Starting search for query: '{query}' for user_id: {user_id}")
+            vector_store = self.vector_store
+            if replica is not None:
+                vector_store = self.read_vector_stores[replica.url]
+            elif corpus_version is None and (
+                self.index.enabled or self.read_vector_stores
+            ):
+                corpus_version = await self._corpus_version(user_id)
+                if self.read_vector_stores:
+                    vector_store = await self._read_store(user_id, corpus_version)
+            retriever = self._retriever(user_id, limit, vector_store, corpus_version)
+
+            # Expanded queries are embedded together and searched concurrently
+            logger.debug("Executing async multi-query retrieval")
+            docs = await retriever.ainvoke(query)
+
+            logger.info(f"Search complete. Found {len(docs)} relevant documents")
+            return docs
+
+        except Exception as e:
+            logger.error(f"Error during document search: {str(e)}", exc_info=True)
+            raise
@@ -0,0 +1,175 @@
+"""
+Responses for serving stored documents.
+
+ZeroCopyFileResponse hands file descriptors or paths to the ASGI server when it
+supports the zero-copy extensions, so the kernel copies file pages straight to
+the socket (sendfile). Servers without them fall back to Starlette's chunked
+reads. Objects that are not on local disk are streamed from the storage backend.
+"""
+
+import os
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import (
+    FileResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.responses import MalformedRangeHeader, RangeNotSatisfiable
+from starlette.types import Send
+from utils.storage import UPLOAD_CHUNK_SIZE, StorageBackend
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+PATHSEND_EXTENSION = "http.response.pathsend"
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    FileResponse that sends via sendfile when the ASGI server allows it.
+
+    zerocopysend covers full and single-range responses; pathsend only full
+    ones. Multi-range and HEAD requests use Starlette's own handling.
+    """
+
+    chunk_size = UPLOAD_CHUNK_SIZE
+
+    async def __call__(self, scope, receive, send) -> None:
+        self._extensions = scope.get("extensions") or {}
+        await super().__call__(scope, receive, send)
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if send_header_only:
+            return await super()._handle_simple(send, send_header_only)
+        if ZEROCOPY_EXTENSION in self._extensions:
+            size = int(self.headers["content-length"])
+            return await self._zerocopy(send, self.status_code, 0, size)
+        if PATHSEND_EXTENSION in self._extensions:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            await send({"type": PATHSEND_EXTENSION, "path": os.path.abspath(self.path)})
+            return
+        await super()._handle_simple(send, send_header_only)
+
+    async def _handle_single_range(
+        self, send: Send, start: int, end: int, file_size: int, send_header_only: bool
+    ) -> None:
+        if send_header_only or ZEROCOPY_EXTENSION not in self._extensions:
+            return await super()._handle_single_range(
+                send, start, end, file_size, send_header_only
+            )
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await self._zerocopy(send, 206, start, end - start)
+
+    async def _zerocopy(self, send: Send, status: int, offset: int, count: int) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": self.raw_headers,
+            }
+        )
+        with open(self.path, "rb") as file:
+            await send(
+                {
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": file,
+                    "offset": offset,
+                    "count": count,
+                    "more_body": False,
+                }
+            )
+
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"inline; filename*=utf-8''{quoted}"
+    return f'inline; filename="{filename}"'
+
+
+def _not_modified(request: Request, etag: Optional[str]) -> bool:
+    """Whether If-None-Match matches the current ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not etag or not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+async def storage_response(
+    request: Request,
+    storage: StorageBackend,
+    key: str,
+    filename: str,
+    media_type: str,
+    etag: Optional[str] = None,
+) -> Response:
+    """
+    Serve a stored object with ETag revalidation and single Range support.
+
+    Args:
+        request: Incoming request, for Range/If-None-Match/If-Range headers
+        storage: Backend holding the object
+        key: Storage key of the object
+        filename: Download filename for Content-Disposition
+        media_type: Content type of the object
+        etag: Quoted strong ETag, e.g. derived from the content hash
+
+    Returns:
+        304, 200 or 206 response
+    """
+    headers: Dict[str, str] = {"cache-control": "private, no-cache"}
+    if etag:
+        headers["etag"] = etag
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    local_path = storage.local_path(key)
+    if local_path is not None:
+        return ZeroCopyFileResponse(
+            local_path,
+            headers=headers,
+            media_type=media_type,
+            filename=filename,
+            content_disposition_type="inline",
+        )
+
+    # Remote object: stream it through the event loop, honouring a single
+    # byte range; multi-range requests get the whole object
+    size = await storage.size(key)
+    headers["accept-ranges"] = "bytes"
+    headers["content-disposition"] = _content_disposition(filename)
+
+    http_range = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if http_range and (if_range is None or if_range == etag):
+        try:
+            ranges = FileResponse._parse_range_header(http_range, size)
+        except MalformedRangeHeader as e:
+            return PlainTextResponse(e.content, status_code=400)
+        except RangeNotSatisfiable:
+            return PlainTextResponse(
+                status_code=416, headers={"content-range": f"*/{size}"}
+            )
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            headers["content-length"] = str(end - start)
+            return StreamingResponse(
+                storage.open(key, start, end - 1),
+                status_code=206,
+                headers=headers,
+                media_type=media_type,
+            )
+
+    headers["content-length"] = str(size)
+    return StreamingResponse(storage.open(key), headers=headers, media_type=media_type)
@@ -0,0 +1,373 @@
+"""
+File storage for uploaded documents.
+
+Uploads are streamed to a temporary file in chunks without blocking the event
+loop, hashed while streaming, optionally fsynced and then handed to a storage
+backend:
+
+- LocalStorage keeps files under a root directory, sharded by key prefix
+- S3Storage keeps files in an S3-compatible bucket (AWS, MinIO, ...)
+
+Documents store backend keys (e.g. "blobs/ab/cd/abcd....pdf") in file_path.
+Absolute paths written before backends existed are still served by LocalStorage.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+from uuid import uuid4
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the upload per iteration
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# none: rely on the OS to flush, file: fsync file contents before the rename,
+# full: additionally fsync the directory so the rename itself is durable
+FSYNC_POLICIES = ("none", "file", "full")
+
+
+@dataclass
+class StoredFile:
+    """A file written to local disk along with its content hash and size."""
+
+    path: Path
+    sha256: str
+    size: int
+
+
+def get_fsync_policy(override: Optional[str] = None) -> str:
+    """Return the fsync policy, preferring an explicit override over UPLOAD_FSYNC_POLICY."""
+    policy = (override or os.getenv("UPLOAD_FSYNC_POLICY", "file")).lower()
+    if policy not in FSYNC_POLICIES:
+        raise ValueError(
+            f"Invalid UPLOAD_FSYNC_POLICY '{policy}', expected one of {FSYNC_POLICIES}"
+        )
+    return policy
+
+
+def _fsync_directory(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def spool_upload(
+    file: UploadFile, directory: Path, fsync_policy: Optional[str] = None
+) -> StoredFile:
+    """
+    Stream an upload into a temporary file, hashing it on the way.
+
+    Args:
+        file: Uploaded file to read
+        directory: Directory for the temporary file, on the same filesystem
+            as the final destination so it can be renamed atomically
+        fsync_policy: Override for UPLOAD_FSYNC_POLICY
+
+    Returns:
+        StoredFile pointing at the temporary file
+    """
+    policy = get_fsync_policy(fsync_policy)
+    temp_path = directory / f".{uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "xb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+                await buffer.write(chunk)
+
+            if policy != "none":
+                await buffer.flush()
+                await asyncio.to_thread(os.fsync, buffer.fileno())
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return StoredFile(path=temp_path, sha256=digest.hexdigest(), size=size)
+
+
+async def commit_file(
+    stored: StoredFile, destination: Path, fsync_policy: Optional[str] = None
+) -> StoredFile:
+    """Atomically move a spooled file to its final destination."""
+    policy = get_fsync_policy(fsync_policy)
+    await aiofiles.os.replace(stored.path, destination)
+    if policy == "full":
+        await asyncio.to_thread(_fsync_directory, destination.parent)
+    return StoredFile(path=destination, sha256=stored.sha256, size=stored.size)
+
+
+async def write_upload(
+    file: UploadFile, destination: Path, fsync_policy: Optional[str] = None
+) -> StoredFile:
+    """Stream an upload to destination through a temporary file and rename it into place."""
+    stored = await spool_upload(file, destination.parent, fsync_policy)
+    try:
+        return await commit_file(stored, destination, fsync_policy)
+    except BaseException:
+        stored.path.unlink(missing_ok=True)
+        raise
+
+
+@dataclass
+class StoredObject:
+    """A key found when listing a storage backend."""
+
+    key: str
+    size: int
+    modified_at: datetime
+
+
+class StorageBackend(ABC):
+    """Interface for places uploaded documents are kept."""
+
+    # Local directory for spooled uploads before they are handed to put()
+    spool_dir: Path
+
+    @abstractmethod
+    async def put(self, key: str, stored: StoredFile) -> None:
+        """Store a spooled file under key, consuming the spooled copy."""
+
+    @abstractmethod
+    def open(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Stream the bytes of key, optionally limited to the inclusive range start..end."""
+
+    @abstractmethod
+    async def size(self, key: str) -> int:
+        """Size of the stored object in bytes."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether key is stored."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete key if it exists."""
+
+    @abstractmethod
+    async def list(self, prefix: str = "") -> List[StoredObject]:
+        """List the stored objects whose key starts with prefix."""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Path on this node's disk, if the backend keeps files locally."""
+        return None
+
+    async def read_bytes(self, key: str) -> bytes:
+        """Read a whole object into memory."""
+        return b"".join([chunk async for chunk in self.open(key)])
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Spool next to the files so put() is an atomic rename
+        self.spool_dir = root / "tmp"
+        self.spool_dir.mkdir(exist_ok=True)
+
+    def local_path(self, key: str) -> Path:
+        # Pre-backend documents stored absolute paths
+        if os.path.isabs(key):
+            return Path(key)
+        return self.root / key
+
+    async def put(self, key: str, stored: StoredFile) -> None:
+        path = self.local_path(key)
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        await commit_file(stored, path)
+
+    async def open(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        remaining = None if end is None else end - start + 1
+        async with aiofiles.open(self.local_path(key), "rb") as f:
+            await f.seek(start)
+            while remaining is None or remaining > 0:
+                size = UPLOAD_CHUNK_SIZE
+                if remaining is not None:
+                    size = min(size, remaining)
+                chunk = await f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def size(self, key: str) -> int:
+        return (await aiofiles.os.stat(self.local_path(key))).st_size
+
+    async def exists(self, key: str) -> bool:
+        return await aiofiles.os.path.exists(self.local_path(key))
+
+    async def delete(self, key: str) -> None:
+        try:
+            await aiofiles.os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _list(self, prefix: str) -> List[StoredObject]:
+        objects = []
+        base = self.root / prefix
+        if not base.is_dir():
+            return objects
+        for directory, _, filenames in os.walk(base):
+            for filename in filenames:
+                path = Path(directory) / filename
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                objects.append(
+                    StoredObject(
+                        key=path.relative_to(self.root).as_posix(),
+                        size=stat.st_size,
+                        modified_at=datetime.fromtimestamp(
+                            stat.st_mtime, tz=timezone.utc
+                        ),
+                    )
+                )
+        return objects
+
+    async def list(self, prefix: str = "") -> List[StoredObject]:
+        return await asyncio.to_thread(self._list, prefix)
+
+
+class S3Storage(StorageBackend):
+    """
+    S3-compatible backend. Point S3_ENDPOINT_URL at MinIO or another local
+    stand-in to run it without AWS. Requires boto3.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        client=None,
+    ):
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise ValueError("boto3 is required for the S3 storage backend") from e
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.spool_dir = Path(tempfile.gettempdir()) / "hermes-uploads"
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    async def put(self, key: str, stored: StoredFile) -> None:
+        try:
+            await asyncio.to_thread(
+                self.client.upload_file,
+                str(stored.path),
+                self.bucket,
+                self._object_key(key),
+            )
+        finally:
+            stored.path.unlink(missing_ok=True)
+
+    async def open(
+        self, key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        kwargs = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await asyncio.to_thread(self.client.get_object, **kwargs)
+        body = response["Body"]
+        try:
+            while chunk := await asyncio.to_thread(body.read, UPLOAD_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    async def size(self, key: str) -> int:
+        response = await asyncio.to_thread(
+            self.client.head_object, Bucket=self.bucket, Key=self._object_key(key)
+        )
+        return response["ContentLength"]
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await self.size(key)
+            return True
+        except Exception as e:
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(
+            self.client.delete_object, Bucket=self.bucket, Key=self._object_key(key)
+        )
+
+    def _list(self, prefix: str) -> List[StoredObject]:
+        objects = []
+        strip = len(self._object_key(""))
+        kwargs = {"Bucket": self.bucket, "Prefix": self._object_key(prefix)}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for item in response.get("Contents", []):
+                objects.append(
+                    StoredObject(
+                        key=item["Key"][strip:],
+                        size=item["Size"],
+                        modified_at=item["LastModified"],
+                    )
+                )
+            if not response.get("IsTruncated"):
+                return objects
+            kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+    async def list(self, prefix: str = "") -> List[StoredObject]:
+        return await asyncio.to_thread(self._list, prefix)
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Return the process-wide storage backend selected by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        backend = os.getenv("STORAGE_BACKEND", "local").lower()
+        if backend == "local":
+            _storage = LocalStorage(Path(os.getenv("STORAGE_LOCAL_ROOT", "uploads")))
+        elif backend == "s3":
+            bucket = os.getenv("S3_BUCKET")
+            if not bucket:
+                raise ValueError("S3_BUCKET not configured")
+            _storage = S3Storage(
+                bucket=bucket,
+                prefix=os.getenv("S3_PREFIX", ""),
+                endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+                region=os.getenv("S3_REGION"),
+            )
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'")
+        logger.info(f"Using {backend} storage backend")
+    return _storage
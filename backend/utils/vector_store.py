@@ -1,18 +1,342 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
-import os
+"""
+Vector storage for document chunks.
+
+Chunks live in the document_chunks table with typed columns for everything
+queries filter or sort on (collection, user_id, organization_id, document_id,
+page, chunk_index, offsets, token_count, chunk_hash), the full chunk metadata
+as JSONB, and a pgvector embedding with an HNSW index for cosine distance.
+
+ChunkVectorStore keeps the interface the rest of the code used with langchain's
+PGVector (add_embeddings, as_retriever, embeddings) on top of that table.
+Synchronous calls use a psycopg engine; the async search path runs on an
+async psycopg pool for the same URL, so searches never block the event loop.
+
+The embeddings model from get_embeddings_model() caches query vectors (not
+document vectors, which utils.docs.embedding_cache handles) in a process-wide
+LRU of float32 arrays bounded by QUERY_EMBED_CACHE_MAX_BYTES, so a query
+repeated by search, chat or an expansion skips the provider call.
+
+Each collection can search through a quantized index instead of the float32
+one: "halfvec" (16-bit floats, half the size) or "binary" (one bit per
+dimension, 32x smaller, Hamming distance). The quantized index returns
+VECTOR_RERANK_OVERSAMPLE times as many candidates as requested, which are then
+re-scored exactly with NumPy against their full-precision vectors.
+benchmarks/vector_search.py reports recall and latency of each mode.
+
+Environment:
+    HNSW_EF_SEARCH: candidate list size of HNSW searches (default 40)
+    HNSW_ITERATIVE_SCAN: off, relaxed_order or strict_order; pgvector >= 0.8
+        keeps scanning the index until enough rows pass the filters (default
+        relaxed_order). With off, the user filter only sees the ef_search
+        nearest chunks of all users, so users with few chunks get few results
+    VECTOR_QUANTIZATION: none, halfvec or binary (default none); overridden per
+        collection by VECTOR_QUANTIZATION_<COLLECTION> (e.g. VECTOR_QUANTIZATION_MY_DOCS)
+    VECTOR_RERANK_OVERSAMPLE: candidates fetched per result when quantized
+        (default 4 for halfvec, 10 for binary)
+    QUERY_EMBED_CACHE_ENABLED: true/false (default true)
+    QUERY_EMBED_CACHE_MAX_BYTES: memory for cached query vectors (default 64 MiB)
+"""
+
+import json
 import logging
-from typing import Optional
+import os
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_openai import OpenAIEmbeddings
+from models.document_chunk import EMBEDDING_DIMENSIONS, DocumentChunk
+from pgvector.sqlalchemy import BIT, HALFVEC, VECTOR
+from sqlalchemy import cast, create_engine, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from utils.docs.embedding_cache import normalize_text
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_COLLECTION = "my_docs"
+
+# Namespace for deterministic chunk vector ids
+CHUNK_ID_NAMESPACE = uuid.UUID("5b0f3c1e-8a57-4c5e-9d2a-6f1e4b7c9a30")
+
+# Metadata keys copied into integer columns
+INTEGER_COLUMNS = (
+    "user_id",
+    "organization_id",
+    "page",
+    "chunk_index",
+    "start_index",
+    "end_index",
+    "token_count",
+)
+
+# Columns search filters may use
+FILTER_COLUMNS = ("user_id", "organization_id", "document_id")
+
+ITERATIVE_SCAN_MODES = ("off", "relaxed_order", "strict_order")
+
+QUANTIZATION_MODES = ("none", "halfvec", "binary")
+
+# Binary codes rank candidates more coarsely, so they need a deeper pool
+DEFAULT_OVERSAMPLE = {"halfvec": 4, "binary": 10}
+
+# Upper bound of hnsw.ef_search
+MAX_EF_SEARCH = 1000
+
+# Rows per insert, keeping the bind parameters of a statement bounded
+INSERT_BATCH_SIZE = 500
 
-def get_embeddings_model() -> OpenAIEmbeddings:
+# Copy chunks of one document to another under new ids, rewriting ownership
+CLONE_DOCUMENT_EMBEDDINGS = text(
+    """
+    INSERT INTO document_chunks (
+        id, collection, document_id, user_id, organization_id, page,
+        chunk_index, start_index, end_index, token_count, chunk_hash, content,
+        metadata, embedding
+    )
+    SELECT
+        m.new_id,
+        c.collection,
+        :document_id,
+        :user_id,
+        :organization_id,
+        c.page,
+        c.chunk_index,
+        c.start_index,
+        c.end_index,
+        c.token_count,
+        c.chunk_hash,
+        c.content,
+        c.metadata || jsonb_build_object(
+            'document_id', CAST(:document_id AS integer),
+            'user_id', CAST(:user_id AS integer)
+        ),
+        c.embedding
+    FROM document_chunks c
+    JOIN unnest(
+        CAST(:source_ids AS varchar[]), CAST(:new_ids AS varchar[])
+    ) AS m(source_id, new_id) ON c.id = m.source_id
+    WHERE c.collection = :collection_name AND c.document_id = :source_document_id
+    """
+)
+
+DELETE_DOCUMENT_EMBEDDINGS = text(
+    """
+    DELETE FROM document_chunks
+    WHERE collection = :collection_name AND document_id = :document_id
+    """
+)
+
+# Stored chunks of a document, identified by the hash of their text
+DOCUMENT_CHUNK_HASHES = text(
+    """
+    SELECT id, chunk_hash
+    FROM document_chunks
+    WHERE collection = :collection_name AND document_id = :document_id
+    ORDER BY chunk_index, id
+    """
+)
+
+DELETE_EMBEDDINGS = text(
+    "DELETE FROM document_chunks WHERE id = ANY(CAST(:ids AS varchar[]))"
+)
+
+UPDATE_EMBEDDING_METADATA = text(
+    """
+    UPDATE document_chunks c
+    SET metadata = v.metadata,
+        page = CAST(v.metadata->>'page' AS integer),
+        chunk_index = CAST(v.metadata->>'chunk_index' AS integer),
+        start_index = CAST(v.metadata->>'start_index' AS integer),
+        end_index = CAST(v.metadata->>'end_index' AS integer),
+        token_count = CAST(v.metadata->>'token_count' AS integer)
+    FROM (
+        SELECT unnest(CAST(:ids AS varchar[])) AS id,
+               CAST(unnest(CAST(:metadatas AS text[])) AS jsonb) AS metadata
+    ) v
+    WHERE c.id = v.id AND c.metadata IS DISTINCT FROM v.metadata
+    """
+)
+
+# Engines by URL, shared by the stores of a process
+_engines: Dict[str, Engine] = {}
+_async_engines: Dict[str, AsyncEngine] = {}
+
+
+def chunk_vector_id(document_id: int, chunk_hash: str, ordinal: int) -> str:
+    """
+    Deterministic vector id for the ordinal-th occurrence of a chunk in a document.
+
+    Writing the same chunk again upserts its row instead of adding a duplicate.
+    """
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document_id}:{chunk_hash}:{ordinal}"))
+
+
+def cloned_chunk_ids(
+    document_id: int, source_chunks: Dict[Optional[str], List[str]]
+) -> Dict[str, str]:
+    """
+    Ids of a document's copies of another document's vectors.
+
+    Args:
+        document_id: Document receiving the copies
+        source_chunks: Source vector ids by chunk hash, in chunk order, as
+            returned by get_document_chunk_hashes
+
+    Returns:
+        The deterministic id of each copy by source vector id, so re-ingesting
+        the copy upserts the same rows
+    """
+    return {
+        source_id: chunk_vector_id(document_id, chunk_hash, ordinal)
+        for chunk_hash, ids in source_chunks.items()
+        for ordinal, source_id in enumerate(ids)
+    }
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.enabled = os.getenv("QUERY_EMBED_CACHE_ENABLED", "true").lower() == "true"
+        self.max_bytes = max_bytes or int(
+            os.getenv("QUERY_EMBED_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+        )
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(key: Tuple[str, str], vector: np.ndarray) -> int:
+        return vector.nbytes + len(key[1])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def get(self, model: str, value: str) -> Optional[np.ndarray]:
+        key = (model, normalize_text(value))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return vector
+
+    def put(self, model: str, value: str, vector: Sequence[float]) -> None:
+        key = (model, normalize_text(value))
+        array = np.asarray(vector, dtype=np.float32)
+        size = self._size(key, array)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(key, old)
+            self._entries[key] = array
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted_key, evicted)
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Query embedding cache shared by every store of the process."""
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryEmbeddingCache()
+    return _query_cache
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings model answering queries from a QueryEmbeddingCache.
+
+    Document embeddings pass straight through.
+    """
+
+    def __init__(self, inner: Embeddings, cache: QueryEmbeddingCache):
+        self.inner = inner
+        self.cache = cache
+        self.model = getattr(inner, "model", type(inner).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    def _lookup(self, texts: Sequence[str]) -> Tuple[List[Any], List[str]]:
+        """Cached vectors (None when missing) and the distinct missing texts."""
+        if not self.cache.enabled:
+            return [None] * len(texts), list(dict.fromkeys(texts))
+        vectors = [self.cache.get(self.model, value) for value in texts]
+        missing = [value for value, v in zip(texts, vectors) if v is None]
+        return vectors, list(dict.fromkeys(missing))
+
+    def _merge(
+        self,
+        texts: Sequence[str],
+        vectors: List[Any],
+        missing: List[str],
+        embedded: List[List[float]],
+    ) -> List[List[float]]:
+        fresh = dict(zip(missing, embedded))
+        if self.cache.enabled:
+            for value, vector in fresh.items():
+                self.cache.put(self.model, value, vector)
+        return [
+            fresh[value] if vector is None else vector.tolist()
+            for value, vector in zip(texts, vectors)
+        ]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed search queries, sending only uncached ones in one batch."""
+        vectors, missing = self._lookup(texts)
+        embedded = self.inner.embed_documents(missing) if missing else []
+        return self._merge(texts, vectors, missing, embedded)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        vectors, missing = self._lookup(texts)
+        embedded = await self.inner.aembed_documents(missing) if missing else []
+        return self._merge(texts, vectors, missing, embedded)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_queries([text]))[0]
+
+
+def get_embeddings_model() -> CachedQueryEmbeddings:
     """
     Initialize and return OpenAI embeddings model.
 
+    Query embeddings go through the process-wide query embedding cache.
+
     Returns:
-        OpenAIEmbeddings: Configured embeddings model
+        CachedQueryEmbeddings: Configured embeddings model
 
     Raises:
         ValueError: If OpenAI API key is not configured
@@ -25,25 +349,318 @@ def get_embeddings_model() -> OpenAIEmbeddings:
     model = os.environ.get("OPENAI_TEXT_EMBEDDING_MODEL", "text-embedding-3-small")
     logger.debug(f"Initializing OpenAI embeddings with model: {model}")
 
-    return OpenAIEmbeddings(
-        api_key=api_key,
-        model=model,
+    return CachedQueryEmbeddings(
+        OpenAIEmbeddings(
+            api_key=api_key,
+            model=model,
+        ),
+        get_query_embedding_cache(),
     )
 
 
+def _sync_engine(url: str) -> Engine:
+    if url not in _engines:
+        _engines[url] = create_engine(url, pool_pre_ping=True)
+    return _engines[url]
+
+
+def _async_engine(url: str) -> AsyncEngine:
+    if url not in _async_engines:
+        async_url = make_url(url).set(drivername="postgresql+psycopg")
+        _async_engines[url] = create_async_engine(async_url, pool_pre_ping=True)
+    return _async_engines[url]
+
+
+async def close_vector_engines() -> None:
+    """Dispose of the async search pools; call on shutdown."""
+    for engine in _async_engines.values():
+        await engine.dispose()
+    _async_engines.clear()
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def chunk_row(
+    chunk_id: Optional[str],
+    content: str,
+    embedding: Sequence[float],
+    metadata: dict,
+    collection_name: str = DEFAULT_COLLECTION,
+) -> dict:
+    """Column values of a document_chunks row for a chunk and its vector."""
+    row = {
+        "id": chunk_id or str(uuid.uuid4()),
+        "collection": collection_name,
+        "document_id": int(metadata["document_id"]),
+        "chunk_hash": metadata.get("chunk_hash"),
+        "content": content,
+        "metadata": metadata,
+        "embedding": embedding,
+    }
+    for key in INTEGER_COLUMNS:
+        row[key] = _as_int(metadata.get(key))
+    return row
+
+
+class ChunkRetriever(BaseRetriever):
+    """Retriever over a ChunkVectorStore, filtered on typed columns."""
+
+    store: Any
+    k: int = 4
+    filter: Dict[str, Any] = {}
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = self.store.embeddings.embed_query(query)
+        return self.store.similarity_search_by_vector(vector, self.k, self.filter)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector = await self.store.embeddings.aembed_query(query)
+        return await self.store.asimilarity_search_by_vector(
+            vector, self.k, self.filter
+        )
+
+
+def get_quantization(collection_name: str, override: Optional[str] = None) -> str:
+    """Quantization mode of a collection, preferring an explicit override."""
+    mode = (
+        override
+        or os.getenv(f"VECTOR_QUANTIZATION_{collection_name.upper()}")
+        or os.getenv("VECTOR_QUANTIZATION", "none")
+    ).lower()
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(
+            f"Invalid vector quantization '{mode}', expected one of {QUANTIZATION_MODES}"
+        )
+    return mode
+
+
+def rerank(query: Sequence[float], rows: Sequence[tuple], k: int) -> List[tuple]:
+    """
+    Re-score candidates by exact cosine distance to the query.
+
+    Args:
+        query: Query embedding
+        rows: (id, content, metadata, approximate distance, embedding) tuples
+        k: Number of rows to keep
+
+    Returns:
+        The k closest rows as (id, content, metadata, exact distance)
+    """
+    if not rows:
+        return []
+    q = np.asarray(query, dtype=np.float32)
+    vectors = np.stack([np.asarray(row[4], dtype=np.float32) for row in rows])
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(q)
+    similarity = (vectors @ q) / np.where(norms == 0, 1.0, norms)
+    order = np.argsort(-similarity, kind="stable")[:k]
+    return [(*rows[i][:3], 1.0 - float(similarity[i])) for i in order]
+
+
+class ChunkVectorStore:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        collection_name: str,
+        db_url: str,
+        quantization: Optional[str] = None,
+        oversample: Optional[int] = None,
+    ):
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.engine = _sync_engine(db_url)
+        self.async_engine = _async_engine(db_url)
+        self.ef_search = int(os.getenv("HNSW_EF_SEARCH", "40"))
+        self.iterative_scan = os.getenv("HNSW_ITERATIVE_SCAN", "relaxed_order").lower()
+        if self.iterative_scan not in ITERATIVE_SCAN_MODES:
+            raise ValueError(
+                f"Invalid HNSW_ITERATIVE_SCAN '{self.iterative_scan}', "
+                f"expected one of {ITERATIVE_SCAN_MODES}"
+            )
+        self.quantization = get_quantization(collection_name, quantization)
+        self.oversample = oversample or int(
+            os.getenv(
+                "VECTOR_RERANK_OVERSAMPLE",
+                str(DEFAULT_OVERSAMPLE.get(self.quantization, 1)),
+            )
+        )
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: Sequence[dict],
+        ids: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[str]:
+        """
+        Upsert chunks with precomputed vectors.
+
+        Args:
+            texts: Chunk texts
+            embeddings: One vector per text
+            metadatas: Chunk metadata, including document_id
+            ids: Chunk ids; rows with an existing id are replaced
+
+        Returns:
+            Ids of the stored chunks
+        """
+        ids = ids or [None] * len(texts)
+        rows = [
+            chunk_row(chunk_id, content, vector, metadata, self.collection_name)
+            for chunk_id, content, vector, metadata in zip(
+                ids, texts, embeddings, metadatas
+            )
+        ]
+        table = DocumentChunk.__table__
+        with self.engine.begin() as conn:
+            for i in range(0, len(rows), INSERT_BATCH_SIZE):
+                stmt = insert(table).values(rows[i : i + INSERT_BATCH_SIZE])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.id],
+                    set_={
+                        column: stmt.excluded[column]
+                        for column in rows[0]
+                        if column != "id"
+                    },
+                )
+                conn.execute(stmt)
+        return [row["id"] for row in rows]
+
+    def _distance(self, vector: Sequence[float]):
+        """Distance expression matching the index of the quantization mode."""
+        if self.quantization == "halfvec":
+            halfvec = HALFVEC(EMBEDDING_DIMENSIONS)
+            return cast(DocumentChunk.embedding, halfvec).cosine_distance(
+                cast(vector, halfvec)
+            )
+        if self.quantization == "binary":
+            bit = BIT(EMBEDDING_DIMENSIONS)
+            query = func.binary_quantize(cast(vector, VECTOR(EMBEDDING_DIMENSIONS)))
+            return cast(
+                func.binary_quantize(DocumentChunk.embedding), bit
+            ).hamming_distance(cast(query, bit))
+        return DocumentChunk.embedding.cosine_distance(vector)
+
+    def _limit(self, k: int) -> int:
+        if self.quantization == "none":
+            return k
+        return min(k * self.oversample, MAX_EF_SEARCH)
+
+    def _search_statement(
+        self, vector: Sequence[float], k: int, filter: Optional[dict]
+    ):
+        distance = self._distance(vector).label("distance")
+        columns = [
+            DocumentChunk.id,
+            DocumentChunk.content,
+            DocumentChunk.chunk_metadata,
+            distance,
+        ]
+        if self.quantization != "none":
+            # Full-precision vectors of the candidates, for re-ranking
+            columns.append(DocumentChunk.embedding)
+        stmt = select(*columns).where(DocumentChunk.collection == self.collection_name)
+        for key, value in (filter or {}).items():
+            if key not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter chunks on '{key}'")
+            stmt = stmt.where(getattr(DocumentChunk, key) == value)
+        return stmt.order_by(distance).limit(self._limit(k))
+
+    def _search_settings(self, k: int) -> List[str]:
+        # An HNSW scan returns at most ef_search rows
+        ef_search = min(max(self.ef_search, self._limit(k)), MAX_EF_SEARCH)
+        settings = [f"SET LOCAL hnsw.ef_search = {ef_search}"]
+        if self.iterative_scan != "off":
+            settings.append(f"SET LOCAL hnsw.iterative_scan = {self.iterative_scan}")
+        return settings
+
+    @staticmethod
+    def _documents(rows) -> List[Document]:
+        return [
+            Document(
+                id=chunk_id,
+                page_content=content,
+                metadata={**metadata, "score": 1.0 - float(distance)},
+            )
+            for chunk_id, content, metadata, distance in rows
+        ]
+
+    def similarity_search_by_vector(
+        self, vector: Sequence[float], k: int = 4, filter: Optional[dict] = None
+    ) -> List[Document]:
+        """
+        Nearest chunks by cosine distance, with their similarity as metadata["score"].
+
+        Args:
+            vector: Query embedding
+            k: Number of chunks to return
+            filter: Equality filters on user_id, organization_id or document_id
+
+        Returns:
+            Chunks ordered from most to least similar
+        """
+        stmt = self._search_statement(vector, k, filter)
+        with self.engine.begin() as conn:
+            for setting in self._search_settings(k):
+                conn.execute(text(setting))
+            rows = conn.execute(stmt).all()
+        return self._results(vector, rows, k)
+
+    async def asimilarity_search_by_vector(
+        self, vector: Sequence[float], k: int = 4, filter: Optional[dict] = None
+    ) -> List[Document]:
+        """similarity_search_by_vector on the async connection pool."""
+        stmt = self._search_statement(vector, k, filter)
+        async with self.async_engine.begin() as conn:
+            for setting in self._search_settings(k):
+                await conn.execute(text(setting))
+            rows = (await conn.execute(stmt)).all()
+        return self._results(vector, rows, k)
+
+    def _results(self, vector: Sequence[float], rows, k: int) -> List[Document]:
+        if self.quantization != "none":
+            rows = rerank(vector, rows, k)
+        elif self.iterative_scan == "relaxed_order":
+            # Rows of later scan iterations can come back slightly out of order
+            rows = sorted(rows, key=lambda row: row[3])
+        return self._documents(rows)
+
+    def as_retriever(self, search_kwargs: Optional[dict] = None) -> ChunkRetriever:
+        search_kwargs = search_kwargs or {}
+        return ChunkRetriever(
+            store=self,
+            k=search_kwargs.get("k", 4),
+            filter=search_kwargs.get("filter") or {},
+        )
+
+
 def get_vector_store(
-    collection_name: str = "my_docs",
-    embeddings: Optional[OpenAIEmbeddings] = None,
-) -> PGVector:
+    collection_name: str = DEFAULT_COLLECTION,
+    embeddings: Optional[Embeddings] = None,
+    db_url: Optional[str] = None,
+    quantization: Optional[str] = None,
+) -> ChunkVectorStore:
     """
-    Initialize and return PGVector store instance.
+    Initialize and return the chunk vector store.
 
     Args:
         collection_name: Name of the vector collection
         embeddings: Optional pre-configured embeddings model
+        db_url: Database to connect to, such as a read replica; defaults to
+            DATABASE_URL
+        quantization: none, halfvec or binary; defaults to the collection's
+            VECTOR_QUANTIZATION setting
 
     Returns:
-        PGVector: Configured vector store
+        ChunkVectorStore: Configured vector store
 
     Raises:
         ValueError: If database configuration is missing
@@ -52,24 +669,128 @@ def get_vector_store(
         logger.info(f"Initializing vector store for collection: {collection_name}")
 
         # Get database URL from environment
-        db_url = os.environ.get("DATABASE_URL")
+        db_url = db_url or os.environ.get("DATABASE_URL")
         if not db_url:
             logger.error("Database URL not found in environment variables")
             raise ValueError("Database URL not configured")
 
         # Use provided embeddings or create new ones
         embeddings_model = embeddings or get_embeddings_model()
+        if not isinstance(embeddings_model, CachedQueryEmbeddings):
+            embeddings_model = CachedQueryEmbeddings(
+                embeddings_model, get_query_embedding_cache()
+            )
 
-        vector_store = PGVector(
+        vector_store = ChunkVectorStore(
             embeddings=embeddings_model,
             collection_name=collection_name,
-            connection=db_url,
-            use_jsonb=True,
+            db_url=db_url,
+            quantization=quantization,
         )
 
-        logger.info("Vector store initialized successfully")
+        logger.info(
+            f"Vector store initialized successfully "
+            f"(quantization={vector_store.quantization})"
+        )
         return vector_store
 
     except Exception as e:
         logger.error(f"Failed to initialize vector store: {str(e)}", exc_info=True)
         raise
+
+
+async def clone_document_embeddings(
+    db: AsyncSession,
+    source_document_id: int,
+    document_id: int,
+    user_id: int,
+    ids: Dict[str, str],
+    organization_id: Optional[int] = None,
+    collection_name: str = DEFAULT_COLLECTION,
+) -> int:
+    """
+    Link a document to the vectors of an identical, already ingested document.
+
+    The copy happens inside Postgres, so no parsing or embedding calls are made.
+
+    Args:
+        ids: New vector id by source vector id, from cloned_chunk_ids
+
+    Returns:
+        Number of vectors copied
+    """
+    result = await db.execute(
+        CLONE_DOCUMENT_EMBEDDINGS,
+        {
+            "collection_name": collection_name,
+            "source_document_id": source_document_id,
+            "source_ids": list(ids),
+            "new_ids": list(ids.values()),
+            "document_id": document_id,
+            "user_id": user_id,
+            "organization_id": organization_id,
+        },
+    )
+    logger.info(
+        f"Cloned {result.rowcount} embeddings from document {source_document_id} "
+        f"to document {document_id}"
+    )
+    return result.rowcount
+
+
+async def delete_document_embeddings(
+    db: AsyncSession, document_id: int, collection_name: str = DEFAULT_COLLECTION
+) -> int:
+    """
+    Delete every vector of a document.
+
+    Returns:
+        Number of vectors deleted
+    """
+    result = await db.execute(
+        DELETE_DOCUMENT_EMBEDDINGS,
+        {"collection_name": collection_name, "document_id": document_id},
+    )
+    return result.rowcount
+
+
+async def get_document_chunk_hashes(
+    db: AsyncSession, document_id: int, collection_name: str = DEFAULT_COLLECTION
+) -> Dict[Optional[str], List[str]]:
+    """
+    Map each stored chunk hash of a document to the ids of its vectors.
+
+    Vectors written before chunk hashes existed are grouped under None.
+    """
+    result = await db.execute(
+        DOCUMENT_CHUNK_HASHES,
+        {"collection_name": collection_name, "document_id": document_id},
+    )
+    chunks: Dict[Optional[str], List[str]] = {}
+    for embedding_id, chunk_hash in result.all():
+        chunks.setdefault(chunk_hash, []).append(embedding_id)
+    return chunks
+
+
+async def delete_embeddings(db: AsyncSession, ids: Sequence[str]) -> int:
+    """Delete vectors by id."""
+    if not ids:
+        return 0
+    result = await db.execute(DELETE_EMBEDDINGS, {"ids": list(ids)})
+    return result.rowcount
+
+
+async def update_embedding_metadata(
+    db: AsyncSession, items: Sequence[Tuple[str, dict]]
+) -> int:
+    """Replace the metadata of existing vectors, skipping unchanged rows."""
+    if not items:
+        return 0
+    result = await db.execute(
+        UPDATE_EMBEDDING_METADATA,
+        {
+            "ids": [embedding_id for embedding_id, _ in items],
+            "metadatas": [json.dumps(metadata) for _, metadata in items],
+        },
+    )
+    return result.rowcount
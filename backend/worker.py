@@ -0,0 +1,183 @@
+"""
+Background worker for document jobs.
+
+Run alongside the API with `python -m worker` from the backend directory. Any
+number of workers can run at once; they share the document_jobs table and never
+claim the same job twice.
+
+Environment:
+    WORKER_CONCURRENCY: jobs processed at once by this process (default 2)
+    WORKER_POLL_INTERVAL: seconds to sleep when no job is runnable (default 2)
+    GC_INTERVAL_SECONDS: seconds between garbage collections, 0 disables (default 3600)
+    GC_VACUUM: VACUUM (ANALYZE) the embedding table after large collections (default false)
+    GC_REINDEX: REINDEX the embedding table after large collections (default false)
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+from uuid import uuid4
+
+import load_env
+from models.document_job import DocumentJob
+from models.relationships import setup_relationships
+from utils.database import close_database, init_database
+from utils.docs.gc import GarbageCollector
+from utils.docs.ingest import IngestService
+from utils.docs.jobs import JobQueue
+from utils.docs.pdf import get_pdf_parser
+from utils.logging_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:6]}"
+        self.concurrency = int(os.getenv("WORKER_CONCURRENCY", "2"))
+        self.poll_interval = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+        self.database = init_database()
+        self.queue = JobQueue()
+        self.ingest_service = IngestService()
+        self.gc = GarbageCollector(self.ingest_service.storage, self.queue)
+        self.gc_interval = float(os.getenv("GC_INTERVAL_SECONDS", "3600"))
+        self.gc_vacuum = os.getenv("GC_VACUUM", "false").lower() == "true"
+        self.gc_reindex = os.getenv("GC_REINDEX", "false").lower() == "true"
+        self.handlers = {
+            "ingest": self._run_ingest,
+            "ingest_full": self._run_full_ingest,
+            "purge": self._run_purge,
+        }
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """Finish the jobs in progress and exit."""
+        logger.info(f"Worker {self.worker_id} stopping")
+        self._stopping.set()
+
+    async def run(self) -> None:
+        logger.info(
+            f"Worker {self.worker_id} started with concurrency {self.concurrency}"
+        )
+        loops = [self._loop() for _ in range(self.concurrency)]
+        if self.gc_interval > 0:
+            loops.append(self._gc_loop())
+        await asyncio.gather(*loops)
+        await self.ingest_service.pipeline.close()
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    async def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                async with self.database.async_session() as db:
+                    jobs = await self.queue.claim(db, self.worker_id)
+            except Exception as e:
+                logger.error(f"Failed to claim jobs: {str(e)}", exc_info=True)
+                jobs = []
+
+            if not jobs:
+                try:
+                    await asyncio.wait_for(
+                        self._stopping.wait(), timeout=self.poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for job in jobs:
+                await self._process(job)
+
+    async def _gc_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.gc_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.gc.run_exclusive(
+                    vacuum=self.gc_vacuum, reindex=self.gc_reindex
+                )
+            except Exception as e:
+                logger.error(f"Garbage collection failed: {str(e)}", exc_info=True)
+
+    async def _heartbeat(self, job_id: int) -> None:
+        """Keep a running job's lock fresh so no other worker reclaims it."""
+        while True:
+            await asyncio.sleep(self.queue.heartbeat_interval)
+            try:
+                async with self.database.async_session() as db:
+                    if not await self.queue.heartbeat(db, job_id, self.worker_id):
+                        logger.warning(f"Job {job_id} is no longer locked by us")
+                        return
+            except Exception as e:
+                logger.warning(f"Heartbeat of job {job_id} failed: {str(e)}")
+
+    async def _process(self, job: DocumentJob) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            await self._run_job(job)
+        finally:
+            heartbeat.cancel()
+
+    async def _run_job(self, job: DocumentJob) -> None:
+        job_id = job.id
+        async with self.database.async_session() as db:
+            job = await db.merge(job, load=False)
+            handler = self.handlers.get(job.kind)
+            try:
+                if handler is None:
+                    raise ValueError(f"Unknown job kind '{job.kind}'")
+                if job.attempts > job.max_attempts:
+                    raise RuntimeError("Job abandoned by its worker too many times")
+                result = await handler(db, job)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+                await db.rollback()
+                job = await db.get(DocumentJob, job_id, populate_existing=True)
+                await self.queue.fail(db, job, str(e))
+                return
+
+            await self.queue.complete(db, job, result)
+            logger.info(
+                f"Job {job.id} succeeded: {result}; embedding cache "
+                f"{self.ingest_service.embeddings_service.cache.stats()}"
+            )
+
+    async def _run_ingest(self, db, job: DocumentJob) -> dict:
+        return await self.ingest_service.ingest_document(
+            db, job.document_id, job.user_id
+        )
+
+    async def _run_full_ingest(self, db, job: DocumentJob) -> dict:
+        return await self.ingest_service.ingest_document(
+            db, job.document_id, job.user_id, incremental=False
+        )
+
+    async def _run_purge(self, db, job: DocumentJob) -> dict:
+        report = await self.gc.purge_document(db, job.document_id, job.user_id)
+        return report.as_dict()
+
+
+async def main() -> None:
+    if not load_env.IS_ENV_LOADED:
+        raise RuntimeError("Environment variables not loaded")
+    setup_relationships()
+
+    worker = Worker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        get_pdf_parser().shutdown()
+        await close_database()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())